@@ -0,0 +1,335 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+import argparse
+import importlib
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request, ClientDisconnect
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+from werkzeug.utils import secure_filename
+
+from dedup import content_hash
+from extract_text import InMemoryFile
+from extract_text import DOCUMENT_TIMEOUT
+from extraction_pool import extract_in_worker, configure_pool, EXTRACT_WORKERS
+from email_handler import send_email_async
+from metrics import registry, record_spans, traced, REQUEST_METRIC
+from qdrant_writer import connect_async, AsyncCachedProbe
+
+# Threads that run blocking work: Flask handlers, scoring and model inference, SQLite lookups
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", "8"))
+# Requests held at once (body in memory or being processed); the rest wait for a slot
+ASYNC_MAX_INFLIGHT = int(os.getenv("ASYNC_MAX_INFLIGHT", "64"))
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "64"))
+
+# Never wait for an admission slot: a burst of slow uploads must not make the server look dead
+ADMISSION_EXEMPT = ("/api/health", "/api/metrics")
+
+_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "HEAD"]
+
+
+class AsyncServer:
+    """
+    Event-loop front end for one of the Flask apps.
+
+    Request bodies are read on the event loop, so a slow upload costs a
+    coroutine rather than a thread. Once a body is in, the work runs on
+    bounded executors: a thread pool of `workers` for blocking handlers and
+    inference, and the process-wide extraction pool, which the server sizes
+    and which the Flask handlers' extract_many share. At most
+    `max_inflight` requests are admitted at a time, which caps memory at
+    about max_inflight x MAX_UPLOAD_MB; health and metrics skip admission.
+    Routes without an async version are served by the Flask app itself, on
+    the thread pool, with its body already buffered, so both modes expose
+    the same API.
+    """
+
+    def __init__(self, flask_app, workers=ASYNC_WORKERS, max_inflight=ASYNC_MAX_INFLIGHT,
+                 extract_workers=EXTRACT_WORKERS, max_body=MAX_UPLOAD_MB * 1024 * 1024):
+        self.flask_app = flask_app
+        self.max_body = max_body
+        self.threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asgi-worker")
+        # Not forked from the server: children would inherit its listening socket and loaded model
+        context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                              else "spawn")
+        self.extraction = configure_pool(extract_workers, context)
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._emails = set()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on the thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.threads, lambda: fn(*args, **kwargs))
+
+    async def extract(self, filename, data):
+        """Text of an uploaded CV, extracted in the process pool."""
+        future = self.extraction.submit(extract_in_worker, InMemoryFile(filename, data), timeout=DOCUMENT_TIMEOUT)
+        try:
+            text, error, spans = await asyncio.wrap_future(future)
+        except Exception as e:
+            text, error, spans = "", repr(e), []
+        record_spans(spans)
+        if error:
+            print(f"Error extracting {filename}: {error}")
+        return text
+
+    def email_sender(self, sender_email, smtp_password):
+        """
+        notify(email, subject, body) callable for worker threads: the email is
+        sent on the event loop and the thread moves on without waiting for SMTP.
+        """
+        loop = asyncio.get_running_loop()
+
+        def notify(email, subject, body):
+            future = asyncio.run_coroutine_threadsafe(
+                send_email_async(sender_email, smtp_password, email, subject, body), loop)
+            self._emails.add(future)
+            future.add_done_callback(self._emails.discard)
+        return notify
+
+    async def read_body(self, request):
+        """The whole request body, or None when it is larger than the upload limit."""
+        length = request.headers.get('content-length')
+        if length is not None and int(length) > self.max_body:
+            return None
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > self.max_body:
+                return None
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def buffered(self, request, body):
+        """A copy of `request` that replays an already read body."""
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return Request(request.scope, receive)
+
+    async def call_flask(self, request, body):
+        """
+        Serve a request with the Flask app on the thread pool, streaming its response back.
+
+        The WSGI call and the iteration of its response run in one thread (Flask's
+        stream_with_context needs that), handing chunks to the loop through a
+        small queue, so a long export never sits in memory.
+        """
+        builder = EnvironBuilder(path=request.url.path, method=request.method, headers=list(request.headers.items()),
+                                 query_string=request.url.query, data=body,
+                                 environ_base={"REMOTE_ADDR": request.client.host if request.client else ""})
+        environ = builder.get_environ()
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=8)
+        done = object()
+        stopped = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def pump():
+            try:
+                app_iter, status, headers = run_wsgi_app(self.flask_app.wsgi_app, environ, buffered=False)
+            except BaseException as e:
+                put(e)
+                return
+            put((status, headers))
+            try:
+                for chunk in app_iter:
+                    if stopped.is_set():
+                        break
+                    put(chunk)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+                put(done)
+
+        worker = loop.run_in_executor(self.threads, pump)
+        first = await chunks.get()
+        if isinstance(first, BaseException):
+            await worker
+            raise first
+        status, headers = first
+
+        async def stream():
+            try:
+                while (chunk := await chunks.get()) is not done:
+                    yield chunk
+            finally:
+                # Client gone: let the pump finish instead of blocking on a full queue
+                stopped.set()
+                while not worker.done():
+                    try:
+                        if await asyncio.wait_for(chunks.get(), 1) is done:
+                            break
+                    except asyncio.TimeoutError:
+                        pass
+
+        headers = {key: value for key, value in headers.items() if key.lower() != 'content-length'}
+        return StreamingResponse(stream(), status_code=int(status.split()[0]), headers=headers)
+
+    def route(self, path, handler, methods, observe=True, admit=True):
+        """Starlette route for an async handler(request, body), with admission control and latency metrics."""
+        async def respond(request):
+            try:
+                body = await self.read_body(request)
+            except ClientDisconnect:
+                return Response(status_code=400)  # nobody left to answer
+            if body is None:
+                return JSONResponse({"error": f"Upload too large (limit {self.max_body // (1024 * 1024)} MB)"},
+                                    status_code=413)
+            return await handler(request, body)
+
+        async def endpoint(request):
+            start = time.perf_counter()
+            if admit:
+                async with self._slots:
+                    response = await respond(request)
+            else:
+                response = await respond(request)
+            if observe:
+                registry.observe(REQUEST_METRIC, time.perf_counter() - start, method=request.method,
+                                 endpoint=path, status=str(response.status_code))
+            return response
+        return Route(path, endpoint, methods=methods)
+
+    def app(self, routes):
+        """Starlette app with `routes` ((path, handler, methods)); everything else goes to Flask."""
+        async def fallback(request, body):
+            return await self.call_flask(request, body)
+
+        @asynccontextmanager
+        async def lifespan(app):
+            yield
+            if self._emails:
+                await asyncio.gather(*(asyncio.wrap_future(future) for future in list(self._emails)),
+                                     return_exceptions=True)
+            self.extraction.shutdown()
+            self.threads.shutdown(wait=False)
+
+        # Flask keeps serving /api/metrics and records request metrics for the routes it handles
+        return Starlette(routes=[self.route(path, handler, methods, admit=path not in ADMISSION_EXEMPT)
+                                 for path, handler, methods in routes]
+                         + [self.route("/api/metrics", fallback, ["GET"], observe=False, admit=False),
+                            self.route("/{path:path}", fallback, _METHODS, observe=False)],
+                         middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"],
+                                                allow_headers=["*"])],
+                         lifespan=lifespan)
+
+
+def applicant_app():
+    """ASGI app for backend.py (careers page API): /api/apply and /api/health run natively."""
+    backend = importlib.import_module('backend')
+    server = AsyncServer(backend.app)
+    qdrant = connect_async(backend.QDRANT_URL, backend.QDRANT_API_KEY)
+
+    async def count_points():
+        if not await qdrant.collection_exists(backend.COLLECTION_NAME):
+            return 0
+        return (await qdrant.get_collection(backend.COLLECTION_NAME)).points_count
+    probe = AsyncCachedProbe(count_points) if qdrant is not None else None
+
+    async def health(request, body):
+        # The in-process ":memory:" instance only exists on the sync client
+        if probe is not None:
+            ok, result, age = await probe.get()
+        else:
+            ok, result, age = await server.run(lambda: backend.get_collection_probe().get())
+        if not ok:
+            return JSONResponse({"success": False, "message": result,
+                                 "pending_writes": backend.get_qdrant_writer().stats()}, status_code=500)
+        return JSONResponse({
+            "success": True,
+            "message": "System Online",
+            "threshold": backend.THRESHOLD,
+            "candidates_stored": result,
+            "pending_writes": backend.get_qdrant_writer().stats(),
+            "checked_seconds_ago": age,
+            "startup": backend.startup.timings()
+        })
+
+    async def apply(request, body):
+        if backend.intake_queue is not None:
+            # Queued mode answers straight away anyway: save and enqueue through the Flask handler
+            return await server.call_flask(request, body)
+        try:
+            form = await server.buffered(request, body).form(max_files=1)
+            full_name = form.get('name', 'Unknown')
+            email = form.get('email', '')
+            upload = form.get('cv')
+            if not isinstance(upload, UploadFile):
+                return JSONResponse({"success": False, "message": "No file uploaded"}, status_code=400)
+            filename = secure_filename(upload.filename)
+            if not filename.lower().endswith(('.pdf', '.docx')):
+                return JSONResponse({"success": False, "message": "Unsupported file format"}, status_code=400)
+            data = await upload.read()
+
+            # A CV already screened (same file, or same applicant email) gets its decision back
+            digest = content_hash(data)
+            match = await server.run(backend.dedup_index.find_exact, digest, email)
+            if match is not None and match.record is not None:
+                await server.run(backend.dedup_index.link, match.candidate_id, digest)
+                return JSONResponse(backend.duplicate_response(match))
+
+            candidate_id = str(uuid.uuid4())
+            resume_text = await server.extract(filename, data)
+
+            def screen():
+                with traced(f"POST /api/apply {candidate_id}"):
+                    return backend.process_application(candidate_id, full_name, email, filename, data=data,
+                                                       resume_text=resume_text, notify=notify)
+            notify = server.email_sender(backend.EMAIL_USER, backend.EMAIL_PASS)
+            result = await server.run(screen)
+            if not result.get("duplicate"):
+                backend.upload_writer.save(f"{candidate_id}_{filename}", data)
+            return JSONResponse(result)
+        except Exception as e:
+            print(f"Error: {e}")
+            return JSONResponse({"success": False, "message": str(e)}, status_code=500)
+
+    return server.app([("/api/health", health, ["GET"]), ("/api/apply", apply, ["POST"])])
+
+
+def dashboard_app():
+    """
+    ASGI app for backend-api-flask.py (recruiter dashboard).
+
+    Every route is the Flask handler run on the bounded thread pool once its
+    upload has been read on the event loop; batch extraction already runs in
+    the extraction process pool inside the handler.
+    """
+    dashboard = importlib.import_module('backend-api-flask')
+    server = AsyncServer(dashboard.app)
+
+    async def health(request, body):
+        return JSONResponse({"status": "ok", "message": "API is running", "startup": dashboard.startup.timings()})
+
+    return server.app([("/api/health", health, ["GET"])])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the screening API on an asyncio event loop (uvicorn)")
+    parser.add_argument('app', choices=['applicant', 'dashboard'], help="backend.py or backend-api-flask.py")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    import uvicorn
+    # One process, one event loop: concurrency comes from the loop and the bounded pools, not from workers
+    uvicorn.run(applicant_app if args.app == 'applicant' else dashboard_app, factory=True,
+                host=args.host, port=args.port)
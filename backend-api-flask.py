@@ -1,26 +1,46 @@
-from flask import Flask, request, jsonify, send_file
+import startup  # first, so startup timings start at process launch
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 from werkzeug.utils import secure_filename
-from extract_text import extract_text_from_pdf, extract_text_from_docx
-from preprocessing import preprocess_text
-from similarity import similarity_score
-from email_handler import send_email
+from similarity import score_embeddings, score_chunked, warm_up, CHUNK_AGGREGATES
+from embedding_cache import EmbeddingCache
+from candidate_index import CandidateIndex
+from candidate_store import CandidateStore
+from bulk_mailer import BulkMailer
+from metrics import instrument_app
+from reranker import get_reranker, select_for_rerank, RERANK_TOP_K, RERANK_MODE, RERANK_MODES, \
+    RERANK_BAND, RERANK_THRESHOLD
+from lexical import LexicalIndex, parse_must_have, parse_skill_list, blend, LEXICAL_WEIGHT, LEXICAL_INDEX_PATH
+from dedup import DuplicateIndex, content_hash, file_hash, normalize_email
+from extract_text import InMemoryFile
+from upload_writer import UploadWriter
 from dotenv import load_dotenv
 import re
-import pandas as pd
+import json
+import uuid
+import atexit
+import itertools
+import threading
 from datetime import datetime
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
+instrument_app(app)  # Stage timings and request latency on /api/metrics
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 JOB_DESC_FOLDER = 'job_descriptions'
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc'}
-THRESHOLD = 0.3
+THRESHOLD = 0.3  # default; the current value is kept in the candidate store (see current_threshold)
+# Whole request body limit (a batch upload counts once) and files accepted per batch
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "64"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))
+
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(JOB_DESC_FOLDER, exist_ok=True)
@@ -28,15 +48,189 @@ os.makedirs(JOB_DESC_FOLDER, exist_ok=True)
 EMAIL_USER = os.getenv("EMAIL")
 EMAIL_PASS = os.getenv("PASSWORD")
 
-# Store processed candidates in memory (use database in production)
-processed_candidates = []
+# Uploads are extracted from memory; the original files are written out in the background (PERSIST_UPLOADS)
+upload_writer = UploadWriter(UPLOAD_FOLDER)
+atexit.register(upload_writer.stop)
+
+# Extracted text, preprocessed text and embeddings keyed by file content
+embedding_cache = EmbeddingCache()
+
+# Every candidate embedding with its metadata, persisted on disk
+candidate_index = CandidateIndex()
+
+# Candidate records live in SQLite and are read page by page, so memory does not grow with the pool
+candidate_store = CandidateStore()
+if not len(candidate_store) and len(candidate_index):
+    # First start on the store: take over the records kept in the index metadata
+    for _candidate in candidate_index.all_metadata():
+        candidate_store.add(_candidate)
+
+# BM25 index of every candidate's preprocessed text, for hybrid scoring and must-have skills
+lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
+
+# Known CVs by file hash, email and text fingerprint, so a resubmission reuses its candidate record
+dedup_index = DuplicateIndex()
+if len(dedup_index) < len(candidate_store):
+    for _candidate in candidate_store.iter():
+        if _candidate['id'] not in dedup_index:
+            _path = os.path.join(UPLOAD_FOLDER, _candidate.get('storedFilename') or _candidate['filename'])
+            dedup_index.add(_candidate['id'], file_hash(_path) if os.path.exists(_path) else None, _candidate['email'])
+
+# Load the model in the background so health checks answer before it is ready
+if os.getenv("WARM_UP_MODEL", "0") == "1":
+    threading.Thread(target=warm_up, name="model-warm-up", daemon=True).start()
+
+print(f"Startup finished in {startup.mark('app_ready'):.2f}s")
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def extract_email(text):
+    email_match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", text)
+    return email_match.group(0) if email_match else "No email found"
+
+def stored_path(candidate):
+    return os.path.join(UPLOAD_FOLDER, candidate.get('storedFilename') or candidate['filename'])
+
+def stored_documents(candidates):
+    """
+    (candidate, CachedDocument) for every candidate whose text is still available.
+
+    Looked up in the cache by the key recorded at upload, so no file is read;
+    the stored file is only extracted again when the entry was evicted.
+    """
+    found, from_files = [], []
+    for candidate in candidates:
+        document = embedding_cache.get(candidate['documentKey']) if candidate.get('documentKey') else None
+        if document is not None:
+            found.append((candidate, document))
+        elif os.path.exists(stored_path(candidate)):
+            from_files.append(candidate)
+    documents = embedding_cache.get_or_compute_files([stored_path(c) for c in from_files])
+    return found + list(zip(from_files, documents))
+
+def current_threshold():
+    """Threshold set through /api/threshold; read from the store so every thread sees the same value."""
+    return candidate_store.get_setting('threshold', THRESHOLD)
+
+def unique_upload_name(filename):
+    # Two requests uploading the same file name in the same second must not overwrite each other
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{filename}"
+
+def find_candidate(candidate_id):
+    return candidate_store.get(candidate_id)
+
+def stream_candidates(candidates, **fields):
+    """JSON response {"candidates": [...], **fields} written one candidate at a time."""
+    def generate():
+        yield json.dumps(fields)[:-1] + (', ' if fields else '') + '"candidates": ['
+        for i, candidate in enumerate(candidates):
+            yield (',' if i else '') + json.dumps(candidate)
+        yield ']}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def find_duplicate(file_hash=None, raw_text=None, cleaned_text=None):
+    """Existing candidate match for a CV (same file, same email or near-identical text), or None."""
+    match = dedup_index.find(file_hash, extract_email(raw_text) if raw_text else None, cleaned_text)
+    if match is not None and find_candidate(match.candidate_id) is not None:
+        return match
+    return None
+
+def skip_duplicates(found):
+    """iter_files skip hook: duplicates are not embedded; their matches are recorded in `found`."""
+    def skip(i, raw_text, cleaned_text):
+        match = find_duplicate(raw_text=raw_text, cleaned_text=cleaned_text)
+        if match is not None:
+            found[i] = match
+        return match is not None
+    return skip
+
+def resubmission(match, file_hash, email=None):
+    """The existing candidate a resubmitted CV belongs to, with its stored score and status."""
+    existing = find_candidate(match.candidate_id)
+    # The new file's hash and email now lead straight to this candidate
+    dedup_index.link(existing['id'], file_hash, email)
+    return {**existing, "duplicate": True, "duplicateReason": match.reason, "similarity": match.similarity}
+
+def index_candidate(candidate_data, embedding):
+    """Add a candidate to the local vector index (without the text preview)."""
+    metadata = {k: v for k, v in candidate_data.items() if k != 'resumeText'}
+    candidate_index.add(candidate_data['id'], embedding, metadata)
+
+def apply_hybrid(job, candidates, scores, must_have, lexical_weight, min_score, best_chunks=None):
+    """
+    Set score and status of `candidates` from their semantic `scores`.
+
+    With a lexical weight the score blends in BM25 against the job description,
+    and a candidate missing one of the `must_have` skill groups is rejected
+    whatever the score. Weight 0 and no must-haves is plain semantic scoring.
+
+    `best_chunks` holds each candidate's best-matching chunk when the scores
+    come from chunked scoring; otherwise a chunk left by an earlier run is
+    dropped, so it is never shown next to a score it did not produce.
+    """
+    hybrid = bool(must_have) or lexical_weight > 0
+    if hybrid:
+        lexical_scores = lexical_index.score(job.cleaned_text, [c['id'] for c in candidates])
+        scores = blend(scores, lexical_scores, lexical_weight)
+    for i, (candidate, score) in enumerate(zip(candidates, scores)):
+        missing = lexical_index.missing_must_have(candidate['id'], must_have) if must_have else []
+        candidate['score'] = float(score)
+        candidate['status'] = "matched" if score >= min_score and not missing else "rejected"
+        candidate.pop('rerankScore', None)  # re-ranked again (or not) by apply_rerank
+        if best_chunks is not None:
+            candidate['bestChunk'] = best_chunks[i]
+        else:
+            candidate.pop('bestChunk', None)
+        if hybrid:
+            candidate['lexicalScore'] = float(lexical_scores[i])
+            candidate['missingSkills'] = missing
+        else:
+            candidate.pop('lexicalScore', None)
+            candidate.pop('missingSkills', None)
+
+def apply_rerank(job_description, candidates, min_score, top_k, mode, band):
+    """
+    Second stage: re-score at most `top_k` of the scored `candidates` with the cross-encoder.
+
+    Picks the candidates closest to `min_score` ("band") or the best ones
+    ("top"); their status then follows the re-ranker's score. Candidates
+    missing a must-have skill stay rejected. Returns the re-ranked candidates;
+    if the re-ranker fails, none are, and the embedding scores stand.
+    """
+    eligible = [not c.get('missingSkills') for c in candidates]
+    selected = select_for_rerank([c['score'] for c in candidates], min_score, top_k, mode, band, eligible)
+    pairs = stored_documents([candidates[i] for i in selected])
+    if not pairs:
+        return []
+    try:
+        scores = get_reranker().score(job_description, [document.raw_text for _, document in pairs])
+    except Exception as e:
+        print(f"Re-ranking failed, keeping the embedding scores: {e}")
+        return []
+    for (candidate, _), score in zip(pairs, scores):
+        candidate['rerankScore'] = float(score)
+        candidate['status'] = "matched" if score >= RERANK_THRESHOLD else "rejected"
+    return [candidate for candidate, _ in pairs]
+
+def rerank_options(data):
+    """Re-ranking budget, mode and band from a request ('rerankTopK' 0 turns it off)."""
+    return (int(data.get('rerankTopK', RERANK_TOP_K)), data.get('rerankMode', RERANK_MODE),
+            float(data.get('rerankBand', RERANK_BAND)))
+
+def hybrid_options(data):
+    """Must-have groups and lexical weight from a request (defaulting to the JD's "Must have:" lines)."""
+    must_have = data.get('mustHave')
+    groups = parse_skill_list(must_have) if must_have is not None else parse_must_have(data.get('jobDescription', ''))
+    return groups, float(data.get('lexicalWeight', LEXICAL_WEIGHT))
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_MB} MB"}), 413
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "message": "API is running"})
+    return jsonify({"status": "ok", "message": "API is running", "startup": startup.timings()})
 
 @app.route('/api/upload', methods=['POST'])
 def upload_resume():
@@ -53,47 +247,64 @@ def upload_resume():
     if not allowed_file(file.filename):
         return jsonify({"error": "Invalid file type. Only PDF and DOCX allowed"}), 400
     
+    if request.form.get('rerankMode', RERANK_MODE) not in RERANK_MODES:
+        return jsonify({"error": f"rerankMode must be one of {', '.join(RERANK_MODES)}"}), 400
+    
     try:
-        # Save file
         filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        file.save(file_path)
         
-        # Extract text
-        if filename.lower().endswith('.pdf'):
-            resume_text = extract_text_from_pdf(file_path)
-        elif filename.lower().endswith('.docx'):
-            resume_text = extract_text_from_docx(file_path)
-        else:
+        if not filename.lower().endswith(('.pdf', '.docx')):
             return jsonify({"error": "Unsupported file format"}), 400
         
-        # Extract email from resume
-        email_match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", resume_text)
-        candidate_email = email_match.group(0) if email_match else "No email found"
+        # Read once (bounded by MAX_CONTENT_LENGTH); hashing and extraction work on these bytes
+        data = file.read()
         
-        # Calculate similarity if job description provided
-        score = 0
-        status = "pending"
+        # The same file again is answered from the existing record, without saving a copy
+        digest = content_hash(data)
+        match = find_duplicate(file_hash=digest)
+        if match is not None:
+            return jsonify({"success": True, "duplicate": True, "candidate": resubmission(match, digest)})
         
-        if job_description:
-            preprocessed_job = preprocess_text(job_description)
-            preprocessed_resume = preprocess_text(resume_text)
-            score = similarity_score(preprocessed_job, preprocessed_resume)
-            status = "matched" if score >= THRESHOLD else "rejected"
+        # Extract text from memory (served from the cache when this exact file was seen before);
+        # a CV matching a known candidate by email or text is not embedded
+        found = {}
+        document = embedding_cache.get_or_compute_file(InMemoryFile(filename, data), skip=skip_duplicates(found))
+        resume_text = document.raw_text
+        
+        # Extract email from resume
+        candidate_email = extract_email(resume_text)
+        
+        match = found.get(0) or find_duplicate(raw_text=resume_text, cleaned_text=document.cleaned_text)
+        if match is not None:
+            return jsonify({"success": True, "duplicate": True,
+                            "candidate": resubmission(match, digest, candidate_email)})
         
         # Store candidate info
         candidate_data = {
-            "id": len(processed_candidates) + 1,
+            "id": None,  # assigned by the store
             "email": candidate_email,
             "filename": filename,
-            "score": float(score),
-            "status": status,
+            "storedFilename": upload_writer.save(unique_upload_name(filename), data),
+            "documentKey": document.key,
+            "score": 0.0,
+            "status": "pending",
             "uploadDate": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "resumeText": resume_text[:500]  # First 500 chars for preview
         }
-        processed_candidates.append(candidate_data)
+        candidate_store.add(candidate_data)
+        # Indexed first: the lexical score and must-have check look the candidate up
+        lexical_index.add(candidate_data['id'], document.cleaned_text)
+        
+        # Calculate similarity if job description provided
+        if job_description:
+            job = embedding_cache.get_or_compute_text(job_description)
+            score = score_embeddings(job.embedding, [document.embedding])[0]
+            apply_hybrid(job, [candidate_data], [score], *hybrid_options(request.form), current_threshold())
+            apply_rerank(job_description, [candidate_data], current_threshold(), *rerank_options(request.form))
+        
+        candidate_store.update(candidate_data)
+        index_candidate(candidate_data, document.embedding)
+        dedup_index.add(candidate_data['id'], digest, candidate_email, document.cleaned_text)
         
         return jsonify({
             "success": True,
@@ -112,97 +323,210 @@ def upload_batch():
     files = request.files.getlist('files')
     job_description = request.form.get('jobDescription', '')
     
-    results = []
+    if len(files) > MAX_BATCH_FILES:
+        return jsonify({"error": f"At most {MAX_BATCH_FILES} files per batch"}), 413
+    
+    if request.form.get('rerankMode', RERANK_MODE) not in RERANK_MODES:
+        return jsonify({"error": f"rerankMode must be one of {', '.join(RERANK_MODES)}"}), 400
+    
+    # Read every file first so the batch can be extracted in parallel, straight from memory
+    uploads = []
+    duplicates = []
+    batch_hashes = {}
     
     for file in files:
         if file and allowed_file(file.filename):
             try:
                 filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                unique_filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-                file.save(file_path)
-                
-                # Extract text
-                if filename.lower().endswith('.pdf'):
-                    resume_text = extract_text_from_pdf(file_path)
-                elif filename.lower().endswith('.docx'):
-                    resume_text = extract_text_from_docx(file_path)
-                else:
+                if not filename.lower().endswith(('.pdf', '.docx')):
                     continue
+                data = file.read()
                 
-                # Extract email
-                email_match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", resume_text)
-                candidate_email = email_match.group(0) if email_match else "No email found"
-                
-                # Calculate similarity
-                score = 0
-                status = "pending"
-                
-                if job_description:
-                    preprocessed_job = preprocess_text(job_description)
-                    preprocessed_resume = preprocess_text(resume_text)
-                    score = similarity_score(preprocessed_job, preprocessed_resume)
-                    status = "matched" if score >= THRESHOLD else "rejected"
-                
-                candidate_data = {
-                    "id": len(processed_candidates) + 1,
-                    "email": candidate_email,
-                    "filename": filename,
-                    "score": float(score),
-                    "status": status,
-                    "uploadDate": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                processed_candidates.append(candidate_data)
-                results.append(candidate_data)
+                # Files already on record (or earlier in this batch) are not saved or processed again
+                digest = content_hash(data)
+                match = find_duplicate(file_hash=digest)
+                if match is not None:
+                    duplicates.append({**resubmission(match, digest), "uploadedFilename": filename})
+                    continue
+                if digest in batch_hashes:
+                    duplicates.append({"uploadedFilename": filename, "duplicate": True, "duplicateReason": "file",
+                                       "duplicateOfFile": batch_hashes[digest]})
+                    continue
+                batch_hashes[digest] = filename
+                uploads.append((InMemoryFile(filename, data), digest))
                 
             except Exception as e:
                 print(f"Error processing {file.filename}: {e}")
                 continue
     
+    results = []
+    
+    try:
+        job = embedding_cache.get_or_compute_text(job_description) if job_description else None
+        must_have, lexical_weight = hybrid_options(request.form)
+        threshold = current_threshold()
+        
+        # Documents arrive as soon as they are extracted and embedded, so early
+        # files are scored while scanned PDFs are still in OCR. Resubmissions of
+        # known candidates (same email or near-identical text) skip the model.
+        found = {}
+        for i, document in embedding_cache.iter_files([upload for upload, _ in uploads],
+                                                      skip=skip_duplicates(found)):
+            upload, digest = uploads[i]
+            filename = upload.name
+            
+            # Extract email
+            candidate_email = extract_email(document.raw_text)
+            
+            # Checked again here: a duplicate of a CV earlier in this batch is only known now
+            match = found.get(i) or find_duplicate(raw_text=document.raw_text, cleaned_text=document.cleaned_text)
+            if match is not None:
+                duplicates.append({**resubmission(match, digest, candidate_email), "uploadedFilename": filename})
+                continue
+            
+            candidate_data = {
+                "id": None,
+                "email": candidate_email,
+                "filename": filename,
+                "storedFilename": upload_writer.save(unique_upload_name(filename), upload.data),
+                "documentKey": document.key,
+                "score": 0.0,
+                "status": "pending",
+                "uploadDate": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            candidate_store.add(candidate_data)
+            lexical_index.add(candidate_data['id'], document.cleaned_text)
+            
+            # Calculate similarity
+            if job is not None:
+                score = score_embeddings(job.embedding, [document.embedding])[0]
+                apply_hybrid(job, [candidate_data], [score], must_have, lexical_weight, threshold)
+            
+            candidate_store.update(candidate_data)
+            index_candidate(candidate_data, document.embedding)
+            dedup_index.add(candidate_data['id'], digest, candidate_email, document.cleaned_text)
+            results.append(candidate_data)
+        
+        # The batch's borderline (or best) candidates get a second look from the cross-encoder
+        if job is not None:
+            candidate_store.update(apply_rerank(job_description, results, threshold, *rerank_options(request.form)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
     return jsonify({
         "success": True,
         "processed": len(results),
-        "candidates": results
+        "candidates": results,
+        "duplicates": duplicates
     })
 
 @app.route('/api/candidates', methods=['GET'])
 def get_candidates():
-    """Get all processed candidates"""
-    return jsonify({"candidates": processed_candidates})
+    """Get processed candidates (optionally ?status=, ?offset= and ?limit=), streamed"""
+    limit = request.args.get('limit')
+    return stream_candidates(candidate_store.iter(status=request.args.get('status'),
+                                                  offset=int(request.args.get('offset', 0)),
+                                                  limit=int(limit) if limit is not None else None))
 
 @app.route('/api/filter', methods=['POST'])
 def filter_candidates():
     """Apply filtering criteria to existing candidates"""
     data = request.json
     job_description = data.get('jobDescription', '')
-    min_score = float(data.get('minScore', THRESHOLD))
+    min_score = float(data.get('minScore', current_threshold()))
+    chunk_aggregate = data.get('chunkAggregate')  # 'max', 'mean' or 'topk' to score long CVs in chunks
+    # 'mustHave' ("python; pytorch or tensorflow") and 'lexicalWeight' (0..1) turn on hybrid scoring
+    must_have, lexical_weight = hybrid_options(data)
     
     if not job_description:
         return jsonify({"error": "Job description required"}), 400
     
-    # Reprocess all candidates with new job description
-    for candidate in processed_candidates:
-        file_path = os.path.join(UPLOAD_FOLDER, candidate['filename'])
+    if chunk_aggregate and chunk_aggregate not in CHUNK_AGGREGATES:
+        return jsonify({"error": f"chunkAggregate must be one of {', '.join(CHUNK_AGGREGATES)}"}), 400
+    
+    if data.get('rerankMode', RERANK_MODE) not in RERANK_MODES:
+        return jsonify({"error": f"rerankMode must be one of {', '.join(RERANK_MODES)}"}), 400
+    
+    job = embedding_cache.get_or_compute_text(job_description)
+    
+    if must_have or lexical_weight > 0:
+        # Candidates stored before the lexical index existed are indexed once
+        for page in candidate_store.iter_pages():
+            for candidate, document in stored_documents([c for c in page if c['id'] not in lexical_index]):
+                lexical_index.add(candidate['id'], document.cleaned_text)
+    
+    if not chunk_aggregate:
+        # Re-rank the whole pool from the local index: one matrix-vector product, no files read
+        index_scores = {candidate_id: score for candidate_id, score, _ in candidate_index.search(job.embedding, include_metadata=False)}
+    
+    # Rescored and written back one page at a time; (id, score, eligible) kept for the re-ranking stage
+    scored = []
+    for page in candidate_store.iter_pages():
+        if chunk_aggregate:
+            # Chunked scoring needs the preprocessed text, which the cache already holds
+            pairs = stored_documents(page)
+            rescored = [candidate for candidate, _ in pairs]
+            documents = [document for _, document in pairs]
+            matches = score_chunked(job.embedding, [document.cleaned_text for document in documents],
+                                    aggregate=chunk_aggregate, top_k=int(data.get('topK', 3)))
+            scores = [match.score for match in matches]
+            best_chunks = [match.best_chunk for match in matches]
+        else:
+            rescored = [c for c in page if str(c['id']) in index_scores]
+            scores = [index_scores[str(c['id'])] for c in rescored]
+            best_chunks = None
         
-        if os.path.exists(file_path):
-            if candidate['filename'].lower().endswith('.pdf'):
-                resume_text = extract_text_from_pdf(file_path)
-            else:
-                resume_text = extract_text_from_docx(file_path)
-            
-            preprocessed_job = preprocess_text(job_description)
-            preprocessed_resume = preprocess_text(resume_text)
-            score = similarity_score(preprocessed_job, preprocessed_resume)
-            
-            candidate['score'] = float(score)
-            candidate['status'] = "matched" if score >= min_score else "rejected"
+        apply_hybrid(job, rescored, scores, must_have, lexical_weight, min_score, best_chunks)
+        candidate_store.update(rescored)
+        scored.extend((c['id'], c['score'], not c.get('missingSkills')) for c in rescored)
+    
+    # Only the k candidates picked from the whole pool are loaded again and re-ranked
+    top_k, mode, band = rerank_options(data)
+    picked = select_for_rerank([score for _, score, _ in scored], min_score, top_k, mode, band,
+                               [eligible for _, _, eligible in scored])
+    if picked:
+        candidates = [find_candidate(scored[i][0]) for i in picked]
+        candidate_store.update(apply_rerank(job_description, candidates, min_score, top_k, mode, band))
+    
+    return stream_candidates(candidate_store.iter(), success=True)
+
+@app.route('/api/search', methods=['POST'])
+def search_candidates():
+    """
+    Rank stored candidates against a job description without re-reading any CV.
+
+    The index only supplies IDs and similarities: each hit is returned as the
+    candidate's current record (status, screening score, ...) with the
+    similarity in `searchScore`. Hits no longer in the store are left out.
+    """
+    data = request.json
+    job_description = data.get('jobDescription', '')
+    top_k = data.get('topK')
+    min_score = data.get('minScore')
+    
+    if not job_description:
+        return jsonify({"error": "Job description required"}), 400
+    
+    job = embedding_cache.get_or_compute_text(job_description)
+    matches = candidate_index.search(
+        job.embedding,
+        top_k=int(top_k) if top_k is not None else None,
+        threshold=float(min_score) if min_score is not None else None,
+        include_metadata=False
+    )
+    candidates = candidate_store.get_many(candidate_id for candidate_id, _, _ in matches)
     
     return jsonify({
         "success": True,
-        "candidates": processed_candidates
+        "candidates": [{**candidates[int(candidate_id)], "searchScore": score}
+                       for candidate_id, score, _ in matches if int(candidate_id) in candidates]
     })
 
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Embedding cache hit/miss counters"""
+    return jsonify(embedding_cache.stats())
+
 @app.route('/api/send-emails', methods=['POST'])
 def send_emails():
     """Send emails to all candidates"""
@@ -231,50 +555,71 @@ We appreciate your interest and encourage you to apply for future openings.
 Best regards,
 HR Team"""
     
-    sent_count = 0
+    recipients = []
+    messages = []
+    emailed = set()
     
-    for candidate in processed_candidates:
+    for candidate in candidate_store.iter(status=None if send_to == 'all' else send_to):
         if candidate['email'] == "No email found":
             continue
         
+        # One email per applicant, even if older records hold them twice
+        address = normalize_email(candidate['email']) or candidate['email']
+        if address in emailed:
+            continue
+        
         if send_to == 'all' or send_to == candidate['status']:
-            try:
-                if candidate['status'] == 'matched':
-                    send_email(EMAIL_USER, EMAIL_PASS, candidate['email'], PASS_SUBJECT, PASS_BODY)
-                else:
-                    send_email(EMAIL_USER, EMAIL_PASS, candidate['email'], REJECT_SUBJECT, REJECT_BODY)
-                sent_count += 1
-            except Exception as e:
-                print(f"Failed to send email to {candidate['email']}: {e}")
+            emailed.add(address)
+            recipients.append(candidate)
+            if candidate['status'] == 'matched':
+                messages.append((candidate['email'], PASS_SUBJECT, PASS_BODY))
+            else:
+                messages.append((candidate['email'], REJECT_SUBJECT, REJECT_BODY))
+    
+    # One pooled mailer run reuses a few SMTP connections for the whole mailout
+    results = BulkMailer(EMAIL_USER, EMAIL_PASS).send_all(messages)
     
     return jsonify({
         "success": True,
-        "sent": sent_count
+        "sent": sum(1 for result in results if result.success),
+        "results": [
+            {"id": candidate['id'], "email": result.receiver_email, "delivered": result.success,
+             "attempts": result.attempts, "error": result.error}
+            for candidate, result in zip(recipients, results)
+        ]
     })
 
 @app.route('/api/export-csv', methods=['GET'])
 def export_csv():
-    """Export candidates report as CSV"""
-    df = pd.DataFrame(processed_candidates)
-    csv_path = 'candidates_report.csv'
-    df.to_csv(csv_path, index=False)
+    """Export candidates report as CSV (or Parquet with ?format=parquet), streamed page by page"""
+    if request.args.get('format') == 'parquet':
+        chunks = candidate_store.export_parquet()
+        try:
+            first = next(chunks)
+        except ImportError as e:
+            return jsonify({"error": str(e)}), 501
+        return Response(stream_with_context(itertools.chain([first], chunks)), mimetype='application/vnd.apache.parquet',
+                        headers={"Content-Disposition": "attachment; filename=candidates_report.parquet"})
     
-    return send_file(csv_path, as_attachment=True, download_name='candidates_report.csv')
+    return Response(stream_with_context(candidate_store.export_csv()), mimetype='text/csv',
+                    headers={"Content-Disposition": "attachment; filename=candidates_report.csv"})
 
 @app.route('/api/delete-candidate/<int:candidate_id>', methods=['DELETE'])
 def delete_candidate(candidate_id):
     """Delete a candidate"""
-    global processed_candidates
-    processed_candidates = [c for c in processed_candidates if c['id'] != candidate_id]
+    candidate_store.delete(candidate_id)
+    candidate_index.delete(candidate_id)
+    lexical_index.remove(candidate_id)
+    dedup_index.remove(candidate_id)
     return jsonify({"success": True})
 
 @app.route('/api/threshold', methods=['POST'])
 def update_threshold():
     """Update the similarity threshold"""
-    global THRESHOLD
     data = request.json
-    THRESHOLD = float(data.get('threshold', 0.3))
-    return jsonify({"success": True, "threshold": THRESHOLD})
+    threshold = float(data.get('threshold', 0.3))
+    candidate_store.set_setting('threshold', threshold)
+    return jsonify({"success": True, "threshold": threshold})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
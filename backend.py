@@ -1,35 +1,56 @@
+import startup  # first, so startup timings start at process launch
+
 import os
 import uuid
+import atexit
 import datetime
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct
 
 # --- IMPORT YOUR CUSTOM MODULES ---
-# We use the model from similarity.py to avoid loading it twice
-from similarity import similarity_score, model 
+# We use the model from similarity.py to avoid loading it twice (it loads lazily on first use)
+from similarity import encode_texts, warm_up
+from job_roles import get_job_roles
 from preprocessing import preprocess_text
-from extract_text import extract_text_from_pdf, extract_text_from_docx
+from lexical import parse_must_have, parse_skill_list, missing_must_have
+from extract_text import extract_text_from_file, InMemoryFile
 from email_handler import send_email
+from intake_queue import IntakeQueue, QueueFull
+from candidate_index import CandidateIndex
+from metrics import instrument_app, span, traced
+from qdrant_writer import QdrantWriter, CachedProbe, connect
+from dedup import DuplicateIndex, content_hash, file_hash
+from upload_writer import UploadWriter
+from reranker import get_reranker, select_for_rerank, RERANK_TOP_K, RERANK_BAND, RERANK_THRESHOLD
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+# Stage timings and request latency, exposed on /api/metrics
+instrument_app(app)
 
 # --- Configuration ---
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Screened CVs are extracted from memory; the originals are written out in the background (PERSIST_UPLOADS)
+upload_writer = UploadWriter(UPLOAD_FOLDER)
+atexit.register(upload_writer.stop)
 
-QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_URL = os.getenv("QDRANT_URL")  # ":memory:" runs an in-process Qdrant (tests, demos)
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME", "candidates")
 EMAIL_USER = os.getenv("EMAIL")
 EMAIL_PASS = os.getenv("PASSWORD")
 THRESHOLD = 0.75  # Similarity threshold for acceptance
+# "sync" runs the whole pipeline inside the request; "queue" returns an application ID
+# straight away and processes it on a background worker pool
+INTAKE_MODE = os.getenv("INTAKE_MODE", "sync")
+# Match every application against all JDs in 'job descriptions/' and assign the best-fit role
+MATCH_ALL_ROLES = os.getenv("MATCH_ALL_ROLES", "0") == "1"
 
 # --- Load Job Description ---
 # We read the specific job description file you have in your repo
@@ -43,27 +64,264 @@ except FileNotFoundError:
     print(f"⚠️ Warning: Could not find {JD_PATH}. Using default.")
     RAW_JOB_DESCRIPTION = "AI Engineer with Python and Machine Learning skills."
 
-# Preprocess JD once at startup
-CLEANED_JD = preprocess_text(RAW_JOB_DESCRIPTION)
+# Preprocessed JD, must-haves and JD embedding are computed on first use (preprocessing loads NLTK)
+_cleaned_jd = None
+_must_have = None
+_jd_vector = None
+_jd_lock = threading.Lock()
+
+
+def get_cleaned_jd():
+    """The loaded JD, preprocessed once."""
+    global _cleaned_jd
+    if _cleaned_jd is None:
+        with _jd_lock:
+            if _cleaned_jd is None:
+                _cleaned_jd = preprocess_text(RAW_JOB_DESCRIPTION)
+    return _cleaned_jd
+
+
+def get_must_have():
+    """Hard requirements from MUST_HAVE_SKILLS ("python; pytorch or tensorflow"), or the JD's "Must have:" lines."""
+    global _must_have
+    if _must_have is None:
+        skills = os.getenv("MUST_HAVE_SKILLS")
+        _must_have = parse_skill_list(skills) if skills else parse_must_have(RAW_JOB_DESCRIPTION)
+    return _must_have
+
+
+def get_jd_vector():
+    """Embedding of the loaded JD, computed on first use instead of once per application."""
+    global _jd_vector
+    if _jd_vector is None:
+        _jd_vector = encode_texts([get_cleaned_jd()])[0]
+    return _jd_vector
 
 
 # --- Initialize Database ---
-print(f"Connecting to Qdrant: {COLLECTION_NAME}...")
-client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+# The client (and qdrant_client itself) is only loaded when the writer is first needed
+_qdrant_writer = None
+_collection_probe = None
+_qdrant_lock = threading.Lock()
+
+
+def _connect_qdrant():
+    global _qdrant_writer, _collection_probe
+    with _qdrant_lock:
+        if _qdrant_writer is None:
+            print(f"Connecting to Qdrant: {COLLECTION_NAME}...")
+            client = connect(QDRANT_URL, QDRANT_API_KEY)
+            # Health checks reuse the last collection lookup for a few seconds
+            _collection_probe = CachedProbe(lambda: client.get_collection(COLLECTION_NAME).points_count
+                                            if client.collection_exists(COLLECTION_NAME) else 0)
+            # Accepted candidates are buffered and upserted in batches in the background;
+            # if Qdrant is down they are spilled to disk and retried instead of being lost
+            writer = QdrantWriter(client, COLLECTION_NAME).start()
+            atexit.register(writer.stop)
+            _qdrant_writer = writer
+
+
+def get_qdrant_writer():
+    """The QdrantWriter, connecting on first use."""
+    if _qdrant_writer is None:
+        _connect_qdrant()
+    return _qdrant_writer
+
+
+def get_collection_probe():
+    """CachedProbe of the collection's point count, connecting on first use."""
+    if _collection_probe is None:
+        _connect_qdrant()
+    return _collection_probe
+
+
+def warm_up_backend():
+    """Connect to Qdrant (replaying spilled points), prepare the JD and load the model."""
+    get_qdrant_writer()
+    get_must_have()
+    get_jd_vector()
+    warm_up()
+
+# Local copy of every accepted applicant's vector, used to re-rank against new job descriptions
+applicant_index = CandidateIndex(os.getenv("APPLICANT_INDEX_DIR", os.path.join('cache', 'applicant_index')))
+
+# Screened CVs by file hash, applicant email and text fingerprint, with the decision they got;
+# a resubmission gets that decision back instead of being screened (and emailed) again
+dedup_index = DuplicateIndex(os.getenv("DEDUP_INDEX_PATH", os.path.join('cache', 'applicant_dedup.sqlite')))
+
+
+# Load the model in the background so health checks answer before it is ready
+if os.getenv("WARM_UP_MODEL", "0") == "1":
+    threading.Thread(target=warm_up_backend, name="model-warm-up", daemon=True).start()
+
+print(f"Startup finished in {startup.mark('app_ready'):.2f}s")
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    try:
-        info = client.get_collection(COLLECTION_NAME)
-        return jsonify({
-            "success": True, 
-            "message": "System Online", 
-            "threshold": THRESHOLD,
-            "candidates_stored": info.points_count
+    ok, result, age = get_collection_probe().get()
+    if not ok:
+        return jsonify({"success": False, "message": result, "pending_writes": get_qdrant_writer().stats()}), 500
+    return jsonify({
+        "success": True, 
+        "message": "System Online", 
+        "threshold": THRESHOLD,
+        "candidates_stored": result,
+        "pending_writes": get_qdrant_writer().stats(),
+        "checked_seconds_ago": age,
+        "startup": startup.timings()
+    })
+
+
+def remember_application(candidate_id, digest, email, cleaned_resume, result):
+    """Record a screening decision for duplicate detection and return it."""
+    dedup_index.add(candidate_id, digest, email, cleaned_resume, record=result)
+    return result
+
+
+def duplicate_response(match):
+    return {**match.record, "application_id": match.candidate_id, "duplicate": True,
+            "duplicateReason": match.reason, "message": "This CV has already been screened."}
+
+
+def send_decision_email(email, subject, body):
+    send_email(EMAIL_USER, EMAIL_PASS, email, subject, body)
+
+
+def process_application(candidate_id, full_name, email, filename, file_path=None, progress=None, data=None,
+                        resume_text=None, notify=send_decision_email):
+    """
+    Run the screening pipeline for one CV and return the response payload.
+
+    The CV is either the uploaded bytes (`data`, extracted in memory) or a
+    saved file at `file_path` (queued applications); `resume_text` skips
+    extraction when the caller already ran it. `progress(stage)` is called
+    as the pipeline moves through its steps so the intake queue can report
+    it on the status endpoint. `notify(email, subject, body)` sends the
+    decision email (the async server queues it instead of blocking).
+    """
+    progress = progress or (lambda stage: None)
+    digest = content_hash(data) if data is not None else file_hash(file_path)
+
+    # 3. Extract Text (Using your extract_text.py)
+    progress("extracting")
+    if resume_text is None:
+        resume_text = extract_text_from_file(InMemoryFile(filename, data) if data is not None else file_path)
+
+    # 4. Preprocess & Filter (Using your preprocessing.py and similarity.py)
+    progress("scoring")
+    print(f"Processing application for: {full_name}")
+    cleaned_resume = preprocess_text(resume_text)
+    
+    # The same CV under a new file (re-exported, small edits) reuses the earlier decision
+    match = dedup_index.find_near(cleaned_resume)
+    if match is not None and match.record is not None:
+        print(f"Near-duplicate of application {match.candidate_id} (similarity {match.similarity:.2f})")
+        dedup_index.link(match.candidate_id, digest, email)
+        if file_path is not None:
+            os.remove(file_path)
+        return duplicate_response(match)
+    
+    # A CV without a must-have skill is rejected before the model runs
+    missing = [] if MATCH_ALL_ROLES else missing_must_have(cleaned_resume, get_must_have())
+    
+    if missing:
+        score = 0.0
+        accepted = False
+        print(f"Missing must-have skills: {'; '.join(missing)}")
+    else:
+        # Generate Vector (using the model from similarity.py)
+        # We encode the cleaned text once; it is used for scoring and for vector storage
+        vector = encode_texts([cleaned_resume])[0]
+
+        # Calculate Score
+        if MATCH_ALL_ROLES:
+            roles = get_job_roles(default_threshold=THRESHOLD)
+            best_role, score = roles.best_fit(roles.score([vector])[0])
+            accepted = best_role is not None
+            job_title = roles.titles[best_role] if accepted else None
+            print(f"Best role: {job_title} with similarity {score:.4f}")
+        else:
+            score = float(vector @ get_jd_vector())
+            accepted = score >= THRESHOLD
+            job_title = "AI Engineer"
+            print(f"Similarity Score: {score:.4f} (Threshold: {THRESHOLD})")
+            # A score close to the threshold is decided by the cross-encoder (one pair, cached)
+            if select_for_rerank([score], THRESHOLD, min(RERANK_TOP_K, 1), 'band', RERANK_BAND):
+                rerank_score = float(get_reranker().score(RAW_JOB_DESCRIPTION, [resume_text])[0])
+                accepted = rerank_score >= RERANK_THRESHOLD
+                print(f"Re-rank Score: {rerank_score:.4f} (Threshold: {RERANK_THRESHOLD})")
+
+    # 5. Decision Logic
+    if not accepted:
+        # REJECTION PATH
+        print("❌ Candidate rejected. Sending rejection email...")
+        
+        # Send Email (Using your email_handler.py)
+        if email and EMAIL_USER and EMAIL_PASS:
+            progress("emailing")
+            subject = "Update regarding your application"
+            body = f"Dear {full_name},\n\nThank you for your application. Unfortunately, we will not be moving forward at this time.\n\nBest regards,\nHR Team"
+            notify(email, subject, body)
+
+        return remember_application(candidate_id, digest, email, cleaned_resume, {
+            "success": False,
+            "message": f"Application declined based on AI screening. Score: {score:.2f}",
+            "status": "rejected",
+            "missingSkills": missing
         })
-    except Exception as e:
-        return jsonify({"success": False, "message": str(e)}), 500
+
+    # SUCCESS PATH
+    print("✅ Candidate matched! Saving to database...")
+    progress("storing")
+
+    name_parts = full_name.split()
+    first_name = name_parts[0] if name_parts else ""
+    last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+
+    payload = {
+        "candidate_id": candidate_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "status": "interviewing",
+        "applied_date": datetime.date.today().isoformat(),
+        "applied_job_title": job_title,
+        "filename": filename,
+        "skills": f"AI Match Score: {score:.2f}"
+    }
+
+    # Save to Qdrant (queued; written in the next batch)
+    get_qdrant_writer().add(candidate_id, vector, payload)
+    applicant_index.add(candidate_id, vector, payload)
+
+    # Send Interview Email
+    if email and EMAIL_USER and EMAIL_PASS:
+        progress("emailing")
+        subject = "Interview Invitation"
+        body = f"Dear {full_name},\n\nYour resume matches our requirements! We would like to invite you to an interview.\n\nBest regards,\nHR Team"
+        notify(email, subject, body)
+
+    return remember_application(candidate_id, digest, email, cleaned_resume, {
+        "success": True, 
+        "message": "Application accepted! Check your email.",
+        "application_id": candidate_id,
+        "score": score,
+        "job_title": job_title
+    })
+
+
+def _run_queued_application(application_id, job, progress):
+    # Queued jobs run outside any request, so trace them on their own
+    with traced(f"application {application_id}"):
+        return process_application(application_id, job["name"], job["email"],
+                                   job["filename"], job["file_path"], progress)
+
+
+intake_queue = None
+if INTAKE_MODE == "queue":
+    intake_queue = IntakeQueue(_run_queued_application)
+    intake_queue.start()
 
 
 @app.route('/api/apply', methods=['POST'])
@@ -77,91 +335,97 @@ def apply():
         if not file:
             return jsonify({"success": False, "message": "No file uploaded"}), 400
 
-        # 2. Save File
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-
-        # 3. Extract Text (Using your extract_text.py)
-        if filename.lower().endswith('.pdf'):
-            resume_text = extract_text_from_pdf(file_path)
-        elif filename.lower().endswith('.docx'):
-            resume_text = extract_text_from_docx(file_path)
-        else:
+        if not filename.lower().endswith(('.pdf', '.docx')):
             return jsonify({"success": False, "message": "Unsupported file format"}), 400
 
-        # 4. Preprocess & Filter (Using your preprocessing.py and similarity.py)
-        print(f"Processing application for: {full_name}")
-        cleaned_resume = preprocess_text(resume_text)
-        
-        # Calculate Score
-        score = similarity_score(CLEANED_JD, cleaned_resume)
-        print(f"Similarity Score: {score:.4f} (Threshold: {THRESHOLD})")
-
-        # 5. Decision Logic
-        if score < THRESHOLD:
-            # REJECTION PATH
-            print("❌ Candidate rejected. Sending rejection email...")
-            
-            # Send Email (Using your email_handler.py)
-            if email and EMAIL_USER and EMAIL_PASS:
-                subject = "Update regarding your application"
-                body = f"Dear {full_name},\n\nThank you for your application. Unfortunately, we will not be moving forward at this time.\n\nBest regards,\nHR Team"
-                send_email(EMAIL_USER, EMAIL_PASS, email, subject, body)
-
-            return jsonify({
-                "success": False,
-                "message": f"Application declined based on AI screening. Score: {score:.2f}",
-                "status": "rejected"
-            })
-
-        # SUCCESS PATH
-        print("✅ Candidate matched! Saving to database...")
-        
-        # Generate Vector (using the model from similarity.py)
-        # We re-encode the *original* text or cleaned text for the vector storage
-        # usually cleaner to store vector of the cleaned text
-        vector = model.encode(cleaned_resume).tolist()
+        # Read once; hashing, extraction and the (optional) saved copy all use these bytes
+        data = file.read()
 
+        # A CV already screened (same file, or same applicant email) gets its decision back
+        digest = content_hash(data)
+        match = dedup_index.find_exact(digest, email)
+        if match is not None and match.record is not None:
+            dedup_index.link(match.candidate_id, digest)
+            return jsonify(duplicate_response(match))
+
+        # Reject early instead of saving a file we cannot queue
+        if intake_queue is not None and intake_queue.pending_count() >= intake_queue.max_pending:
+            response = jsonify({"success": False, "message": "Too many applications in progress, please retry shortly"})
+            response.headers["Retry-After"] = "30"
+            return response, 503
+
+        # Stored files are prefixed with the application ID so concurrent uploads never collide
         candidate_id = str(uuid.uuid4())
-        name_parts = full_name.split()
-        first_name = name_parts[0]
-        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-
-        payload = {
-            "candidate_id": candidate_id,
-            "first_name": first_name,
-            "last_name": last_name,
-            "email": email,
-            "status": "interviewing",
-            "applied_date": datetime.date.today().isoformat(),
-            "applied_job_title": "AI Engineer",
-            "filename": filename,
-            "skills": f"AI Match Score: {score:.2f}"
-        }
-
-        # Save to Qdrant
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=[PointStruct(id=candidate_id, vector=vector, payload=payload)]
-        )
-
-        # Send Interview Email
-        if email and EMAIL_USER and EMAIL_PASS:
-            subject = "Interview Invitation"
-            body = f"Dear {full_name},\n\nYour resume matches our requirements! We would like to invite you to an interview.\n\nBest regards,\nHR Team"
-            send_email(EMAIL_USER, EMAIL_PASS, email, subject, body)
+        stored_filename = f"{candidate_id}_{filename}"
+
+        if intake_queue is None:
+            # Screened straight from memory; the original is saved afterwards, off the request path
+            result = process_application(candidate_id, full_name, email, filename, data=data)
+            if not result.get("duplicate"):
+                upload_writer.save(stored_filename, data)
+            return jsonify(result)
+
+        # 2. Save File: a queued application must survive a restart, so it is written before we answer
+        file_path = os.path.join(UPLOAD_FOLDER, stored_filename)
+        with span("file_save"):
+            with open(file_path, 'wb') as f:
+                f.write(data)
+
+        try:
+            intake_queue.submit({
+                "name": full_name,
+                "email": email,
+                "filename": filename,
+                "file_path": file_path
+            }, application_id=candidate_id)
+        except QueueFull as e:
+            os.remove(file_path)
+            response = jsonify({"success": False, "message": str(e)})
+            response.headers["Retry-After"] = "30"
+            return response, 503
 
         return jsonify({
-            "success": True, 
-            "message": "Application accepted! Check your email.",
+            "success": True,
+            "message": "Application received and queued for screening.",
             "application_id": candidate_id,
-            "score": score
-        })
+            "status": "queued",
+            "status_url": f"/api/applications/{candidate_id}"
+        }), 202
 
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+
+@app.route('/api/search', methods=['POST'])
+def search_applicants():
+    """Rank stored applicants against a job description (the loaded one by default)."""
+    data = request.json or {}
+    job_description = data.get('jobDescription')
+    top_k = data.get('topK', 50)
+    min_score = data.get('minScore')
+
+    job_vector = encode_texts([preprocess_text(job_description)])[0] if job_description else get_jd_vector()
+    matches = applicant_index.search(
+        job_vector,
+        top_k=int(top_k) if top_k is not None else None,
+        threshold=float(min_score) if min_score is not None else None
+    )
+    return jsonify({
+        "success": True,
+        "candidates": [{**payload, "score": score} for _, score, payload in matches]
+    })
+
+
+@app.route('/api/applications/<application_id>', methods=['GET'])
+def application_status(application_id):
+    if intake_queue is None:
+        return jsonify({"success": False, "message": "Intake queue is disabled (INTAKE_MODE=sync)"}), 404
+    record = intake_queue.status(application_id)
+    if record is None:
+        return jsonify({"success": False, "message": "Unknown application ID"}), 404
+    return jsonify({"success": True, **record})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,90 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import registry
+
+registry.describe("hr_encode_batches_total", "Forward passes run by the batching encoder")
+registry.describe("hr_encode_batched_requests_total", "encode calls served by the batching encoder")
+
+
+class BatchingEncoder:
+    """
+    Micro-batch concurrent encode calls into shared forward passes.
+
+    Request threads call `encode(texts)` and block; a single inference
+    thread collects whatever requests arrive within `max_wait` seconds (up
+    to `max_batch` texts), runs them through `encode_fn(texts, batch_size)`
+    as one batch and hands every caller its own rows back. The model's
+    mini-batch size is the smallest any caller in the batch asked for. Many simultaneous single-CV
+    uploads then cost a few batched forward passes instead of one pass per
+    request fighting over the same model and CPU cores, and the model is
+    only ever called from one thread.
+    """
+
+    def __init__(self, encode_fn, max_batch=32, max_wait=0.005):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def encode(self, texts, batch_size=None):
+        """
+        Embeddings for `texts` (rows in input order), computed in a shared batch.
+
+        The model encodes it in mini-batches of at most `batch_size` texts (default `max_batch`).
+        """
+        texts = list(texts)
+        batch_size = batch_size or self.max_batch
+        if not texts:
+            return self.encode_fn(texts, batch_size)
+        future = Future()
+        self._ensure_started()
+        self._queue.put((texts, batch_size, future))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        count = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            count += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request_texts, _, _ in batch for text in request_texts]
+            batch_size = min(request_batch_size for _, request_batch_size, _ in batch)
+            try:
+                embeddings = np.asarray(self.encode_fn(texts, batch_size))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            registry.inc("hr_encode_batches_total")
+            registry.inc("hr_encode_batched_requests_total", len(batch))
+            start = 0
+            for request_texts, _, future in batch:
+                future.set_result(embeddings[start:start + len(request_texts)])
+                start += len(request_texts)
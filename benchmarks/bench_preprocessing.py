@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: preprocess_text / preprocess_texts against the original implementation.
+
+Run from the repository root:
+
+    python benchmarks/bench_preprocessing.py --docs 2000 --repeat 5
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import preprocess_text, preprocess_texts, get_stop_words  # noqa: E402
+
+WORDS = ("python pytorch tensorflow machine learning deep engineer data pipelines the and of with "
+         "for a in on experience team project models deployed production cloud aws gcp azure nlp "
+         "computer vision research José Müller Zoë résumé c++ node.js e-mail 2019-2024 b.sc.").split()
+
+
+def legacy_preprocess_text(text, stop_words):
+    # The original three-pass implementation, kept as the baseline
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    words = text.split()
+    filtered_words = [word for word in words if word not in stop_words]
+    return ' '.join(filtered_words)
+
+
+def make_corpus(docs, words_per_doc, seed=0, ascii_only=False):
+    rng = random.Random(seed)
+    vocabulary = [word for word in WORDS if word.isascii()] if ascii_only else WORDS
+    corpus = []
+    for _ in range(docs):
+        tokens = [rng.choice(vocabulary) for _ in range(words_per_doc)]
+        for _ in range(3):
+            tokens.insert(rng.randrange(len(tokens)), rng.choice(
+                ["https://github.com/someone/repo", "www.linkedin.com/in/someone", "name@example.com"]))
+        corpus.append(" ".join(tokens) + ".\n")
+    return corpus
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=600, help="words per synthetic resume")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--ascii', action='store_true', help="generate ASCII-only resumes")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.words, ascii_only=args.ascii)
+    megabytes = sum(len(doc.encode('utf-8')) for doc in corpus) / 1e6
+    legacy_stop_words = set(get_stop_words())
+
+    # Same output is a precondition for comparing speed
+    for doc in corpus[:200]:
+        assert preprocess_text(doc, unicode=False) == legacy_preprocess_text(doc, legacy_stop_words)
+
+    runs = [
+        ("legacy preprocess_text", lambda: [legacy_preprocess_text(d, legacy_stop_words) for d in corpus]),
+        ("preprocess_text", lambda: [preprocess_text(d, unicode=False) for d in corpus]),
+        ("preprocess_texts (batch)", lambda: preprocess_texts(corpus, unicode=False)),
+        ("preprocess_texts (unicode)", lambda: preprocess_texts(corpus, unicode=True)),
+    ]
+    print(f"{args.docs} docs, {megabytes:.2f} MB, best of {args.repeat}")
+    baseline = None
+    for name, fn in runs:
+        seconds = best_of(fn, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:<28} {seconds * 1000:8.1f} ms  {megabytes / seconds:7.1f} MB/s  x{baseline / seconds:.2f}")
+
+
+if __name__ == '__main__':
+    main()
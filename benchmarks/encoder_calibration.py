@@ -0,0 +1,200 @@
+"""
+Accuracy and speed of the int8 / ONNX encoder backends against the fp32 PyTorch baseline.
+
+Every resume in a folder is scored against every job description with each
+backend. The report shows how far the scores move, whether the candidate
+ranking changes, and which accept/reject decisions flip at the thresholds the
+apps use. Each backend runs in its own process, so the reported peak RSS is
+what one worker process would need:
+
+    python benchmarks/encoder_calibration.py --resumes resumes/ --backends int8 onnx
+    ENCODER_ONNX_FILE=onnx/model_qint8_avx512_vnni.onnx python benchmarks/encoder_calibration.py --backends onnx
+
+Exits with status 1 when more decisions flip than --max-flips allows.
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("HR_OFFLINE", "1")
+
+from encoder_backends import load_encoder, BACKENDS, ENCODER_ONNX_FILE  # noqa: E402
+from similarity import MODEL_NAME, BATCH_SIZE  # noqa: E402
+
+# main.py screens at 0.3, backend.py at 0.75
+DEFAULT_THRESHOLDS = (0.3, 0.75)
+
+
+def _encode_with_backend(model_name, backend, onnx_file, jd_texts, resume_texts, repeat):
+    # Runs in a fresh process so load time and memory belong to this backend alone
+    start = time.perf_counter()
+    model = load_encoder(model_name, backend=backend, onnx_file=onnx_file)
+    load_seconds = time.perf_counter() - start
+
+    def encode(texts):
+        return model.encode(texts, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                            normalize_embeddings=True, show_progress_bar=False).astype(np.float32)
+
+    encode(resume_texts[:BATCH_SIZE])  # warm-up
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resume_embeddings = encode(resume_texts)
+        best = min(best, time.perf_counter() - start)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    return encode(jd_texts), resume_embeddings, load_seconds, best, peak_rss
+
+
+def run_backend(model_name, backend, onnx_file, jd_texts, resume_texts, repeat):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_encode_with_backend, (model_name, backend, onnx_file, jd_texts, resume_texts, repeat))
+
+
+def _ranks(values):
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return ranks
+
+
+def compare(baseline, candidate, files, role_keys, thresholds, top_n=10):
+    """Score/rank/decision agreement of `candidate` against `baseline` ((N, roles) score matrices)."""
+    base_scores, scores = baseline["scores"], candidate["scores"]
+    delta = np.abs(scores - base_scores)
+    agreement = np.sum(baseline["resume_embeddings"] * candidate["resume_embeddings"], axis=1)
+
+    spearman, overlap = [], []
+    for role in range(base_scores.shape[1]):
+        if len(files) > 1:
+            spearman.append(float(np.corrcoef(_ranks(base_scores[:, role]), _ranks(scores[:, role]))[0, 1]))
+        k = min(top_n, len(files))
+        top_base = set(np.argsort(-base_scores[:, role])[:k])
+        top_candidate = set(np.argsort(-scores[:, role])[:k])
+        overlap.append(len(top_base & top_candidate) / k if k else 1.0)
+
+    flips = []
+    for threshold in thresholds:
+        flipped = np.argwhere((base_scores >= threshold) != (scores >= threshold))
+        for row, role in flipped:
+            flips.append({"threshold": threshold, "file": files[row], "role": role_keys[role],
+                          "baseline": round(float(base_scores[row, role]), 4),
+                          "score": round(float(scores[row, role]), 4)})
+
+    return {
+        "embedding_cosine_mean": round(float(agreement.mean()), 5),
+        "embedding_cosine_min": round(float(agreement.min()), 5),
+        "score_delta_mean": round(float(delta.mean()), 5),
+        "score_delta_max": round(float(delta.max()), 5),
+        "spearman_min": round(min(spearman), 5) if spearman else None,
+        f"top{top_n}_overlap_min": round(min(overlap), 3),
+        "decision_flips": flips,
+    }
+
+
+def load_texts(resume_folder, jobs_folder):
+    from extraction_pool import extract_many
+    from preprocessing import preprocess_texts
+
+    file_paths = sorted(os.path.join(resume_folder, file) for file in os.listdir(resume_folder)
+                        if file.lower().endswith(('.pdf', '.docx')))
+    extracted = dict(extract_many(file_paths))
+    file_paths = [file_path for file_path in file_paths if extracted.get(file_path, "").strip()]
+    resume_texts = preprocess_texts([extracted[file_path] for file_path in file_paths])
+
+    role_keys, jd_texts = [], []
+    for file in sorted(os.listdir(jobs_folder)):
+        if file.lower().endswith('.txt'):
+            with open(os.path.join(jobs_folder, file), 'r', encoding='utf-8') as f:
+                jd_texts.append(f.read())
+            role_keys.append(os.path.splitext(file)[0])
+    return [os.path.basename(file_path) for file_path in file_paths], resume_texts, role_keys, preprocess_texts(jd_texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encoder backends against the fp32 baseline")
+    parser.add_argument('--resumes', default=os.path.join(REPO_ROOT, 'resumes'), help="folder of PDF/DOCX resumes")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="score N generated resumes instead of --resumes (see synthetic_corpus.py)")
+    parser.add_argument('--jobs-folder', default=os.path.join(REPO_ROOT, 'job descriptions'))
+    parser.add_argument('--model', default=MODEL_NAME, help="model name or local path")
+    parser.add_argument('--baseline', choices=BACKENDS, default='torch')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['int8', 'onnx'])
+    parser.add_argument('--onnx-file', default=ENCODER_ONNX_FILE, help="ONNX graph for the onnx backend")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=list(DEFAULT_THRESHOLDS))
+    parser.add_argument('--repeat', type=int, default=3, help="timed encode passes per backend (best is kept)")
+    parser.add_argument('--max-flips', type=int, default=0, help="exit 1 if any backend flips more decisions")
+    parser.add_argument('--output', help="write the report as JSON here")
+    args = parser.parse_args()
+
+    resume_folder = args.resumes
+    if args.synthetic:
+        import tempfile
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from synthetic_corpus import generate_corpus
+        resume_folder = tempfile.mkdtemp(prefix='calibration_')
+        generate_corpus(resume_folder, args.synthetic, scanned_ratio=0)
+
+    files, resume_texts, role_keys, jd_texts = load_texts(resume_folder, args.jobs_folder)
+    if args.synthetic:
+        import shutil
+        shutil.rmtree(resume_folder, ignore_errors=True)
+    if not files:
+        sys.exit(f"No readable resumes in {resume_folder}")
+    print(f"{len(files)} resumes x {len(role_keys)} job descriptions, thresholds {args.thresholds}")
+
+    results = {}
+    for backend in [args.baseline] + [b for b in args.backends if b != args.baseline]:
+        try:
+            jd_embeddings, resume_embeddings, load_seconds, encode_seconds, peak_rss = run_backend(
+                args.model, backend, args.onnx_file, jd_texts, resume_texts, args.repeat)
+        except Exception as e:
+            print(f"{backend:<8} unavailable: {e}")
+            continue
+        results[backend] = {
+            "resume_embeddings": resume_embeddings,
+            "scores": resume_embeddings @ jd_embeddings.T,
+            "load_seconds": round(load_seconds, 3),
+            "encode_seconds": round(encode_seconds, 4),
+            "docs_per_sec": round(len(files) / encode_seconds, 2) if encode_seconds else None,
+            "peak_rss_mb": round(peak_rss, 1),
+        }
+    if args.baseline not in results:
+        sys.exit(f"Baseline backend {args.baseline!r} could not be loaded")
+
+    base = results[args.baseline]
+    report = {"model": args.model, "baseline": args.baseline, "resumes": len(files), "roles": role_keys,
+              "thresholds": args.thresholds, "backends": {}}
+    print(f"\n{'backend':<8} {'docs/s':>8} {'speedup':>8} {'RSS MB':>8} {'cos min':>8} "
+          f"{'|d| max':>8} {'rank rho':>9} {'flips':>6}")
+    failed = False
+    for backend, result in results.items():
+        entry = {key: result[key] for key in ("load_seconds", "encode_seconds", "docs_per_sec", "peak_rss_mb")}
+        entry["speedup"] = round(base["encode_seconds"] / result["encode_seconds"], 2) if result["encode_seconds"] else None
+        entry.update(compare(base, result, files, role_keys, args.thresholds))
+        report["backends"][backend] = entry
+        flips = len(entry["decision_flips"])
+        failed |= flips > args.max_flips
+        spearman = entry["spearman_min"] if entry["spearman_min"] is not None else float('nan')
+        print(f"{backend:<8} {entry['docs_per_sec'] or 0:>8.1f} {entry['speedup'] or 0:>7.2f}x "
+              f"{entry['peak_rss_mb']:>8.0f} {entry['embedding_cosine_min']:>8.4f} {entry['score_delta_max']:>8.4f} "
+              f"{spearman:>9.4f} {flips:>6}")
+        for flip in entry["decision_flips"]:
+            print(f"    flip at {flip['threshold']}: {flip['file']} for {flip['role']} "
+                  f"({flip['baseline']:.4f} -> {flip['score']:.4f})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+HTTP load test for the screening APIs.
+
+Starts backend.py (for /api/apply) or backend-api-flask.py (for
+/api/upload-batch) in a scratch directory against an in-process Qdrant and a
+local sink SMTP server, then replays an open-loop arrival pattern of
+synthetic CVs and reports throughput, p50/p95/p99 latency, error rate and the
+saturation point. Everything runs offline on one machine:
+
+    python benchmarks/load_test.py --pattern steady --rate 4 --duration 30
+    python benchmarks/load_test.py --pattern burst --burst-size 20 --burst-every 10 --duration 40
+    python benchmarks/load_test.py --pattern ramp --rates 1 2 4 8 16 --step-seconds 20 --slo-p95 5
+    python benchmarks/load_test.py --target upload-batch --batch-files 10 --pattern steady --rate 0.5
+    python benchmarks/load_test.py --server asgi --pattern ramp --rates 2 4 8 16 32 --min-sustained-rate 8
+
+Latency is measured from each request's scheduled arrival, so a server that
+falls behind shows it instead of silently slowing the client down. Exits with
+status 1 when a gate (--slo-p95, --max-error-rate, --min-sustained-rate)
+fails, so a release pipeline can run it.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_corpus import generate_corpus  # noqa: E402
+from screening_benchmark import git_commit  # noqa: E402
+
+ENCODERS = ('torch', 'int8', 'onnx', 'hashing')
+CONTENT_TYPES = {".pdf": "application/pdf",
+                 ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"}
+
+
+class SinkSMTPServer:
+    """
+    Minimal SMTP server that accepts (and counts) every message.
+
+    Speaks enough of the protocol for smtplib and aiosmtplib: EHLO with AUTH,
+    AUTH PLAIN/LOGIN (any credentials), MAIL, RCPT, DATA, RSET, NOOP, QUIT.
+    Runs its own event loop on a background thread.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = 0
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._started = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="smtp-sink", daemon=True).start()
+        self._started.wait(10)
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._session, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _session(self, reader, writer):
+        def reply(line):
+            writer.write((line + "\r\n").encode())
+
+        reply("220 sink ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors='replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+                if verb == "EHLO":
+                    reply("250-sink")
+                    reply("250-AUTH PLAIN LOGIN")
+                    reply("250 8BITMIME")
+                elif verb == "HELO":
+                    reply("250 sink")
+                elif verb == "AUTH":
+                    parts = command.split()
+                    if parts[1].upper() == "LOGIN":
+                        for prompt in ([] if len(parts) > 2 else ["334 VXNlcm5hbWU6"]) + ["334 UGFzc3dvcmQ6"]:
+                            reply(prompt)
+                            await writer.drain()
+                            await reader.readline()
+                    elif len(parts) == 2:
+                        reply("334 ")
+                        await writer.drain()
+                        await reader.readline()
+                    reply("235 2.7.0 Authentication successful")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while (await reader.readline()).rstrip(b"\r\n") != b".":
+                        pass
+                    self.messages += 1
+                    reply("250 OK: queued")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:  # MAIL, RCPT, RSET, NOOP
+                    reply("250 OK")
+                await writer.drain()
+        except (ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(target, server, workdir, port, smtp_port, encoder, extra_env):
+    """Launch the API under test in `workdir` and wait for /api/health."""
+    app = "applicant" if target == "apply" else "dashboard"
+    if server == "asgi":
+        command = [sys.executable, os.path.join(REPO_ROOT, "asgi_app.py"), app, "--port", str(port)]
+    else:
+        module = "backend" if app == "applicant" else "backend-api-flask"
+        command = [sys.executable, "-c",
+                   f"import importlib; importlib.import_module({module!r}).app.run(port={port}, threaded=True)"]
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "HR_OFFLINE": "1", "ENCODER_BACKEND": encoder,
+           "QDRANT_URL": ":memory:", "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp_port), "SMTP_STARTTLS": "0",
+           "EMAIL": "hr@loadtest.local", "PASSWORD": "loadtest", **extra_env}
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}; see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=2).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("Server did not become healthy within 180s")
+
+
+def arrivals(args):
+    """[(offset seconds, phase name)] for the chosen pattern, seeded so runs are comparable."""
+    rng = random.Random(args.seed)
+
+    def steady(rate, start, duration, phase):
+        times, t = [], 0.0
+        while True:
+            t += rng.expovariate(rate) if args.poisson else 1.0 / rate
+            if t >= duration:
+                return times
+            times.append((start + t, phase))
+
+    if args.pattern == "steady":
+        return steady(args.rate, 0.0, args.duration, f"{args.rate:g}/s")
+    if args.pattern == "burst":
+        return [(start, f"burst {args.burst_size}") for start in range(0, int(args.duration), int(args.burst_every))
+                for _ in range(args.burst_size)]
+    plan = []
+    for step, rate in enumerate(args.rates):
+        plan += steady(rate, step * args.step_seconds, args.step_seconds, f"{rate:g}/s")
+    return plan
+
+
+def build_request(target, files, number, batch_files, job_text):
+    """(path, data, files) for request `number`, each with its own CVs so nothing is a duplicate."""
+    def part(field, path):
+        with open(path, 'rb') as f:
+            return field, (os.path.basename(path), f.read(), CONTENT_TYPES[os.path.splitext(path)[1]])
+
+    if target == "apply":
+        path = files[number % len(files)]
+        return "/api/apply", {"name": f"Load Test {number}", "email": f"applicant{number}@loadtest.local"}, \
+            [part("cv", path)]
+    batch = [files[(number * batch_files + i) % len(files)] for i in range(batch_files)]
+    return "/api/upload-batch", {"jobDescription": job_text}, [part("files", path) for path in batch]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(samples, seconds, offered=None):
+    """Throughput, latency percentiles and error rate of a list of samples."""
+    ok = [s["latency"] for s in samples if s["ok"]]
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(ok) / seconds, 3) if seconds > 0 else None,
+    }
+    if offered is not None:
+        summary["offered_rps"] = offered
+    if ok:
+        summary.update({f"p{q}": round(percentile(ok, q), 4) for q in (50, 95, 99)})
+        summary["max"] = round(max(ok), 4)
+    return summary
+
+
+async def replay(base_url, plan, target, files, batch_files, job_text, timeout, kinds, warmup=0):
+    """
+    Fire every request at its arrival offset; returns one sample per request.
+
+    `warmup` requests are sent one at a time first (and not recorded), so
+    model loading and worker start-up do not land in the first phase.
+    """
+    samples = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for number in range(len(plan), len(plan) + warmup):
+            path, data, parts = build_request(target, files, number, batch_files, job_text)
+            try:
+                await client.post(path, data=data, files=parts)
+            except httpx.HTTPError as e:
+                print(f"Warm-up request failed: {e!r}")
+        start = time.perf_counter()
+
+        async def one(number, offset, phase):
+            path, data, parts = build_request(target, files, number, batch_files, job_text)
+            await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+            scheduled = start + offset
+            kind = kinds.get(parts[0][1][0], "unknown") if len(parts) == 1 else "mixed"
+            sample = {"phase": phase, "kind": kind, "ok": False}
+            try:
+                response = await client.post(path, data=data, files=parts)
+                sample["status"] = response.status_code
+                sample["ok"] = response.status_code < 400
+            except httpx.HTTPError as e:
+                sample["status"] = type(e).__name__
+            sample["latency"] = time.perf_counter() - scheduled
+            sample["finished"] = time.perf_counter() - start
+            samples.append(sample)
+
+        await asyncio.gather(*(one(number, offset, phase) for number, (offset, phase) in enumerate(plan)))
+    return samples
+
+
+def saturation(phases, slo_p95, max_error_rate, min_ratio=0.9):
+    """
+    Highest offered rate that still met the SLO, and the first one that did not.
+
+    A step is saturated when its p95 exceeds `slo_p95`, its error rate exceeds
+    `max_error_rate`, or the server completed less than `min_ratio` of the
+    offered rate.
+    """
+    sustained, saturated_at = None, None
+    for phase in phases:
+        healthy = (phase["error_rate"] <= max_error_rate and phase.get("p95") is not None
+                   and (slo_p95 is None or phase["p95"] <= slo_p95)
+                   and phase["throughput_rps"] >= min_ratio * phase["offered_rps"])
+        if healthy and saturated_at is None:
+            sustained = phase["offered_rps"]
+        elif not healthy and saturated_at is None:
+            saturated_at = phase["offered_rps"]
+    return sustained, saturated_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /api/apply or /api/upload-batch against local stand-ins")
+    parser.add_argument('--target', choices=['apply', 'upload-batch'], default='apply')
+    parser.add_argument('--server', choices=['flask', 'asgi'], default='flask',
+                        help="threaded Flask server or the asyncio server (asgi_app.py)")
+    parser.add_argument('--pattern', choices=['steady', 'burst', 'ramp'], default='steady')
+    parser.add_argument('--rate', type=float, default=2.0, help="steady: requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="steady/burst: seconds of arrivals")
+    parser.add_argument('--poisson', action='store_true', help="exponential inter-arrival times instead of even spacing")
+    parser.add_argument('--burst-size', type=int, default=20)
+    parser.add_argument('--burst-every', type=float, default=10.0)
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 4, 8], help="ramp: rate of each step")
+    parser.add_argument('--step-seconds', type=float, default=20.0, help="ramp: seconds per step")
+    parser.add_argument('--batch-files', type=int, default=10, help="upload-batch: CVs per request")
+    parser.add_argument('--scanned-ratio', type=float, default=0.1, help="share of image-only PDFs (OCR path)")
+    parser.add_argument('--docx-ratio', type=float, default=0.3)
+    parser.add_argument('--min-words', type=int, default=150)
+    parser.add_argument('--max-words', type=int, default=1500)
+    parser.add_argument('--corpus', help="existing corpus folder (default: generate one CV per upload)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--encoder', choices=ENCODERS, default='hashing')
+    parser.add_argument('--warmup', type=int, default=5, help="unrecorded requests sent before the pattern starts")
+    parser.add_argument('--timeout', type=float, default=120.0, help="client timeout per request")
+    parser.add_argument('--env', nargs='*', default=[], metavar="KEY=VALUE",
+                        help="extra server settings, e.g. INTAKE_MODE=queue ASYNC_WORKERS=4")
+    parser.add_argument('--slo-p95', type=float, help="gate: p95 latency in seconds")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="gate: share of failed requests")
+    parser.add_argument('--min-sustained-rate', type=float, help="ramp gate: highest healthy step must reach this")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch directory (server log, caches)")
+    parser.add_argument('--output', help="write results JSON here")
+    args = parser.parse_args()
+
+    plan = arrivals(args)
+    if not plan:
+        parser.error("the arrival pattern produced no requests")
+    uploads = (len(plan) + args.warmup) * (args.batch_files if args.target == 'upload-batch' else 1)
+
+    scratch = tempfile.mkdtemp(prefix='load_test_')
+    smtp = SinkSMTPServer().start()
+    process = None
+    try:
+        corpus = args.corpus or os.path.join(scratch, 'corpus')
+        if not args.corpus:
+            print(f"Generating {uploads} CVs...")
+            generate_corpus(corpus, uploads, seed=args.seed, scanned_ratio=args.scanned_ratio,
+                            docx_ratio=args.docx_ratio, min_words=args.min_words, max_words=args.max_words)
+        files = sorted(os.path.join(corpus, file) for file in os.listdir(corpus)
+                       if file.lower().endswith(('.pdf', '.docx')))
+        if len(files) < uploads:
+            print(f"Note: {len(files)} CVs for {uploads} uploads; repeats are answered by duplicate detection")
+        kinds = {}
+        if os.path.exists(os.path.join(corpus, 'corpus.json')):
+            with open(os.path.join(corpus, 'corpus.json')) as f:
+                kinds = {entry["file"]: entry["kind"] for entry in json.load(f)["files"]}
+
+        workdir = os.path.join(scratch, 'server')
+        os.makedirs(workdir)
+        # backend.py reads its job description relative to the working directory
+        shutil.copytree(os.path.join(REPO_ROOT, 'job descriptions'), os.path.join(workdir, 'job descriptions'))
+        with open(os.path.join(workdir, 'job descriptions', 'ai_engineer.txt'), encoding='utf-8') as f:
+            job_text = f.read()
+
+        port = free_port()
+        extra_env = dict(item.split('=', 1) for item in args.env)
+        print(f"Starting {args.server} server for /api/{args.target} on port {port} (encoder: {args.encoder})...")
+        process = start_server(args.target, args.server, workdir, port, smtp.port, args.encoder, extra_env)
+
+        print(f"Replaying {len(plan)} requests ({args.pattern}) over {plan[-1][0]:.0f}s...")
+        wall = time.perf_counter()
+        samples = asyncio.run(replay(f"http://127.0.0.1:{port}", plan, args.target, files, args.batch_files,
+                                     job_text, args.timeout, kinds, args.warmup))
+        wall = time.perf_counter() - wall
+        time.sleep(1)  # let queued decision emails reach the sink
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        smtp.stop()
+        if args.keep:
+            print(f"Scratch directory kept at {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    # Per phase: requests that arrived in it, over the time from its first arrival to its last completion
+    offered_rates = {f"{rate:g}/s": rate for rate in ([args.rate] if args.pattern == "steady" else args.rates)}
+    phases = []
+    for phase in dict.fromkeys(s["phase"] for s in samples):
+        in_phase = [s for s in samples if s["phase"] == phase]
+        first = min(offset for offset, name in plan if name == phase)
+        seconds = max(s["finished"] for s in in_phase) - first
+        offered = offered_rates.get(phase) if args.pattern != "burst" else None
+        phases.append({"phase": phase, **summarize(in_phase, seconds, offered)})
+    overall = summarize(samples, wall)
+    by_kind = {kind: summarize([s for s in samples if s["kind"] == kind], wall)
+               for kind in sorted({s["kind"] for s in samples})}
+    statuses = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+
+    print(f"\n{'phase':<14} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for row in phases + [{"phase": "overall", **overall}]:
+        print(f"{row['phase']:<14} {row['requests']:>6} {row['error_rate']:>6.1%} {row['throughput_rps'] or 0:>7.2f} "
+              + " ".join(f"{row[q]:>7.2f}s" if q in row else f"{'-':>8}" for q in ("p50", "p95", "p99")))
+    for kind, row in by_kind.items():
+        print(f"  {kind:<12} {row['requests']:>6} p50 {row.get('p50', 0):.2f}s p95 {row.get('p95', 0):.2f}s")
+    print(f"Status codes: {statuses}; emails received by the sink: {smtp.messages}")
+
+    failures = []
+    if args.max_error_rate is not None and overall["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {overall['error_rate']:.1%} > {args.max_error_rate:.1%}")
+    sustained = saturated_at = None
+    if args.pattern == "ramp":
+        sustained, saturated_at = saturation(phases, args.slo_p95, args.max_error_rate)
+        print(f"Saturation: sustained {sustained or 0:g} req/s"
+              + (f", saturated at {saturated_at:g} req/s" if saturated_at else ", not reached"))
+        if args.min_sustained_rate is not None and (sustained or 0) < args.min_sustained_rate:
+            failures.append(f"sustained rate {sustained or 0:g} < {args.min_sustained_rate:g} req/s")
+    elif args.slo_p95 is not None and overall.get("p95", float('inf')) > args.slo_p95:
+        failures.append(f"p95 {overall.get('p95', float('inf')):.2f}s > {args.slo_p95:g}s")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "target": args.target,
+            "server": args.server,
+            "pattern": args.pattern,
+            "encoder": args.encoder,
+            "seed": args.seed,
+            "env": extra_env,
+        },
+        "overall": overall,
+        "phases": phases,
+        "kinds": by_kind,
+        "statuses": statuses,
+        "emails": smtp.messages,
+        "saturation": {"sustained_rps": sustained, "saturated_at_rps": saturated_at},
+        "gate_failures": failures,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+End-to-end screening benchmark.
+
+Generates (or reuses) a synthetic resume corpus and times every stage of the
+screening pipeline: extraction, preprocessing, embedding, scoring and the CSV
+report, then the streaming main.py path and the Flask /api/upload-batch and
+/api/filter endpoints. Results are written as JSON so runs can be compared
+across commits:
+
+    python benchmarks/screening_benchmark.py --count 100 --output before.json
+    python benchmarks/screening_benchmark.py --count 100 --output after.json --compare before.json
+
+Everything runs offline. `--encoder hashing` (the default) replaces the model
+with a deterministic hashed bag of words; `--encoder torch|int8|onnx` loads
+the locally cached model on that backend (HR_OFFLINE=1 is set either way).
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import importlib
+import subprocess
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("HR_OFFLINE", "1")
+
+import similarity  # noqa: E402
+from preprocessing import get_stop_words  # noqa: E402
+from encoder_backends import load_encoder, BACKENDS  # noqa: E402
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+JOB_DESCRIPTION_PATH = os.path.join(REPO_ROOT, 'job descriptions', 'ai_engineer.txt')
+EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+THRESHOLD = 0.3
+
+
+def peak_rss_mb():
+    """Peak resident set size so far of this process and of its (finished) children, in MB."""
+    scale = 1 / 1024 if sys.platform != 'darwin' else 1 / (1024 * 1024)  # KB on Linux, bytes on macOS
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own, 1), round(children, 1)
+
+
+class StageTimer:
+    """Collects per-stage wall time, CPU time, throughput and peak RSS."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, docs, fn, *args, **kwargs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn(*args, **kwargs)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        rss, children_rss = peak_rss_mb()
+        self.stages[name] = {
+            "seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "docs": docs,
+            "docs_per_sec": round(docs / wall, 2) if wall > 0 else None,
+            "peak_rss_mb": rss,
+            "peak_child_rss_mb": children_rss,
+        }
+        print(f"{name:<22} {wall:8.3f}s  {self.stages[name]['docs_per_sec'] or 0:9.1f} docs/s  "
+              f"peak RSS {rss:.0f} MB (children {children_rss:.0f} MB)")
+        return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_pipeline_stages(timer, file_paths, job_text, workers, report_path):
+    from extraction_pool import extract_many
+    from preprocessing import preprocess_text, preprocess_texts
+    from similarity import encode_texts, score_embeddings
+
+    documents = timer.run("extract", len(file_paths), lambda: dict(extract_many(file_paths, workers=workers)))
+    raw_texts = [documents.get(file_path, "") for file_path in file_paths]
+
+    def preprocess():
+        emails = [EMAIL_PATTERN.search(text) for text in raw_texts]
+        return [match.group(0) if match else None for match in emails], preprocess_texts(raw_texts)
+    emails, texts = timer.run("preprocess", len(raw_texts), preprocess)
+
+    job_embedding = encode_texts([preprocess_text(job_text)])[0]
+    embeddings = timer.run("embed", len(texts), encode_texts, texts)
+    scores = timer.run("score", len(texts), score_embeddings, job_embedding, embeddings)
+
+    def report():
+        import pandas as pd
+        rows = [(email, os.path.basename(file_path), float(score), "Passed" if score >= THRESHOLD else "Rejected")
+                for file_path, email, score in zip(file_paths, emails, scores) if email]
+        pd.DataFrame(rows, columns=["Email", "Resume", "Score", "Status"]).to_csv(report_path, index=False)
+        return len(rows)
+    reported = timer.run("report", len(texts), report)
+
+    return {
+        "empty_extractions": sum(1 for text in raw_texts if not text.strip()),
+        "reported": reported,
+        "passed": int(sum(1 for score in scores if score >= THRESHOLD)),
+        "mean_score": round(float(np.mean(scores)), 4) if len(scores) else None,
+    }
+
+
+def run_streaming_pipeline(timer, file_paths, job_text):
+    # The same path main.py takes: extraction streamed into batched embedding and scoring
+    import main as screening
+    from preprocessing import preprocess_text
+    from similarity import encode_texts
+
+    job_embedding = encode_texts([preprocess_text(job_text)])[0]
+    return timer.run("main_pipeline", len(file_paths),
+                     lambda: len(list(screening.score_resumes(job_embedding, file_paths))))
+
+
+def run_api(timer, file_paths, job_text, workdir):
+    """Drive /api/upload-batch and /api/filter through Flask's test client in a scratch directory."""
+    cwd = os.getcwd()
+    os.chdir(workdir)  # uploads/ and cache/ are relative to the working directory
+    try:
+        api = importlib.import_module('backend-api-flask')
+        client = api.app.test_client()
+
+        def upload():
+            files = []
+            for file_path in file_paths:
+                with open(file_path, 'rb') as f:
+                    files.append((io.BytesIO(f.read()), os.path.basename(file_path)))
+            response = client.post('/api/upload-batch', data={"files": files, "jobDescription": job_text},
+                                   content_type='multipart/form-data')
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return response.get_json()["processed"]
+        processed = timer.run("api_upload_batch", len(file_paths), upload)
+
+        def filter_candidates(**options):
+            response = client.post('/api/filter', json={"jobDescription": job_text + " MLOps", **options})
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return len(response.get_json()["candidates"])
+        timer.run("api_filter", processed, filter_candidates)
+        timer.run("api_filter_chunked", processed, filter_candidates, chunkAggregate="max")
+        return {"processed": processed}
+    finally:
+        os.chdir(cwd)
+
+
+def compare(baseline, current, tolerance, min_delta=0.05):
+    """
+    Print a per-stage comparison; returns the names of stages slower than `tolerance` allows.
+
+    Stages that got slower by less than `min_delta` seconds are never flagged,
+    so millisecond-scale stages do not fail a comparison on timer noise.
+    """
+    regressions = []
+    print(f"\n{'stage':<22} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, stage in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            print(f"{name:<22} {'-':>10} {stage['seconds']:>9.3f}s")
+            continue
+        change = (stage["seconds"] - before["seconds"]) / before["seconds"] if before["seconds"] else 0.0
+        flag = ""
+        if change > tolerance and stage["seconds"] - before["seconds"] >= min_delta:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<22} {before['seconds']:>9.3f}s {stage['seconds']:>9.3f}s {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the screening pipeline on a synthetic corpus")
+    parser.add_argument('--corpus', help="existing corpus folder (default: generate one in a temp folder)")
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scanned-ratio', type=float, default=0.2, help="share of image-only PDFs (OCR path)")
+    parser.add_argument('--min-words', type=int, default=150)
+    parser.add_argument('--max-words', type=int, default=1500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument('--encoder', choices=BACKENDS, default='hashing')
+    parser.add_argument('--skip-api', action='store_true', help="do not benchmark the Flask endpoints")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--against', help="with --compare: compare this results JSON instead of running")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed slowdown per stage (0.15 = 15%%)")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    if args.compare and args.against:
+        with open(args.compare) as f, open(args.against) as g:
+            sys.exit(1 if compare(json.load(f), json.load(g), args.tolerance, args.min_delta) else 0)
+
+    # main.py and the API pick the extraction pool size up from the environment
+    os.environ["EXTRACT_WORKERS"] = str(args.workers)
+    similarity._model = load_encoder(similarity.MODEL_NAME, backend=args.encoder)
+
+    scratch = tempfile.mkdtemp(prefix='screening_bench_')
+    try:
+        corpus = args.corpus or os.path.join(scratch, 'corpus')
+        if not args.corpus:
+            generate_corpus(corpus, args.count, seed=args.seed, scanned_ratio=args.scanned_ratio,
+                            min_words=args.min_words, max_words=args.max_words)
+        file_paths = sorted(os.path.join(corpus, file) for file in os.listdir(corpus)
+                            if file.lower().endswith(('.pdf', '.docx')))
+        kinds = {}
+        corpus_manifest = os.path.join(corpus, 'corpus.json')
+        if os.path.exists(corpus_manifest):
+            with open(corpus_manifest) as f:
+                for entry in json.load(f)["files"]:
+                    kinds[entry["kind"]] = kinds.get(entry["kind"], 0) + 1
+        with open(JOB_DESCRIPTION_PATH, 'r', encoding='utf-8') as f:
+            job_text = f.read()
+
+        print(f"Benchmarking {len(file_paths)} resumes {kinds} with the {args.encoder} encoder, "
+              f"{args.workers} extraction workers")
+        # Model and stopword loading are startup costs, not part of any stage
+        similarity.get_model()
+        get_stop_words()
+        timer = StageTimer()
+        outcome = run_pipeline_stages(timer, file_paths, job_text, args.workers,
+                                      os.path.join(scratch, 'candidates_report.csv'))
+        run_streaming_pipeline(timer, file_paths, job_text)
+        if not args.skip_api:
+            api_dir = os.path.join(scratch, 'api')
+            os.makedirs(api_dir)
+            outcome.update(run_api(timer, file_paths, job_text, api_dir))
+
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "encoder": args.encoder,
+                "workers": args.workers,
+                "seed": args.seed,
+                "docs": len(file_paths),
+                "corpus_bytes": sum(os.path.getsize(file_path) for file_path in file_paths),
+                "kinds": kinds,
+            },
+            "outcome": outcome,
+            "stages": timer.stages,
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if outcome["empty_extractions"]:
+        print(f"Note: {outcome['empty_extractions']} documents produced no text "
+              f"(OCR needs tesseract and poppler installed)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(json.load(f), results, args.tolerance, args.min_delta) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Synthetic resume corpus for benchmarks.
+
+Writes text-layer PDFs, image-only PDFs (no text layer, so extraction falls
+back to OCR) and DOCX files of varying length, without any network access or
+extra dependencies:
+
+    python benchmarks/synthetic_corpus.py /tmp/corpus --count 100 --scanned-ratio 0.2
+"""
+import os
+import json
+import random
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+
+FIRST_NAMES = ["Omar", "Sara", "Youssef", "Mariam", "Ahmed", "Nour", "Karim", "Laila", "Hassan", "Salma",
+               "John", "Emily", "Wei", "Priya", "Lucas", "Ana"]
+LAST_NAMES = ["Hassan", "Mostafa", "Ibrahim", "Adel", "Farouk", "Said", "Smith", "Chen", "Patel", "Silva"]
+
+# A mix of on-topic (AI engineer) and off-topic vocabulary so scores spread out
+AI_SKILLS = ["Python", "PyTorch", "TensorFlow", "scikit-learn", "NLP", "computer vision", "deep learning",
+             "machine learning", "transformers", "MLOps", "Docker", "Kubernetes", "AWS SageMaker",
+             "data pipelines", "feature engineering", "model deployment", "LLM fine-tuning", "SQL"]
+OTHER_SKILLS = ["Excel", "bookkeeping", "sales forecasting", "customer relations", "negotiation",
+                "event planning", "social media marketing", "payroll", "supply chain", "Photoshop"]
+SENTENCES = [
+    "Designed and deployed {skill} solutions used by {n} internal teams.",
+    "Led a project applying {skill} to reduce processing time by {n} percent.",
+    "Collaborated with engineers and analysts to integrate {skill} into production systems.",
+    "Maintained {skill} workflows and mentored {n} junior colleagues.",
+    "Presented results on {skill} to stakeholders and senior management.",
+    "Built dashboards and reports to track {skill} metrics across {n} regions.",
+]
+
+KINDS = ("text_pdf", "scanned_pdf", "docx")
+
+LINES_PER_PAGE = 48
+WORDS_PER_LINE = 12
+
+
+def resume_lines(rng, words, on_topic=0.5):
+    """A plausible resume as a list of lines, roughly `words` words long."""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    email = f"{first.lower()}.{last.lower()}{rng.randrange(10000)}@example.com"
+    skill_pool = AI_SKILLS if rng.random() < on_topic else OTHER_SKILLS
+
+    lines = [f"{first} {last}", f"Email: {email}  Phone: +20 10 {rng.randrange(10**7, 10**8)}", "",
+             "Summary"]
+    body = []
+    while sum(len(line.split()) for line in body) < words:
+        sentence = rng.choice(SENTENCES).format(skill=rng.choice(skill_pool), n=rng.randrange(2, 40))
+        body.append(sentence)
+    lines.extend(body[:3])
+    lines.extend(["", "Skills", ", ".join(rng.sample(skill_pool, min(6, len(skill_pool)))), "", "Experience"])
+    lines.extend(f"- {sentence}" for sentence in body[3:])
+    return lines, email
+
+
+def _wrap(lines, width=WORDS_PER_LINE):
+    wrapped = []
+    for line in lines:
+        words = line.split()
+        if not words:
+            wrapped.append("")
+        for start in range(0, len(words), width):
+            wrapped.append(" ".join(words[start:start + width]))
+    return wrapped
+
+
+def write_text_pdf(path, lines):
+    """Write a PDF with a real text layer (Helvetica, one content stream per page)."""
+    lines = _wrap(lines)
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    font_id = 3
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for number, page in enumerate(pages):
+        page_id, content_id = 4 + 2 * number, 5 + 2 * number
+        kids.append(f"{page_id} 0 R")
+        text = ["BT", "/F1 10 Tf", "13 TL", "50 750 Td"]
+        for line in page:
+            safe = line.encode('latin-1', 'replace').decode('latin-1')
+            safe = safe.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            text.append(f"({safe}) Tj T*")
+        text.append("ET")
+        stream = "\n".join(text).encode('latin-1')
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>").encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[object_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def write_scanned_pdf(path, lines, dpi=100):
+    """Write an image-only PDF (rendered text, no text layer) so extraction has to OCR it."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=max(12, dpi // 6))
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        font = ImageFont.load_default()
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    line_height = int(dpi * 0.2)
+    lines = _wrap(lines)
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    images = []
+    for page in pages:
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(page):
+            draw.text((dpi // 2, dpi // 2 + row * line_height), line, fill=0, font=font)
+        images.append(image)
+    images[0].save(path, 'PDF', resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def write_docx(path, lines):
+    """Write a minimal but valid DOCX (one paragraph per line)."""
+    paragraphs = "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in lines)
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{paragraphs}</w:body></w:document>')
+    content_types = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                     '<Default Extension="xml" ContentType="application/xml"/>'
+                     '<Override PartName="/word/document.xml" '
+                     'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+                     '</Types>')
+    rels = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', content_types)
+        docx.writestr('_rels/.rels', rels)
+        docx.writestr('word/document.xml', document)
+
+
+WRITERS = {"text_pdf": (write_text_pdf, ".pdf"), "scanned_pdf": (write_scanned_pdf, ".pdf"),
+           "docx": (write_docx, ".docx")}
+
+
+def generate_corpus(folder, count, seed=0, scanned_ratio=0.2, docx_ratio=0.3, min_words=150, max_words=1500):
+    """
+    Write `count` synthetic resumes into `folder`.
+
+    Returns a list of {"file", "kind", "words", "email", "bytes"} dicts and
+    also saves it as corpus.json in the folder. The same seed always
+    produces the same corpus.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    entries = []
+    for number in range(count):
+        roll = rng.random()
+        kind = "scanned_pdf" if roll < scanned_ratio else "docx" if roll < scanned_ratio + docx_ratio else "text_pdf"
+        words = rng.randint(min_words, max_words)
+        lines, email = resume_lines(rng, words)
+        writer, extension = WRITERS[kind]
+        path = os.path.join(folder, f"resume_{number:05d}_{kind}{extension}")
+        writer(path, lines)
+        entries.append({"file": os.path.basename(path), "kind": kind, "words": words, "email": email,
+                        "bytes": os.path.getsize(path)})
+
+    with open(os.path.join(folder, 'corpus.json'), 'w', encoding='utf-8') as f:
+        json.dump({"seed": seed, "files": entries}, f, indent=2)
+    return entries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic resume corpus")
+    parser.add_argument('folder')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scanned-ratio', type=float, default=0.2, help="share of image-only PDFs (OCR path)")
+    parser.add_argument('--docx-ratio', type=float, default=0.3)
+    parser.add_argument('--min-words', type=int, default=150)
+    parser.add_argument('--max-words', type=int, default=1500)
+    args = parser.parse_args()
+
+    entries = generate_corpus(args.folder, args.count, seed=args.seed, scanned_ratio=args.scanned_ratio,
+                              docx_ratio=args.docx_ratio, min_words=args.min_words, max_words=args.max_words)
+    kinds = {kind: sum(entry["kind"] == kind for entry in entries) for kind in KINDS}
+    print(f"Wrote {len(entries)} resumes to {args.folder}: {kinds}")
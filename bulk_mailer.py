@@ -0,0 +1,241 @@
+import os
+import time
+import heapq
+import random
+import smtplib
+import threading
+from collections import namedtuple
+
+from email_handler import build_message, smtp_settings
+from metrics import span, registry
+
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", "3"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "4"))
+
+# Messages per minute we allow ourselves per provider, across all pooled connections
+PROVIDER_RATE_LIMITS = {
+    "smtp.gmail.com": 60,
+    "smtp.office365.com": 30,
+    "smtp-mail.outlook.com": 30,
+}
+DEFAULT_RATE_LIMIT = 60
+
+# Reconnect after this many messages; providers close long-lived sessions anyway
+MAX_MESSAGES_PER_CONNECTION = 100
+
+DeliveryResult = namedtuple('DeliveryResult', ['receiver_email', 'success', 'attempts', 'error'])
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate_per_minute` acquisitions per minute."""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host, rate_per_minute):
+    """
+    The process-wide RateLimiter for `host` at `rate_per_minute`.
+
+    Shared by every BulkMailer sending through that host, so concurrent runs
+    (e.g. two /api/send-emails requests) split the provider limit between them.
+    """
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get((host, rate_per_minute))
+        if limiter is None:
+            limiter = _rate_limiters[(host, rate_per_minute)] = RateLimiter(rate_per_minute)
+        return limiter
+
+
+def _is_transient(error):
+    # 4xx replies and dropped connections are worth retrying; 5xx replies are final.
+    # SMTPException subclasses OSError, so SMTP errors are sorted out before the network ones
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False  # e.g. SMTPNotSupportedError: the server will not change its mind
+    return isinstance(error, OSError)
+
+
+class BulkMailer:
+    """
+    Send many emails over a small pool of reused, authenticated SMTP connections.
+
+    Each pool worker keeps its connection open across messages (one TLS
+    handshake and login per connection instead of per email). All workers, and
+    all other mailers in the process using the same host, share one rate limit. Transient failures (4xx replies, dropped
+    connections) go back on a retry queue with exponential backoff; permanent
+    failures are reported straight away. A rejected login ends the whole run:
+    every message not yet sent fails with the login error instead of each one
+    logging in again.
+
+    Args:
+        sender_email (str): Address to send from (also the SMTP login)
+        smtp_password (str): SMTP/app password; empty skips login
+        host (str), port (int), starttls (bool): SMTP server, defaults from smtp_settings()
+        pool_size (int): Number of concurrent connections
+        rate_per_minute (int): Overrides the provider rate limit
+    """
+
+    def __init__(self, sender_email, smtp_password, host=None, port=None, starttls=None,
+                 pool_size=MAIL_POOL_SIZE, rate_per_minute=None, max_retries=MAIL_MAX_RETRIES,
+                 backoff_base=2.0, timeout=30):
+        default_host, default_port, default_starttls = smtp_settings()
+        self.sender_email = sender_email
+        self.smtp_password = smtp_password
+        self.host = host or default_host
+        self.port = port or default_port
+        self.starttls = default_starttls if starttls is None else starttls
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        if rate_per_minute is None:
+            rate_per_minute = PROVIDER_RATE_LIMITS.get(self.host, DEFAULT_RATE_LIMIT)
+        self.rate_limiter = get_rate_limiter(self.host, rate_per_minute)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.smtp_password:
+            server.login(self.sender_email, self.smtp_password)
+        return server
+
+    def send_all(self, messages):
+        """
+        Deliver (receiver_email, subject, body) messages and return one DeliveryResult per message, in order.
+        """
+        messages = list(messages)
+        results = [None] * len(messages)
+        if not messages:
+            return results
+
+        # Retry queue: (not_before, sequence, index, attempt) ordered by when the job may run
+        jobs = [(0.0, i, i, 1) for i in range(len(messages))]
+        heapq.heapify(jobs)
+        sequence = [len(messages)]
+        remaining = [len(messages)]
+        aborted = [None]  # the SMTPAuthenticationError that stopped the run
+        cond = threading.Condition()
+
+        def next_job():
+            with cond:
+                while remaining[0] > 0 and aborted[0] is None:
+                    if jobs:
+                        not_before = jobs[0][0]
+                        now = time.monotonic()
+                        if not_before <= now:
+                            return heapq.heappop(jobs)
+                        cond.wait(not_before - now)
+                    else:
+                        # Jobs in flight elsewhere may still be re-queued
+                        cond.wait(0.5)
+                return None
+
+        def finish(index, result):
+            with cond:
+                results[index] = result
+                remaining[0] -= 1
+                cond.notify_all()
+
+        def fail(index, attempt, error):
+            registry.inc("hr_emails_total", result="failed")
+            finish(index, DeliveryResult(messages[index][0], False, attempt, str(error)))
+
+        def abort(error):
+            # Called without the lock; drains the queue so idle workers exit
+            with cond:
+                if aborted[0] is None:
+                    print(f"SMTP login rejected; not sending the {remaining[0]} remaining emails: {error}")
+                aborted[0] = error
+                queued = [(index, attempt - 1) for _, _, index, attempt in jobs]
+                jobs.clear()
+            for index, attempts in queued:
+                fail(index, attempts, error)
+
+        def retry(index, attempt):
+            delay = self.backoff_base ** (attempt - 1) + random.uniform(0, 1)
+            with cond:
+                if aborted[0] is not None:
+                    error = aborted[0]
+                else:
+                    error = None
+                    sequence[0] += 1
+                    heapq.heappush(jobs, (time.monotonic() + delay, sequence[0], index, attempt + 1))
+                    cond.notify_all()
+            if error is not None:
+                fail(index, attempt, error)
+
+        def worker():
+            server = None
+            sent_on_connection = 0
+            try:
+                while True:
+                    job = next_job()
+                    if job is None:
+                        return
+                    _, _, index, attempt = job
+                    receiver_email, subject, body = messages[index]
+                    try:
+                        if server is None or sent_on_connection >= MAX_MESSAGES_PER_CONNECTION:
+                            self._close(server)
+                            with span("smtp_connect"):
+                                server = self._connect()
+                            sent_on_connection = 0
+                        self.rate_limiter.acquire()
+                        with span("smtp_send"):
+                            server.send_message(build_message(self.sender_email, receiver_email, subject, body))
+                        sent_on_connection += 1
+                        registry.inc("hr_emails_total", result="sent")
+                        finish(index, DeliveryResult(receiver_email, True, attempt, None))
+                    except Exception as e:
+                        # The connection state is unknown after an error; start a fresh one
+                        self._close(server)
+                        server = None
+                        if isinstance(e, smtplib.SMTPAuthenticationError):
+                            fail(index, attempt, e)
+                            abort(e)
+                        elif _is_transient(e) and attempt <= self.max_retries:
+                            retry(index, attempt)
+                        else:
+                            fail(index, attempt, e)
+            finally:
+                self._close(server)
+
+        threads = [threading.Thread(target=worker, name=f"mailer-{i}", daemon=True)
+                   for i in range(min(self.pool_size, len(messages)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def _close(server):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
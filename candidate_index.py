@@ -0,0 +1,200 @@
+import os
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+INDEX_DIR = os.getenv("CANDIDATE_INDEX_DIR", os.path.join('cache', 'candidate_index'))
+
+
+class CandidateIndex:
+    """
+    Persistent local vector index of candidate embeddings and their metadata.
+
+    Embeddings are appended to a flat float32 file that is memory-mapped for
+    queries, so a JD is ranked against every stored candidate with one
+    matrix-vector product and no PDF is ever re-read. Metadata and tombstones
+    live in SQLite next to it. Deletes only mark the row; `compact()` rewrites
+    the vector file without them. Embeddings must be L2-normalised so the dot
+    product is the cosine score.
+    """
+
+    def __init__(self, directory=INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                candidate_id TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_candidate ON rows(candidate_id, deleted)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        dim = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim = int(dim[0]) if dim else None
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute("SELECT row, candidate_id, deleted FROM rows ORDER BY row").fetchall()
+        self._count = rows[-1][0] + 1 if rows else 0
+        self._ids = [None] * self._count
+        self._deleted = bytearray(b'\x01' * self._count)  # tombstones, one byte per row
+        self._live = {}
+        for row, candidate_id, deleted in rows:
+            self._ids[row] = candidate_id
+            self._deleted[row] = 1 if deleted else 0
+            if not deleted:
+                self._live[candidate_id] = row
+
+        # Drop vectors written by an insert whose metadata never committed
+        if self.dim and os.path.exists(self.vectors_path):
+            expected = self._count * self.dim * 4
+            if os.path.getsize(self.vectors_path) > expected:
+                with open(self.vectors_path, 'r+b') as f:
+                    f.truncate(expected)
+        self._matrix = None
+
+    def _vectors(self):
+        # Memory map of all rows, re-opened only after the row count changed
+        if self._matrix is None or self._matrix.shape[0] != self._count:
+            if self._count == 0:
+                self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                         shape=(self._count, self.dim))
+        return self._matrix
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, candidate_id):
+        return str(candidate_id) in self._live
+
+    def add(self, candidate_id, embedding, metadata=None):
+        """Insert or replace a candidate's embedding and metadata."""
+        candidate_id = str(candidate_id)
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vector.shape[0]
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif vector.shape[0] != self.dim:
+                raise ValueError(f"Embedding has {vector.shape[0]} dimensions, index expects {self.dim}")
+
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vector.tobytes())
+
+            row = self._count
+            old_row = self._live.get(candidate_id)
+            if old_row is not None:
+                self._conn.execute("UPDATE rows SET deleted = 1 WHERE row = ?", (old_row,))
+                self._deleted[old_row] = 1
+            self._conn.execute("INSERT INTO rows (row, candidate_id, metadata) VALUES (?, ?, ?)",
+                               (row, candidate_id, json.dumps(metadata or {})))
+            self._conn.commit()
+
+            self._count += 1
+            self._ids.append(candidate_id)
+            self._deleted.append(0)
+            self._live[candidate_id] = row
+        return row
+
+    def delete(self, candidate_id):
+        """Remove a candidate; returns False if it was not in the index."""
+        candidate_id = str(candidate_id)
+        with self._lock:
+            row = self._live.pop(candidate_id, None)
+            if row is None:
+                return False
+            self._conn.execute("UPDATE rows SET deleted = 1 WHERE row = ?", (row,))
+            self._conn.commit()
+            self._deleted[row] = 1
+        return True
+
+    def get(self, candidate_id):
+        """Return (embedding, metadata) for a candidate, or None."""
+        with self._lock:
+            row = self._live.get(str(candidate_id))
+            if row is None:
+                return None
+            return np.array(self._vectors()[row]), self._metadata([row])[row]
+
+    def _metadata(self, rows):
+        metadata = {}
+        rows = [int(row) for row in rows]
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(rows), 900):
+            chunk = rows[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for row, value in self._conn.execute(
+                    f"SELECT row, metadata FROM rows WHERE row IN ({placeholders})", chunk):
+                metadata[row] = json.loads(value)
+        return metadata
+
+    def all_metadata(self):
+        """Metadata of every live candidate, in insertion order."""
+        with self._lock:
+            return [json.loads(value) for (value,) in self._conn.execute(
+                "SELECT metadata FROM rows WHERE deleted = 0 ORDER BY row")]
+
+    def search(self, query_embedding, top_k=None, threshold=None, include_metadata=True):
+        """
+        Rank live candidates against a (normalised) query embedding.
+
+        Args:
+            query_embedding: JD embedding
+            top_k (int): Return at most this many candidates (None for all)
+            threshold (float): Only return candidates scoring at least this much
+            include_metadata (bool): Skip the SQLite metadata lookup when False (metadata is None)
+
+        Returns:
+            list: (candidate_id, score, metadata) tuples, best first
+        """
+        with self._lock:
+            if not self._live:
+                return []
+            scores = np.asarray(self._vectors() @ np.asarray(query_embedding, dtype=np.float32))
+            deleted = np.frombuffer(bytes(self._deleted[:len(scores)]), dtype=bool)
+
+            candidates = np.flatnonzero(~deleted)
+            if threshold is not None:
+                candidates = candidates[scores[candidates] >= threshold]
+            if top_k is not None and len(candidates) > top_k:
+                best = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+                candidates = candidates[best]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+            metadata = self._metadata(candidates) if include_metadata else {}
+        return [(self._ids[row], float(scores[row]), metadata.get(row)) for row in candidates]
+
+    def compact(self):
+        """Rewrite the vector file without deleted rows."""
+        with self._lock:
+            live_rows = sorted(self._live.values())
+            vectors = np.array(self._vectors()[live_rows]) if live_rows else None
+            metadata = self._metadata(live_rows)
+            self._matrix = None
+
+            tmp_path = self.vectors_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                if vectors is not None:
+                    f.write(vectors.astype(np.float32).tobytes())
+            os.replace(tmp_path, self.vectors_path)
+
+            self._conn.execute("DELETE FROM rows")
+            self._conn.executemany(
+                "INSERT INTO rows (row, candidate_id, metadata) VALUES (?, ?, ?)",
+                [(new_row, self._ids[old_row], json.dumps(metadata[old_row]))
+                 for new_row, old_row in enumerate(live_rows)]
+            )
+            self._conn.commit()
+            self._load()
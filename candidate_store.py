@@ -0,0 +1,229 @@
+import os
+import io
+import csv
+import json
+import sqlite3
+import tempfile
+import threading
+
+CANDIDATE_STORE_PATH = os.getenv("CANDIDATE_STORE_PATH", os.path.join('cache', 'candidates.sqlite'))
+# Rows fetched (and exported) per round trip; bounds memory for any pool size
+STORE_PAGE_SIZE = int(os.getenv("CANDIDATE_STORE_PAGE_SIZE", "1000"))
+
+# API field -> column; anything else a candidate carries (lexicalScore, bestChunk, ...) goes in `extra`
+FIELDS = (("id", "id"), ("email", "email"), ("filename", "filename"), ("storedFilename", "stored_filename"),
+          ("score", "score"), ("status", "status"), ("uploadDate", "upload_date"))
+EXPORT_COLUMNS = ("id", "email", "filename", "storedFilename", "score", "status", "uploadDate",
+                  "lexicalScore", "missingSkills", "bestChunk", "rerankScore")
+
+_SELECT = "SELECT id, email, filename, stored_filename, score, status, upload_date, extra FROM candidates"
+
+
+class CandidateStore:
+    """
+    Candidate records of the recruiter dashboard, in SQLite.
+
+    Replaces the in-process list: every endpoint reads candidates page by
+    page (`iter`) and writes them back in batches, so memory use does not
+    grow with the pool. IDs come from SQLite, so two concurrent uploads
+    never get the same one. The 500-character resume preview is kept on
+    disk and only returned when asked for.
+    """
+
+    def __init__(self, path=CANDIDATE_STORE_PATH, page_size=STORE_PAGE_SIZE):
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT,
+                filename TEXT,
+                stored_filename TEXT,
+                score REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                upload_date TEXT,
+                preview TEXT,
+                extra TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_status ON candidates(status, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    def add(self, candidate):
+        """Insert a candidate dict and return its new ID (also set on the dict)."""
+        with self._lock:
+            # An explicit ID is kept (records migrated from an older store)
+            cursor = self._conn.execute(
+                "INSERT INTO candidates (id, email, filename, stored_filename, score, status, upload_date, preview, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (candidate.get('id'), *self._values(candidate), candidate.get('resumeText')))
+            self._conn.commit()
+        candidate['id'] = cursor.lastrowid
+        return candidate['id']
+
+    def update(self, candidates):
+        """Write back score, status and extra fields of one or many candidate dicts."""
+        if isinstance(candidates, dict):
+            candidates = [candidates]
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE candidates SET email = ?, filename = ?, stored_filename = ?, score = ?, status = ?, "
+                "upload_date = ?, extra = ? WHERE id = ?",
+                [(*self._values(candidate), candidate['id']) for candidate in candidates])
+            self._conn.commit()
+
+    def delete(self, candidate_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM candidates WHERE id = ?", (int(candidate_id),))
+            self._conn.commit()
+
+    def get(self, candidate_id, include_preview=False):
+        """One candidate dict, or None."""
+        with self._lock:
+            row = self._conn.execute(_SELECT.replace(" FROM", ", preview FROM") + " WHERE id = ?",
+                                     (int(candidate_id),)).fetchone()
+        if row is None:
+            return None
+        candidate = self._candidate(row[:-1])
+        if include_preview and row[-1] is not None:
+            candidate['resumeText'] = row[-1]
+        return candidate
+
+    def get_many(self, candidate_ids):
+        """{id: candidate dict} for the IDs found (without previews)."""
+        candidate_ids = [int(candidate_id) for candidate_id in candidate_ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(candidate_ids), 500):
+                chunk = candidate_ids[start:start + 500]
+                rows = self._conn.execute(_SELECT + f" WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((row[0], self._candidate(row)) for row in rows)
+        return found
+
+    def iter(self, status=None, offset=0, limit=None):
+        """
+        Yield candidate dicts in ID order, `page_size` rows at a time.
+
+        Pages are selected by ID (keyset pagination), so a long export never
+        holds a read transaction open and skipping ahead stays cheap.
+        """
+        last_id, remaining = None, limit
+        if offset:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT id FROM candidates" + (" WHERE status = ?" if status else "")
+                    + " ORDER BY id LIMIT 1 OFFSET ?", ((status,) if status else ()) + (offset - 1,)).fetchone()
+            if row is None:
+                return
+            last_id = row[0]
+        while remaining is None or remaining > 0:
+            page = self.page_size if remaining is None else min(self.page_size, remaining)
+            where, params = [], []
+            if last_id is not None:
+                where.append("id > ?")
+                params.append(last_id)
+            if status:
+                where.append("status = ?")
+                params.append(status)
+            query = _SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id LIMIT ?"
+            with self._lock:
+                rows = self._conn.execute(query, (*params, page)).fetchall()
+            for row in rows:
+                yield self._candidate(row)
+            if len(rows) < page:
+                return
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def iter_pages(self, **kwargs):
+        """Like iter(), but yields lists of up to `page_size` candidates."""
+        page = []
+        for candidate in self.iter(**kwargs):
+            page.append(candidate)
+            if len(page) >= self.page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def get_setting(self, key, default=None):
+        """A dashboard setting (e.g. the threshold), shared by every thread and worker on this store."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_setting(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            self._conn.commit()
+
+    def export_csv(self, columns=EXPORT_COLUMNS):
+        """Yield the report as CSV text, one chunk per page of candidates."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for page in self.iter_pages():
+            for candidate in page:
+                writer.writerow([_cell(candidate.get(column)) for column in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def export_parquet(self, columns=EXPORT_COLUMNS, chunk_size=1 << 16):
+        """
+        Yield the report as a Parquet file, one row group per page of candidates.
+
+        Needs pyarrow. The file is written to a temporary file first (Parquet
+        keeps its index in a footer) and streamed from there.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+        schema = pa.schema([(column, pa.float64() if column in ('score', 'lexicalScore', 'rerankScore')
+                             else pa.int64() if column == 'id' else pa.string()) for column in columns])
+        with tempfile.TemporaryFile() as f:
+            with pq.ParquetWriter(f, schema) as writer:
+                for page in self.iter_pages():
+                    data = {column: [_cell(c.get(column)) if schema.field(column).type == pa.string() else c.get(column)
+                                     for c in page] for column in columns}
+                    writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            f.seek(0)
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _values(self, candidate):
+        extra = {key: value for key, value in candidate.items()
+                 if key not in dict(FIELDS) and key != 'resumeText'}
+        return (candidate.get('email'), candidate.get('filename'), candidate.get('storedFilename'),
+                float(candidate.get('score', 0)), candidate.get('status', 'pending'), candidate.get('uploadDate'),
+                json.dumps(extra) if extra else None)
+
+    @staticmethod
+    def _candidate(row):
+        candidate = {field: value for (field, _), value in zip(FIELDS, row)}
+        if row[-1]:
+            candidate.update(json.loads(row[-1]))
+        return candidate
+
+
+def _cell(value):
+    if isinstance(value, list):
+        return "; ".join(map(str, value))
+    return "" if value is None else value
@@ -0,0 +1,222 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join('cache', 'dedup.sqlite'))
+# Estimated Jaccard similarity of word 3-shingles above which two resumes are the same CV
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+MINHASH_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a band
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+
+Duplicate = namedtuple('Duplicate', ['candidate_id', 'reason', 'similarity', 'record'])
+
+
+def content_hash(data):
+    """SHA-256 of the uploaded bytes; identical files give identical hashes whatever their name."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return content_hash(f.read())
+
+
+def normalize_email(email):
+    """
+    Canonical form of an address for duplicate detection, or None if there is none.
+
+    Lowercased, with any "+tag" dropped; Gmail addresses also lose their dots.
+    """
+    if not email or '@' not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    local = local.split('+', 1)[0]
+    if domain in ('gmail.com', 'googlemail.com'):
+        local, domain = local.replace('.', ''), 'gmail.com'
+    return f"{local}@{domain}" if local and domain else None
+
+
+class MinHasher:
+    """
+    MinHash signatures of preprocessed text over word shingles.
+
+    The share of equal positions in two signatures estimates the Jaccard
+    similarity of the two shingle sets. Shingles are hashed to 64 bits and
+    permuted with multiply-shift hashing, all in numpy.
+    """
+
+    def __init__(self, num_perm=MINHASH_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, 2 ** 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, cleaned_text):
+        """uint32 signature of a preprocessed text, or None when it has no words."""
+        words = cleaned_text.split()
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+                              for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        with np.errstate(over='ignore'):  # the multiply is meant to wrap modulo 2**64
+            permuted = (self._a * hashes + self._b) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def similarity(a, b):
+        return float(np.mean(a == b))
+
+
+class DuplicateIndex:
+    """
+    Known candidates, looked up by file hash, email and text similarity.
+
+    Exact keys (content hash, normalised email) map straight to a candidate;
+    near-duplicates are found through MinHash locality-sensitive hashing, so a
+    lookup only compares against candidates sharing a band with the new CV.
+    Each candidate carries a small JSON `record` (e.g. its score and status),
+    which lets a resubmission reuse the earlier decision instead of running
+    the model and emailing the applicant again. Persisted in SQLite.
+    """
+
+    def __init__(self, path=DEDUP_INDEX_PATH, threshold=NEAR_DUPLICATE_THRESHOLD, hasher=None, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.bands = bands
+        self._rows = self.hasher.num_perm // bands
+        self._lock = threading.Lock()
+        self._keys = {}        # "hash:<sha256>" / "email:<address>" -> candidate_id
+        self._owned = {}       # candidate_id -> set of its keys, so remove() touches only those
+        self._signatures = {}  # candidate_id -> signature
+        self._records = {}     # candidate_id -> record
+        self._buckets = {}     # (band, band bytes) -> set of candidate_ids
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                candidate_id TEXT PRIMARY KEY,
+                signature BLOB,
+                record TEXT
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, candidate_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_keys_candidate ON keys(candidate_id)")
+        self._conn.commit()
+        for candidate_id, signature, record in self._conn.execute("SELECT candidate_id, signature, record FROM candidates"):
+            self._records[candidate_id] = json.loads(record) if record else None
+            if signature is not None:
+                self._insert_signature(candidate_id, np.frombuffer(signature, dtype=np.uint32))
+        self._keys = dict(self._conn.execute("SELECT key, candidate_id FROM keys"))
+        for key, candidate_id in self._keys.items():
+            self._owned.setdefault(candidate_id, set()).add(key)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, candidate_id):
+        return str(candidate_id) in self._records
+
+    def find_exact(self, file_hash=None, email=None):
+        """Duplicate with the same file bytes or the same (normalised) email, or None."""
+        with self._lock:
+            for reason, key in (("file", f"hash:{file_hash}" if file_hash else None),
+                                ("email", f"email:{normalize_email(email)}" if normalize_email(email) else None)):
+                candidate_id = self._keys.get(key) if key else None
+                if candidate_id is not None:
+                    return Duplicate(candidate_id, reason, 1.0, self._records.get(candidate_id))
+        return None
+
+    def find_near(self, cleaned_text):
+        """Most similar known CV at or above the threshold, or None."""
+        signature = self.hasher.signature(cleaned_text)
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self._buckets.get(band, set())
+            best, best_similarity = None, self.threshold
+            for candidate_id in candidates:
+                similarity = self.hasher.similarity(signature, self._signatures[candidate_id])
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate_id, similarity
+            if best is None:
+                return None
+            return Duplicate(best, "similar", round(best_similarity, 4), self._records.get(best))
+
+    def find(self, file_hash=None, email=None, cleaned_text=None):
+        """Exact match first, then a near-duplicate of `cleaned_text`."""
+        match = self.find_exact(file_hash, email)
+        if match is None and cleaned_text:
+            match = self.find_near(cleaned_text)
+        return match
+
+    def add(self, candidate_id, file_hash=None, email=None, cleaned_text=None, record=None):
+        """Register a new candidate under its hash, email and text signature."""
+        candidate_id = str(candidate_id)
+        signature = self.hasher.signature(cleaned_text) if cleaned_text else None
+        with self._lock:
+            self._records[candidate_id] = record
+            if signature is not None:
+                self._insert_signature(candidate_id, signature)
+            self._conn.execute("INSERT OR REPLACE INTO candidates (candidate_id, signature, record) VALUES (?, ?, ?)",
+                               (candidate_id, signature.tobytes() if signature is not None else None,
+                                json.dumps(record) if record is not None else None))
+            self._add_keys(candidate_id, file_hash, email)
+            self._conn.commit()
+
+    def link(self, candidate_id, file_hash=None, email=None):
+        """Point a resubmission's hash and email at an existing candidate, so the next one is an exact hit."""
+        with self._lock:
+            self._add_keys(str(candidate_id), file_hash, email)
+            self._conn.commit()
+
+    def remove(self, candidate_id):
+        candidate_id = str(candidate_id)
+        with self._lock:
+            self._records.pop(candidate_id, None)
+            signature = self._signatures.pop(candidate_id, None)
+            if signature is not None:
+                for band in self._bands(signature):
+                    bucket = self._buckets.get(band)
+                    if bucket is not None:
+                        bucket.discard(candidate_id)
+                        if not bucket:
+                            del self._buckets[band]
+            for key in self._owned.pop(candidate_id, ()):
+                del self._keys[key]
+            self._conn.execute("DELETE FROM candidates WHERE candidate_id = ?", (candidate_id,))
+            self._conn.execute("DELETE FROM keys WHERE candidate_id = ?", (candidate_id,))
+            self._conn.commit()
+
+    def _add_keys(self, candidate_id, file_hash, email):
+        email = normalize_email(email)
+        keys = [key for key in (f"hash:{file_hash}" if file_hash else None, f"email:{email}" if email else None) if key]
+        for key in keys:
+            # The first candidate to claim a key keeps it
+            if key not in self._keys:
+                self._keys[key] = candidate_id
+                self._owned.setdefault(candidate_id, set()).add(key)
+                self._conn.execute("INSERT OR IGNORE INTO keys (key, candidate_id) VALUES (?, ?)", (key, candidate_id))
+
+    def _bands(self, signature):
+        return [(band, signature[band * self._rows:(band + 1) * self._rows].tobytes()) for band in range(self.bands)]
+
+    def _insert_signature(self, candidate_id, signature):
+        self._signatures[candidate_id] = signature
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, set()).add(candidate_id)
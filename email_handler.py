@@ -1,7 +1,30 @@
+import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from metrics import span, registry
+
+def smtp_settings():
+    """
+    SMTP server settings as (host, port, use_starttls).
+
+    Gmail by default; set SMTP_HOST, SMTP_PORT and SMTP_STARTTLS=0 to point at a
+    local sink server. Read on every call because the apps load .env after import.
+    """
+    return (os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            int(os.getenv("SMTP_PORT", "587")),
+            os.getenv("SMTP_STARTTLS", "1") != "0")
+
+def build_message(sender_email, receiver_email, subject, body):
+    """Build a plain-text email message."""
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = receiver_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
 def send_email(sender_email, smtp_password, receiver_email, subject, body):
     """
     Send an email using Gmail SMTP.
@@ -15,20 +38,50 @@ def send_email(sender_email, smtp_password, receiver_email, subject, body):
     """
     try:
         # Create the email message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = receiver_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
+        msg = build_message(sender_email, receiver_email, subject, body)
 
         # Connect to Gmail SMTP server
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(sender_email, smtp_password)
-        server.send_message(msg)
-        server.quit()
+        with span("smtp_send"):
+            host, port, use_starttls = smtp_settings()
+            server = smtplib.SMTP(host, port)
+            if use_starttls:
+                server.starttls()
+            if smtp_password:
+                server.login(sender_email, smtp_password)
+            server.send_message(msg)
+            server.quit()
+
+        registry.inc("hr_emails_total", result="sent")
+        print(f"Email sent to {receiver_email}")
+        return True
+
+    except Exception as e:
+        registry.inc("hr_emails_total", result="failed")
+        print(f"Failed to send email to {receiver_email}: {e}")
+        return False
+
+async def send_email_async(sender_email, smtp_password, receiver_email, subject, body):
+    """
+    send_email() for the asyncio server: the SMTP conversation runs on the
+    event loop (aiosmtplib) instead of holding a thread. Returns True on success.
+    """
+    try:
+        import aiosmtplib
+    except ImportError:
+        raise ImportError("Async email sending needs aiosmtplib: pip install aiosmtplib")
+    try:
+        msg = build_message(sender_email, receiver_email, subject, body)
+        with span("smtp_send"):
+            host, port, use_starttls = smtp_settings()
+            await aiosmtplib.send(msg, hostname=host, port=port, start_tls=use_starttls,
+                                  username=sender_email if smtp_password else None,
+                                  password=smtp_password or None)
 
+        registry.inc("hr_emails_total", result="sent")
         print(f"Email sent to {receiver_email}")
+        return True
 
     except Exception as e:
+        registry.inc("hr_emails_total", result="failed")
         print(f"Failed to send email to {receiver_email}: {e}")
+        return False
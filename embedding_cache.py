@@ -0,0 +1,203 @@
+import os
+import mmap
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from extraction_pool import extract_many
+from extract_text import InMemoryFile, open_source
+from preprocessing import preprocess_text, PREPROCESS_VERSION
+from similarity import MODEL_ID, BATCH_SIZE, encode_texts
+
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join('cache', 'embeddings.sqlite'))
+CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+CachedDocument = namedtuple('CachedDocument', ['key', 'raw_text', 'cleaned_text', 'embedding'])
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of extracted text, preprocessed text and embeddings.
+
+    Entries are keyed by a SHA-256 of the document bytes (or job description text)
+    together with the model (and encoder backend) and preprocessing version, so changing either one
+    never serves stale vectors. The total stored size is bounded and the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES,
+                 model_name=MODEL_ID, preprocess_version=PREPROCESS_VERSION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.model_name = model_name
+        self.preprocess_version = preprocess_version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                raw_text TEXT NOT NULL,
+                cleaned_text TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self._conn.commit()
+        # Running total of `size`, so a put never has to sum the whole table
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def make_key(self, data):
+        """Build the cache key for raw document bytes (or text)."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_name}\0{self.preprocess_version}\0".encode('utf-8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the CachedDocument for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_text, cleaned_text, embedding FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        embedding = np.frombuffer(row[2], dtype=np.float32)
+        return CachedDocument(key, row[0], row[1], embedding)
+
+    def put(self, key, raw_text, cleaned_text, embedding):
+        """Store an entry and evict least recently used entries if over budget."""
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        size = len(blob) + len(raw_text.encode('utf-8')) + len(cleaned_text.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, raw_text, cleaned_text, embedding, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, raw_text, cleaned_text, blob, size, time.time())
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Oldest entries a page at a time, through the last_access index
+        while self._total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC LIMIT 64").fetchall()
+            if not rows:
+                self._total = 0
+                return
+            for key, size in rows:
+                if self._total <= self.max_bytes:
+                    return
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total -= size
+                self.evictions += 1
+
+    def iter_files(self, file_paths, batch_size=BATCH_SIZE, skip=None):
+        """
+        Yield (index, CachedDocument) for every file path as soon as it is ready.
+
+        Items may also be InMemoryFile uploads, which are hashed and extracted
+        from memory; paths are hashed through a memory map.
+
+        Hits are yielded straight away. Misses are extracted by the parallel
+        extraction pool and embedded in mini-batches of `batch_size` as the
+        extractions complete. Documents whose extraction produced no text are
+        yielded but not cached, so a transient extraction failure is retried.
+        `skip(index, raw_text, cleaned_text)` may return True for a miss that
+        needs no embedding (e.g. a known duplicate); it is yielded with
+        embedding None and not cached.
+        """
+        missing = {}
+        for i, file_path in enumerate(file_paths):
+            if isinstance(file_path, InMemoryFile):
+                key = self.make_key(file_path.data)
+            else:
+                with open_source(file_path) as data:
+                    # Empty files cannot be mapped and come back as a buffer
+                    key = self.make_key(data if isinstance(data, mmap.mmap) else data.read())
+            cached = self.get(key)
+            if cached is not None:
+                yield i, cached
+            else:
+                missing.setdefault(file_path, []).append((i, key))
+
+        batch = []
+        for file_path, raw_text in extract_many(list(missing)):
+            cleaned = preprocess_text(raw_text)
+            if skip is not None:
+                skipped = [(i, key) for i, key in missing[file_path] if skip(i, raw_text, cleaned)]
+                for i, key in skipped:
+                    yield i, CachedDocument(key, raw_text, cleaned, None)
+                missing[file_path] = [entry for entry in missing[file_path] if entry not in skipped]
+                if not missing[file_path]:
+                    continue
+            batch.append((file_path, raw_text, cleaned))
+            if len(batch) >= batch_size:
+                yield from self._embed_batch(batch, missing)
+                batch = []
+        if batch:
+            yield from self._embed_batch(batch, missing)
+
+    def _embed_batch(self, batch, missing):
+        embeddings = encode_texts([cleaned for _, _, cleaned in batch])
+        for (file_path, raw_text, cleaned), embedding in zip(batch, embeddings):
+            for i, key in missing[file_path]:
+                if raw_text.strip():
+                    self.put(key, raw_text, cleaned, embedding)
+                yield i, CachedDocument(key, raw_text, cleaned, embedding)
+
+    def get_or_compute_files(self, file_paths, batch_size=BATCH_SIZE, skip=None):
+        """Return a CachedDocument for every file path, in input order."""
+        documents = [None] * len(file_paths)
+        for i, document in self.iter_files(file_paths, batch_size=batch_size, skip=skip):
+            documents[i] = document
+        return documents
+
+    def get_or_compute_file(self, file_path, skip=None):
+        """Single-file convenience wrapper around get_or_compute_files."""
+        return self.get_or_compute_files([file_path], skip=skip)[0]
+
+    def get_or_compute_text(self, text):
+        """Cache lookup for free text such as a job description."""
+        key = self.make_key(text)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        cleaned = preprocess_text(text)
+        embedding = encode_texts([cleaned])[0]
+        self.put(key, text, cleaned, embedding)
+        return CachedDocument(key, text, cleaned, embedding)
+
+    def stats(self):
+        """Hit/miss counters and current on-disk footprint."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._total
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
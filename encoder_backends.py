@@ -0,0 +1,101 @@
+import os
+import zlib
+import warnings
+
+import numpy as np
+
+from startup import is_offline
+
+# "torch" (fp32 PyTorch), "int8" (PyTorch with dynamically quantised Linear layers),
+# "onnx" (ONNX Runtime) or "hashing" (no model at all; benchmarks and tests only)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch").lower()
+# ONNX graph inside the model repo, e.g. "onnx/model_qint8_avx512_vnni.onnx" for a quantised one
+ENCODER_ONNX_FILE = os.getenv("ENCODER_ONNX_FILE")
+# Intra-op threads per process (torch and ONNX Runtime); lower it when several workers share one CPU box
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+
+BACKENDS = ('torch', 'int8', 'onnx', 'hashing')
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer: a hashed bag of words.
+
+    Shares the model's encode() signature and output shape, so everything
+    around the model (batching, scoring, caching, indexing) can be exercised
+    offline without a model download. The scores mean nothing.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True,
+               show_progress_bar=False):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = [zlib.crc32(word.encode('utf-8')) % self.dim for word in text.split()]
+            np.add.at(embeddings[row], buckets, 1.0)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1, norms)
+        return embeddings
+
+
+def backend_id(model_name, backend=ENCODER_BACKEND, onnx_file=ENCODER_ONNX_FILE):
+    """
+    Identifier of the embeddings a backend produces.
+
+    Used in cache keys: int8 and ONNX embeddings differ slightly from fp32
+    ones, so they must not be served from each other's cache entries.
+    """
+    if backend == 'torch':
+        return model_name
+    if backend == 'onnx' and onnx_file:
+        return f"{model_name}:onnx:{onnx_file}"
+    return f"{model_name}:{backend}"
+
+
+def load_encoder(model_name, backend=ENCODER_BACKEND, onnx_file=ENCODER_ONNX_FILE, threads=ENCODER_THREADS):
+    """
+    Load `model_name` on the requested CPU backend.
+
+    Every backend returns an object with SentenceTransformer's encode()
+    signature, so the rest of the code does not care which one is active.
+    With HR_OFFLINE=1 the model is loaded from the local Hugging Face cache only.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+    if backend == 'hashing':
+        return HashingEncoder()
+
+    if is_offline():
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'onnx':
+        try:
+            import onnxruntime
+            import optimum  # noqa: F401
+        except ImportError:
+            raise ImportError('ENCODER_BACKEND=onnx needs ONNX Runtime: pip install "sentence-transformers[onnx]"')
+        model_kwargs = {"file_name": onnx_file} if onnx_file else {}
+        if threads:
+            # Optimum passes session options through to the ONNX Runtime InferenceSession
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = session_options
+        return SentenceTransformer(model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == 'torch':
+        return SentenceTransformer(model_name)
+
+    # Weights of every Linear layer stored as int8 and activations quantised on the fly;
+    # roughly 4x smaller transformer weights and faster matmuls on CPU
+    model = SentenceTransformer(model_name, device='cpu')
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # quantised tensor deprecation notice
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8).eval()
@@ -1,31 +1,358 @@
+import io
+import os
+import re
+import mmap
+import time
+import zipfile
+import sqlite3
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from pdfminer.high_level import extract_text
-from pdf2image import convert_from_path
+from pdfminer.layout import LAParams
+from pdfminer.converter import TextConverter
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFStream, resolve1
+from pdf2image import convert_from_path, convert_from_bytes
 import pytesseract
-import docx2txt
 
+from metrics import span
 
-def extract_text_from_pdf(file_path):
-    try:
-        text = extract_text(file_path)
-        if text.strip():
-            return text
+# Limits that keep one huge scanned PDF from stalling a batch (MAX_PAGES caps the pages OCRed, not the text layer)
+MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "30"))
+DOCUMENT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "120"))  # seconds per document
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "4"))
+# Rasterization resolution for OCR; 200 is pdf2image's default, 150 is ~40% faster on clean scans
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# Pages whose text layer has fewer non-space characters than this are OCRed
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join('cache', 'ocr_pages.sqlite'))
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+# An upload held in memory: extractors take it (or bytes, a file object, a path) instead of a saved file
+InMemoryFile = namedtuple('InMemoryFile', ['name', 'data'])
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# What docx2txt writes for each layout element; w:p starts a paragraph
+_DOCX_BREAKS = {_W + 'p': '\n\n', _W + 'tab': '\t', _W + 'br': '\n', _W + 'cr': '\n'}
+
+
+def source_name(source):
+    """File name of a document source, for messages and format detection ('' when unknown)."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, InMemoryFile):
+        return source.name or ''
+    return getattr(source, 'filename', None) or getattr(source, 'name', None) or ''
+
+
+@contextmanager
+def open_source(source):
+    """
+    A seekable binary file object for a document source.
+
+    Paths are memory-mapped rather than read into a buffer; bytes and
+    InMemoryFile data are wrapped in BytesIO; file objects (e.g. an upload's
+    stream) are used as they are.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield io.BytesIO(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    elif isinstance(source, InMemoryFile):
+        yield io.BytesIO(source.data)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    else:
+        source = getattr(source, 'stream', source)  # Werkzeug FileStorage
+        source.seek(0)
+        yield source
+
+
+def source_bytes(source):
+    """The whole document as bytes (a path is read once)."""
+    if isinstance(source, InMemoryFile):
+        return source.data
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open_source(source) as f:
+        f.seek(0)
+        return f.read()
+
+
+def _remaining(deadline):
+    """Seconds left before `deadline` (None means no limit)."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Document extraction timed out")
+    return remaining
+
+
+class OCRCache:
+    """
+    OCR text per page, keyed by a hash of the page's content and the DPI.
+
+    The key comes from the page's own streams (text operators and embedded
+    images), not the file, so a scan that is uploaded again, or re-wrapped
+    in a new PDF, is not rasterized and OCRed a second time. SQLite in WAL
+    mode, so extraction worker processes can share it.
+    """
+
+    def __init__(self, path=OCR_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, text):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO pages (key, text) VALUES (?, ?)", (key, text))
+            self._conn.commit()
+
+
+def get_ocr_cache():
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = OCRCache()
+    return _ocr_cache
+
+
+def _page_fingerprint(page):
+    # Raw (still compressed) bytes of the page's content streams and image/form XObjects
+    digest = hashlib.sha256()
+    streams = list(page.contents)
+    xobjects = resolve1((page.resources or {}).get('XObject')) or {}
+    streams += [xobjects[name] for name in sorted(xobjects)]
+    for stream in streams:
+        stream = resolve1(stream)
+        if isinstance(stream, PDFStream):
+            digest.update(stream.get_rawdata() or b'')
+    return digest.hexdigest()
+
+
+def _has_images(resources, depth=0):
+    # Image XObjects on the page, or inside the form XObjects it draws (scanners often wrap them)
+    xobjects = resolve1((resources or {}).get('XObject')) or {}
+    for xobject in xobjects.values():
+        xobject = resolve1(xobject)
+        if not isinstance(xobject, PDFStream):
+            continue
+        subtype = getattr(xobject.get('Subtype'), 'name', None)
+        if subtype == 'Image':
+            return True
+        if subtype == 'Form' and depth < 2 and _has_images(resolve1(xobject.get('Resources')), depth + 1):
+            return True
+    return False
+
+
+def pdf_pages(source, max_pages=None):
+    """
+    (text, fingerprint, has_images) for each page from one pdfminer pass (the first `max_pages` only, if given).
+
+    `source` is a path, bytes, an InMemoryFile or a seekable file object.
+
+    The texts joined together are exactly what pdfminer's extract_text()
+    returns for the document (each page ends with a form feed).
+    """
+    resources = PDFResourceManager()
+    output = io.StringIO()
+    device = TextConverter(resources, output, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resources, device)
+    pages = []
+    with open_source(source) as f:
+        for page in PDFPage.get_pages(f, maxpages=max_pages or 0):
+            output.seek(0)
+            output.truncate()
+            interpreter.process_page(page)
+            pages.append((output.getvalue(), _page_fingerprint(page), _has_images(page.resources)))
+    device.close()
+    return pages
+
+
+def needs_ocr(page_text, has_images, min_chars=OCR_MIN_PAGE_CHARS):
+    """
+    True for a page whose text has to come from OCR: its text layer is empty,
+    or it draws an image and the text layer is too thin to be the real content.
+
+    An empty page is OCRed whatever it draws, since scans also arrive as inline
+    images or vector outlines that _has_images() does not see.
+    """
+    chars = sum(not c.isspace() for c in page_text)
+    return chars == 0 or (has_images and chars < min_chars)
+
+
+def _ocr_page(source, page_number, deadline, dpi=OCR_DPI):
+    # Rasterize and OCR a single page so pages can run in parallel; poppler reads
+    # a path itself and gets in-memory documents as bytes
+    if isinstance(source, (str, os.PathLike)):
+        images = convert_from_path(source, dpi=dpi, first_page=page_number, last_page=page_number,
+                                   timeout=_remaining(deadline))
+    else:
+        images = convert_from_bytes(source, dpi=dpi, first_page=page_number, last_page=page_number,
+                                    timeout=_remaining(deadline))
+    return "".join(pytesseract.image_to_string(image, timeout=_remaining(deadline) or 0)
+                   for image in images)
+
+
+def ocr_pages(source, page_numbers, fingerprints=None, dpi=OCR_DPI, timeout=DOCUMENT_TIMEOUT,
+              workers=OCR_WORKERS, cache=None):
+    """
+    OCR the given 1-based pages, running up to `workers` pages in parallel.
+
+    With `fingerprints` (one per page number), pages already in the OCR
+    cache are not rasterized, and new results are stored. The rasterizer
+    and each tesseract call get the time remaining until the document
+    deadline, so a slow scan is killed instead of blocking the caller.
+    `source` is a path or any in-memory source. Returns {page_number: text}.
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    results = {}
+    keys = {}
+    if fingerprints is not None:
+        cache = cache or get_ocr_cache()
+        for page_number, fingerprint in zip(page_numbers, fingerprints):
+            keys[page_number] = f"{fingerprint}:{dpi}"
+            cached = cache.get(keys[page_number])
+            if cached is not None:
+                results[page_number] = cached
+    todo = [page_number for page_number in page_numbers if page_number not in results]
+    if not todo:
+        return results
+    if not isinstance(source, (str, os.PathLike)):
+        source = source_bytes(source)
+
+    with span("ocr"):
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as executor:
+            texts = executor.map(lambda n: _ocr_page(source, n, deadline, dpi), todo)
+            for page_number, text in zip(todo, texts):
+                results[page_number] = text
+                if page_number in keys:
+                    cache.put(keys[page_number], text)
+    return results
+
+
+def extract_text_from_pdf(source, max_pages=MAX_PAGES, timeout=DOCUMENT_TIMEOUT, dpi=OCR_DPI):
+    """
+    Text of a PDF (a path or an in-memory source), page by page.
+
+    Pages with a real text layer are read directly, however many there are;
+    only pages without one (scans, or scanned pages inside an otherwise
+    digital PDF) are rasterized at `dpi` and OCRed, at most `max_pages` of
+    them, with OCR results cached per page content.
+    """
+    with span("extract", format="pdf", ocr="false") as labels:
+        try:
+            pages = pdf_pages(source)
+            scanned = [n for n, (text, _, has_images) in enumerate(pages, start=1) if needs_ocr(text, has_images)]
+            if max_pages and len(scanned) > max_pages:
+                print(f"OCR limited to {max_pages} of {len(scanned)} scanned pages in {source_name(source) or 'PDF'}")
+                scanned = scanned[:max_pages]
+            if not scanned:
+                return "".join(text for text, _, _ in pages)
+            labels["ocr"] = "true"
+            try:
+                ocr_text = ocr_pages(source, scanned, [pages[n - 1][1] for n in scanned], dpi=dpi, timeout=timeout)
+            except Exception as e:
+                # Keep whatever the text layer has rather than losing the whole document
+                print(f"OCR failed for {source_name(source) or 'PDF'}: {e}")
+                ocr_text = {}
+            return "".join(ocr_text.get(n, text) for n, (text, _, _) in enumerate(pages, start=1))
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+            return ""
+
+def _docx_part_text(stream, parts):
+    # One streaming pass over a WordprocessingML part, in document order; finished
+    # elements are cleared so memory stays flat however long the document is
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if element.tag in _DOCX_BREAKS:
+                parts.append(_DOCX_BREAKS[element.tag])
         else:
-            # Fallback to OCR if no text found
-            images = convert_from_path(file_path)
-            ocr_text = ""
-            for image in images:
-                ocr_text += pytesseract.image_to_string(image)
-            return ocr_text
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return ""
-    
-def extract_text_from_docx(file_path):
-    try:
-        text = docx2txt.process(file_path)
-        return text
-    except Exception as e:
-        print(f"Error extracting text from DOCX: {e}")
-        return ""
\ No newline at end of file
+            if element.tag == _W + 't' and element.text:
+                parts.append(element.text)
+            element.clear()
+
+
+def _docx_text(zip_source):
+    with zipfile.ZipFile(zip_source) as docx:
+        names = docx.namelist()
+        members = ([name for name in names if re.match('word/header[0-9]*.xml', name)]
+                   + ['word/document.xml']
+                   + [name for name in names if re.match('word/footer[0-9]*.xml', name)])
+        parts = []
+        for member in members:
+            with docx.open(member) as stream:
+                _docx_part_text(stream, parts)
+    return "".join(parts).strip()
+
+
+def extract_text_from_docx(source):
+    """
+    Text of a DOCX (a path or an in-memory source): headers, body, then footers.
+
+    Each XML part is parsed as a stream straight out of the zip, giving the
+    same text as docx2txt.process() without building the document tree.
+    """
+    with span("extract", format="docx", ocr="false"):
+        try:
+            if isinstance(source, (str, os.PathLike)):
+                # zipfile only reads the directory and the members it opens
+                return _docx_text(source)
+            with open_source(source) as f:
+                return _docx_text(f)
+        except Exception as e:
+            print(f"Error extracting text from DOCX: {e}")
+            return ""
+
+
+def document_format(source):
+    """'pdf' or 'docx' from the file name, or from the leading bytes when there is no name."""
+    name = source_name(source).lower()
+    if name.endswith('.pdf'):
+        return 'pdf'
+    if name.endswith('.docx'):
+        return 'docx'
+    if name:
+        return None
+    with open_source(source) as f:
+        head = f.read(4)
+        f.seek(0)
+    return 'pdf' if head == b'%PDF' else 'docx' if head == b'PK\x03\x04' else None
+
+
+def extract_text_from_file(source, max_pages=MAX_PAGES, timeout=DOCUMENT_TIMEOUT):
+    """
+    Extract text from a PDF or DOCX, choosing the extractor by extension.
+
+    `source` is a path, an InMemoryFile(name, data), bytes, or a file object
+    such as an upload stream, so an upload never has to be saved first.
+    """
+    kind = document_format(source)
+    if kind == 'pdf':
+        return extract_text_from_pdf(source, max_pages=max_pages, timeout=timeout)
+    elif kind == 'docx':
+        return extract_text_from_docx(source)
+    raise ValueError(f"Unsupported file format: {source_name(source) or 'unknown'}")
@@ -0,0 +1,246 @@
+import os
+import time
+import signal
+import atexit
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+from extract_text import extract_text_from_file, source_name, MAX_PAGES, DOCUMENT_TIMEOUT
+from metrics import collect_spans, record_spans
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+
+# Extra time the parent waits past the per-document timeout before giving up on a worker
+TIMEOUT_GRACE = 10
+# Times a document is resubmitted after its worker process was lost (another document timed out)
+RESUBMIT_LIMIT = 3
+
+_task_events = None  # set in each worker process: where it reports (task, pid, start time)
+
+
+def extract_in_worker(source, max_pages=MAX_PAGES, timeout=DOCUMENT_TIMEOUT):
+    """
+    (text, error, spans) for one document; meant to run in a child process.
+
+    Errors are returned rather than raised so one bad file never breaks the
+    stream. Timing spans go back to the parent (see record_spans), whose
+    metrics are the ones scraped.
+    """
+    with collect_spans() as spans:
+        try:
+            return extract_text_from_file(source, max_pages=max_pages, timeout=timeout), None, spans
+        except Exception as e:
+            return "", str(e), spans
+
+
+def _init_worker(events):
+    global _task_events
+    _task_events = events
+
+
+def _run_task(task_id, fn, *args):
+    _task_events.put((task_id, os.getpid(), time.time()))
+    return fn(*args)
+
+
+class ExtractionPool:
+    """
+    One bounded process pool shared by every extraction in the process.
+
+    Concurrent requests and pipeline runs submit to the same `workers`
+    processes, so the process and memory budget stays fixed however many
+    callers there are. Workers report when they start a task; a watchdog
+    thread kills the worker of a task that runs past its timeout (plus
+    TIMEOUT_GRACE), since a hung document cannot be cancelled any other way,
+    and fails that task with TimeoutError. Tasks that were on the lost
+    processes are resubmitted to fresh ones. Processes start on first use.
+    """
+
+    def __init__(self, workers=EXTRACT_WORKERS, mp_context=None):
+        self.workers = max(1, workers)
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._tasks = {}  # task id -> [future, fn, args, timeout, attempts, (pid, started) or None]
+        self._events = None
+        self._closed = False
+
+    def submit(self, fn, *args, timeout=None):
+        """Run fn(*args) in a worker; returns a Future. `timeout` (seconds) bounds the run, not the queueing."""
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            if self._events is None:
+                self._events = self.mp_context.SimpleQueue()
+                threading.Thread(target=self._listen, args=(self._events,), name="extraction-events",
+                                 daemon=True).start()
+                threading.Thread(target=self._watch, name="extraction-watchdog", daemon=True).start()
+            self._tasks[task_id] = [future, fn, args, timeout, 0, None]
+        self._dispatch(task_id)
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task[4] += 1
+            task[5] = None
+            for _ in range(2):
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context,
+                                                         initializer=_init_worker, initargs=(self._events,))
+                try:
+                    inner = self._executor.submit(_run_task, task_id, task[1], *task[2])
+                    break
+                except BrokenProcessPool:
+                    # A worker died (killed by the watchdog, or e.g. for memory); start new ones
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+            else:
+                inner = None
+        if inner is None:
+            self._finish(task_id, error=BrokenProcessPool("could not start extraction workers"))
+        else:
+            inner.add_done_callback(lambda done: self._settle(task_id, done))
+
+    def _settle(self, task_id, inner):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return  # already failed by the watchdog
+            lost = inner.cancelled() or isinstance(inner.exception(), BrokenProcessPool)
+            retry = lost and task[4] < RESUBMIT_LIMIT and not self._closed
+        if retry:
+            self._dispatch(task_id)
+        elif inner.cancelled():
+            self._finish(task_id, error=BrokenProcessPool("extraction pool shut down"))
+        elif inner.exception() is not None:
+            self._finish(task_id, error=inner.exception())
+        else:
+            self._finish(task_id, result=inner.result())
+
+    def _finish(self, task_id, result=None, error=None):
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+        if task is None or task[0].cancelled():
+            return
+        if error is not None:
+            task[0].set_exception(error)
+        else:
+            task[0].set_result(result)
+
+    def _listen(self, events):
+        while True:
+            task_id, pid, started = events.get()
+            with self._lock:
+                if task_id in self._tasks:
+                    self._tasks[task_id][5] = (pid, started)
+
+    def _watch(self):
+        while not self._closed:
+            time.sleep(0.5)
+            now = time.time()
+            with self._lock:
+                overdue = [(task_id, task[5][0]) for task_id, task in self._tasks.items()
+                           if task[3] and task[5] is not None and now - task[5][1] > task[3] + TIMEOUT_GRACE]
+                if overdue:
+                    # Killing a worker breaks the executor; the next dispatch starts a new one
+                    executor, self._executor = self._executor, None
+            for task_id, pid in overdue:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                self._finish(task_id, error=TimeoutError("extraction worker killed after its deadline"))
+            if overdue and executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = ExtractionPool()
+atexit.register(lambda: _pool.shutdown())
+
+
+def get_pool():
+    """The process-wide ExtractionPool."""
+    return _pool
+
+
+def configure_pool(workers=EXTRACT_WORKERS, mp_context=None):
+    """Replace the process-wide pool (a server choosing its size and start method); returns it."""
+    global _pool
+    old, _pool = _pool, ExtractionPool(workers, mp_context)
+    old.shutdown()
+    return _pool
+
+
+def extract_many(file_paths, workers=None, max_pages=MAX_PAGES, timeout=DOCUMENT_TIMEOUT):
+    """
+    Extract text from many PDF/DOCX files on the shared process pool.
+
+    Yields (file_path, text) tuples in completion order, so callers can start
+    scoring the first documents while scanned PDFs are still being OCR'd.
+    Failed or timed-out documents are yielded with empty text; the worker of
+    a timed-out document is killed rather than left running.
+
+    Args:
+        file_paths (list): Paths of the documents to extract, or InMemoryFile
+            uploads (their bytes are sent to the workers; nothing touches disk)
+        workers (int): Most documents this call has on the pool at once
+            (default: as many as the pool has processes). 1 extracts
+            in-process, one document after another, with no watchdog:
+            `timeout` then only bounds OCR, and a hung parse blocks the caller
+        max_pages (int): Most scanned pages OCRed per document
+        timeout (float): Seconds allowed per document
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+
+    if workers == 1:
+        for file_path in file_paths:
+            text, error, spans = extract_in_worker(file_path, max_pages, timeout)
+            record_spans(spans)
+            if error:
+                print(f"Error extracting {source_name(file_path)}: {error}")
+            yield file_path, text
+        return
+
+    pool = get_pool()
+    workers = workers or pool.workers
+    queued = list(reversed(file_paths))
+    pending = {}
+    try:
+        while queued or pending:
+            while queued and len(pending) < workers:
+                file_path = queued.pop()
+                pending[pool.submit(extract_in_worker, file_path, max_pages, timeout, timeout=timeout)] = file_path
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    text, error, spans = future.result()
+                except TimeoutError:
+                    print(f"Extraction timed out: {source_name(file_path)}")
+                    yield file_path, ""
+                    continue
+                except Exception as e:
+                    text, error, spans = "", repr(e), []
+                record_spans(spans)
+                if error:
+                    print(f"Error extracting {source_name(file_path)}: {error}")
+                yield file_path, text
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+QUEUE_PATH = os.getenv("INTAKE_QUEUE_PATH", os.path.join('cache', 'intake_queue.sqlite'))
+INTAKE_WORKERS = int(os.getenv("INTAKE_WORKERS", "2"))
+MAX_PENDING = int(os.getenv("INTAKE_MAX_PENDING", "200"))  # queued + processing before we push back
+# Seconds without a heartbeat before a processing job is re-queued; workers renew every third of this
+STALE_AFTER = int(os.getenv("INTAKE_STALE_AFTER", "600"))
+
+
+class QueueFull(Exception):
+    """Raised by IntakeQueue.submit when the backlog is at capacity."""
+
+
+class IntakeQueue:
+    """
+    Durable application queue backed by a local SQLite file.
+
+    `submit` only records the job and returns an application ID; a bounded
+    pool of worker threads runs `handler(application_id, payload, progress)`
+    in the background. `progress(stage)` lets the handler report which step it
+    is on, and the handler's return value is stored as the job result. While
+    a job runs, its worker renews it with a heartbeat, so a slow job is never
+    handed out (and its candidate emailed) twice; jobs with no heartbeat for
+    `stale_after` seconds, because the process died, are re-queued. Claims are atomic at the row level, so several
+    processes can share one queue file.
+    """
+
+    def __init__(self, handler, path=QUEUE_PATH, workers=INTAKE_WORKERS,
+                 max_pending=MAX_PENDING, stale_after=STALE_AFTER):
+        self.handler = handler
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._stopping = False
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS applications (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_status ON applications(status, created)")
+        self._conn.commit()
+
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"intake-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the workers to exit after their current job."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending_count()
+
+    def _pending_count(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM applications WHERE status IN ('queued', 'processing')"
+        ).fetchone()[0]
+
+    def submit(self, payload, application_id=None):
+        """
+        Enqueue an application and return its ID.
+
+        Raises:
+            QueueFull: If `max_pending` jobs are already waiting or running
+        """
+        application_id = application_id or str(uuid.uuid4())
+        now = time.time()
+        with self._wakeup:
+            if self._pending_count() >= self.max_pending:
+                raise QueueFull(f"Intake queue is full ({self.max_pending} applications pending)")
+            self._conn.execute(
+                "INSERT INTO applications (id, status, payload, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+                (application_id, json.dumps(payload), now, now)
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+        return application_id
+
+    def status(self, application_id):
+        """Return the job record as a dict, or None if the ID is unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, stage, result, error, created, updated FROM applications WHERE id = ?",
+                (application_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, stage, result, error, created, updated = row
+            record = {
+                "application_id": application_id,
+                "status": status,
+                "stage": stage,
+                "result": json.loads(result) if result else None,
+                "error": error,
+                "created": created,
+                "updated": updated
+            }
+            if status == 'queued':
+                record["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM applications WHERE status = 'queued' AND created <= ?", (created,)
+                ).fetchone()[0]
+        return record
+
+    def _set(self, application_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE applications SET {columns} WHERE id = ?",
+                               (*fields.values(), application_id))
+            self._conn.commit()
+
+    def _claim(self):
+        # Called with the lock held; moves the oldest queued job to processing.
+        # The conditional UPDATE makes the claim safe against other processes.
+        now = time.time()
+        self._conn.execute(
+            "UPDATE applications SET status = 'queued', stage = NULL, updated = ? "
+            "WHERE status = 'processing' AND updated < ?",
+            (now, now - self.stale_after)
+        )
+        self._conn.commit()
+        while True:
+            row = self._conn.execute(
+                "SELECT id, payload FROM applications WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self._conn.execute(
+                "UPDATE applications SET status = 'processing', updated = ? WHERE id = ? AND status = 'queued'",
+                (now, row[0])
+            ).rowcount
+            self._conn.commit()
+            if claimed:
+                return row[0], json.loads(row[1])
+
+    def _keep_alive(self, application_id, stop):
+        # Heartbeat: renew the job until the handler returns, so only jobs of dead workers go stale
+        while not stop.wait(self.stale_after / 3):
+            with self._lock:
+                self._conn.execute("UPDATE applications SET updated = ? WHERE id = ? AND status = 'processing'",
+                                   (time.time(), application_id))
+                self._conn.commit()
+
+    def _worker(self):
+        while True:
+            with self._wakeup:
+                job = None
+                while not self._stopping:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    self._wakeup.wait(timeout=1)
+                if job is None:
+                    return
+
+            application_id, payload = job
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._keep_alive, args=(application_id, stop),
+                                         name="intake-heartbeat", daemon=True)
+            heartbeat.start()
+            try:
+                result = self.handler(application_id, payload,
+                                      lambda stage: self._set(application_id, stage=stage))
+                self._set(application_id, status='completed', stage='done', result=json.dumps(result))
+            except Exception as e:
+                print(f"Error processing application {application_id}: {e}")
+                self._set(application_id, status='failed', error=str(e))
+            finally:
+                stop.set()
+                heartbeat.join()
@@ -0,0 +1,101 @@
+import os
+import re
+import json
+import threading
+
+import numpy as np
+
+from preprocessing import preprocess_text
+from similarity import encode_texts
+
+JOB_DESC_FOLDER = 'job descriptions'
+THRESHOLDS_FILE = 'thresholds.json'  # optional {"ai_engineer": 0.35, ...} next to the JDs
+DEFAULT_ROLE_THRESHOLD = 0.3
+
+
+class JobRoles:
+    """
+    Every open role's job description embedded once into a (roles x dim) matrix.
+
+    Attributes:
+        keys (list): Role identifiers (JD file name without extension)
+        titles (list): Human readable titles ("Job Title:" line, or derived from the key)
+        embeddings (np.ndarray): float32 matrix, one normalised row per role
+        thresholds (np.ndarray): Per-role acceptance thresholds
+    """
+
+    def __init__(self, keys, titles, embeddings, thresholds):
+        self.keys = keys
+        self.titles = titles
+        self.embeddings = embeddings
+        self.thresholds = thresholds
+
+    def __len__(self):
+        return len(self.keys)
+
+    def score(self, resume_embeddings):
+        """Score N resumes against every role with one matrix multiplication; returns (N, roles)."""
+        if len(resume_embeddings) == 0:
+            return np.zeros((0, len(self.keys)), dtype=np.float32)
+        return np.vstack(resume_embeddings).astype(np.float32, copy=False) @ self.embeddings.T
+
+    def best_fit(self, role_scores):
+        """
+        Pick the role a resume fits best.
+
+        Returns (role_index, score) for the highest scoring role whose threshold
+        is met, or (None, best_score) if the resume passes no role.
+        """
+        passing = role_scores >= self.thresholds
+        if not passing.any():
+            return None, float(role_scores.max())
+        best = int(np.argmax(np.where(passing, role_scores, -np.inf)))
+        return best, float(role_scores[best])
+
+
+def _role_title(key, text):
+    match = re.search(r"^\s*Job Title:\s*(.+)$", text, flags=re.MULTILINE | re.IGNORECASE)
+    if match:
+        return match.group(1).strip()
+    return key.replace('_', ' ').title()
+
+
+def load_job_roles(folder=JOB_DESC_FOLDER, default_threshold=DEFAULT_ROLE_THRESHOLD):
+    """Load every .txt job description in `folder` and embed them in one batch."""
+    thresholds = {}
+    thresholds_path = os.path.join(folder, THRESHOLDS_FILE)
+    if os.path.exists(thresholds_path):
+        with open(thresholds_path, 'r', encoding='utf-8') as f:
+            thresholds = json.load(f)
+
+    keys, titles, texts = [], [], []
+    for file in sorted(os.listdir(folder)):
+        if not file.lower().endswith('.txt'):
+            continue
+        with open(os.path.join(folder, file), 'r', encoding='utf-8') as f:
+            text = f.read()
+        key = os.path.splitext(file)[0]
+        keys.append(key)
+        titles.append(_role_title(key, text))
+        texts.append(preprocess_text(text))
+
+    if not keys:
+        raise FileNotFoundError(f"No job descriptions (*.txt) found in {folder}")
+
+    embeddings = encode_texts(texts)
+    role_thresholds = np.array([float(thresholds.get(key, default_threshold)) for key in keys], dtype=np.float32)
+    return JobRoles(keys, titles, embeddings, role_thresholds)
+
+
+_roles = {}
+_roles_lock = threading.Lock()
+
+
+def get_job_roles(folder=JOB_DESC_FOLDER, default_threshold=DEFAULT_ROLE_THRESHOLD):
+    """Process-wide JobRoles for `folder`, loaded (and embedded) on first use."""
+    key = (folder, default_threshold)
+    if key not in _roles:
+        with _roles_lock:
+            if key not in _roles:
+                _roles[key] = load_job_roles(folder, default_threshold)
+    return _roles[key]
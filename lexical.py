@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+
+from preprocessing import preprocess_text
+
+# Share of the final score that comes from BM25 (0 = semantic only, the original behaviour)
+LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0"))
+# Resumes whose normalised BM25 score is below this are rejected without running the model
+LEXICAL_PRUNE_BELOW = float(os.getenv("LEXICAL_PRUNE_BELOW", "0"))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join('cache', 'lexical_index.sqlite'))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# "Must have: Python; PyTorch or TensorFlow" -> every ';'/','-separated group needs one of its 'or'/'|' options
+_MUST_HAVE_LINE = re.compile(r"^\s*(?:must[- ]haves?|required skills)(?: skills)?\s*:\s*(.+)$",
+                             flags=re.IGNORECASE | re.MULTILINE)
+
+
+def parse_must_have(text):
+    """
+    Hard requirements declared in a job description's "Must have:" lines.
+
+    Returns a list of groups; each group is a tuple of alternative skills in
+    preprocessed form, e.g. [("python",), ("pytorch", "tensorflow")]. A job
+    description without such a line has no must-haves, whatever its wording.
+    """
+    if not text:
+        return []
+    return _groups(_MUST_HAVE_LINE.findall(text))
+
+
+def parse_skill_list(text):
+    """
+    Must-haves given explicitly (--must-have, "mustHave", MUST_HAVE_SKILLS).
+
+    Takes a bare "python; pytorch or tensorflow" or "Must have:" lines; same
+    result format as parse_must_have. Only for values meant as a skill list,
+    never for a job description.
+    """
+    if not text:
+        return []
+    return _groups(_MUST_HAVE_LINE.findall(text) or text.splitlines())
+
+
+def _groups(lines):
+    groups = []
+    for line in lines:
+        for group in re.split(r"[;,]", line):
+            options = tuple(option for option in (preprocess_text(part) for part in re.split(r"\bor\b|\|", group))
+                            if option)
+            if options:
+                groups.append(options)
+    return groups
+
+
+def _missing(groups, has_word):
+    # An option ("machine learning") is met when the resume has all of its words
+    return [" or ".join(group) for group in groups
+            if not any(all(has_word(word) for word in option.split()) for option in group)]
+
+
+def missing_must_have(cleaned_text, groups):
+    """Groups (as display strings) a preprocessed resume does not satisfy."""
+    words = set(cleaned_text.split())
+    return _missing(groups, words.__contains__)
+
+
+def blend(semantic, lexical, weight=LEXICAL_WEIGHT):
+    """Weighted hybrid of semantic (cosine) and normalised lexical scores."""
+    return (1 - weight) * np.asarray(semantic, dtype=np.float32) + weight * np.asarray(lexical, dtype=np.float32)
+
+
+class LexicalIndex:
+    """
+    Inverted index of preprocessed resume tokens with BM25 scoring.
+
+    Postings map each term to {doc_id: term frequency}, so a query only
+    touches the documents that share a term with it. Scores are divided by the
+    highest score BM25 can give for the query's terms (those found anywhere in
+    the pool), so they fall in 0..1 and can be blended with cosine scores and
+    compared against fixed thresholds. With `path`, documents
+    are persisted in SQLite and the index is rebuilt from it on start.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._lengths = {}
+        self._terms = {}  # doc_id -> its distinct terms, so removal only touches its own postings
+        self._total_length = 0
+        self._conn = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, terms TEXT NOT NULL)")
+            self._conn.commit()
+            for doc_id, terms in self._conn.execute("SELECT doc_id, terms FROM docs"):
+                self._insert(doc_id, json.loads(terms))
+
+    @classmethod
+    def from_texts(cls, doc_ids, cleaned_texts):
+        """In-memory index over a pool of preprocessed texts."""
+        index = cls()
+        for doc_id, text in zip(doc_ids, cleaned_texts):
+            index._insert(str(doc_id), Counter(text.split()))
+        return index
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self._lengths
+
+    def add(self, doc_id, cleaned_text):
+        """Index (or re-index) one preprocessed document."""
+        doc_id, terms = str(doc_id), Counter(cleaned_text.split())
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, terms)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO docs (doc_id, terms) VALUES (?, ?)",
+                                   (doc_id, json.dumps(terms)))
+                self._conn.commit()
+
+    def remove(self, doc_id):
+        doc_id = str(doc_id)
+        with self._lock:
+            self._remove(doc_id)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                self._conn.commit()
+
+    def _insert(self, doc_id, terms):
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        length = sum(terms.values())
+        self._lengths[doc_id] = length
+        self._terms[doc_id] = tuple(terms)
+        self._total_length += length
+
+    def _remove(self, doc_id):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def missing_must_have(self, doc_id, groups):
+        """Like missing_must_have(), for an indexed document (unknown documents miss everything)."""
+        doc_id = str(doc_id)
+        with self._lock:
+            return _missing(groups, lambda word: doc_id in self._postings.get(word, ()))
+
+    def idf(self, term):
+        n = len(self._lengths)
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query_text, doc_ids):
+        """
+        Normalised BM25 scores of `doc_ids` for a preprocessed query (e.g. the JD).
+
+        Returns a float32 array aligned with `doc_ids`; unknown documents score 0.
+        """
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        scores = np.zeros(len(doc_ids), dtype=np.float32)
+        with self._lock:
+            if not self._lengths:
+                return scores
+            position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            average_length = self._total_length / len(self._lengths) or 1.0
+            ideal = 0.0
+            for term in set(query_text.split()):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue  # a term no resume has cannot tell resumes apart
+                idf = self.idf(term)
+                ideal += idf * (BM25_K1 + 1)  # what this term adds at most, however often it occurs
+                for doc_id, tf in postings.items():
+                    i = position.get(doc_id)
+                    if i is None:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / average_length)
+                    scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        if ideal > 0:
+            scores /= ideal
+        return scores
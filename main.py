@@ -1,8 +1,15 @@
 import os
-from email_handler import send_email
-from extract_text import extract_text_from_pdf, extract_text_from_docx
+import argparse
+from bulk_mailer import BulkMailer
+from extraction_pool import extract_many
 from preprocessing import preprocess_text
-from similarity import similarity_score
+from similarity import encode_texts, score_embeddings, score_chunked, BATCH_SIZE
+from job_roles import load_job_roles, JOB_DESC_FOLDER
+from lexical import LexicalIndex, parse_must_have, parse_skill_list, missing_must_have, blend, LEXICAL_WEIGHT, LEXICAL_PRUNE_BELOW
+from stream_screening import run_stream
+from reranker import get_reranker, select_for_rerank, RERANK_TOP_K, RERANK_MODE, RERANK_MODES, RERANK_BAND, \
+    RERANK_THRESHOLD
+from dedup import file_hash, normalize_email
 from dotenv import load_dotenv
 import re
 import pandas as pd
@@ -12,6 +19,10 @@ EMAIL_PASS = os.getenv("PASSWORD")
 
 Threshold = 0.3
 
+# "full" embeds the whole resume (truncated by the model after ~256 word pieces);
+# "max", "mean" or "topk" score overlapping chunks so long CVs are read to the end
+Chunk_Aggregate = os.getenv("CHUNK_AGGREGATE", "full")
+
 PASS_SUBJECT = "Interview Invitation for AI Engineer Role"
 PASS_BODY = """
 Dear Candidate,
@@ -38,50 +49,301 @@ Best regards,
 HR Team
 """
 
-all_candidates = []
+# Used by --all-roles, where each candidate is matched against every open role
+ROLE_PASS_SUBJECT = "Interview Invitation for {role} Role"
+ROLE_REJECT_SUBJECT = "Application Update"
+ROLE_REJECT_BODY = """
+Dear Candidate,
+
+Thank you for applying.
+
+After reviewing your resume, we regret to inform you that we will not be moving forward with your application for any of our open roles at this time.
+
+We appreciate your interest and encourage you to apply for future openings.
+
+Best regards,
+HR Team
+"""
 
 JobDesc_path = 'C:\\Users\\ziyad\\HR-AI-Applicants-Filter-Agent\\job descriptions\\ai_engineer.txt'
-with open(JobDesc_path, 'r', encoding='utf-8') as file:
-    job_text = file.read()
 
 resumeFolder = 'resumes/'
 
-for file in os.listdir(resumeFolder):
-    file_path = os.path.join(resumeFolder, file)
-    if file.lower().endswith('.pdf'):
-        resume_text = extract_text_from_pdf(file_path)
-    elif file.lower().endswith('.docx'):
-        resume_text = extract_text_from_docx(file_path)
+
+def iter_resume_batches(file_paths, batch_size=BATCH_SIZE):
+    """
+    Yield lists of (email, file, preprocessed_text) for resumes that contain an email address.
+
+    Extraction runs in a process pool and streams finished documents here, so
+    each batch can be embedded while the rest are still being extracted.
+    """
+    pending = []
+    for file_path, resume_text in extract_many(file_paths):
+        match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", resume_text)
+        if match:
+            pending.append((match.group(0), os.path.basename(file_path), preprocess_text(resume_text)))
+        if len(pending) >= batch_size:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+
+def score_resumes(job_embedding, file_paths, batch_size=BATCH_SIZE):
+    """Yield (email, file, score) for every resume that contains an email address."""
+    for pending in iter_resume_batches(file_paths, batch_size):
+        yield from _score_batch(job_embedding, pending)
+
+
+def _score_batch(job_embedding, pending):
+    texts = [text for _, _, text in pending]
+    if Chunk_Aggregate == "full":
+        scores = score_embeddings(job_embedding, encode_texts(texts))
     else:
-        print(f"Unsupported file format: {file}")
-        continue
-    
-    preprocessed_job_text = preprocess_text(job_text)
-    preprocessed_resume_text = preprocess_text(resume_text)
-    
-    score = similarity_score(preprocessed_job_text, preprocessed_resume_text)
-    match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", resume_text)
-    if match:
-        candidate_email = match.group(0)
-        all_candidates.append((candidate_email, file, score))
-
-print(f"Sending emails to {len(all_candidates)} candidates...")
-for candidate_email, file, score in all_candidates:
-    if score >= Threshold:
-        send_email(EMAIL_USER, EMAIL_PASS, candidate_email, PASS_SUBJECT, PASS_BODY)
-        print(f"Passed: Email sent to {candidate_email} ({file}) with similarity {score:.2f}")
+        matches = score_chunked(job_embedding, texts, aggregate=Chunk_Aggregate)
+        for (_, file, _), match in zip(pending, matches):
+            print(f"{file}: best match in chunk {match.best_chunk + 1}/{match.chunk_count}")
+        scores = [match.score for match in matches]
+    for (candidate_email, file, _), score in zip(pending, scores):
+        yield candidate_email, file, float(score)
+
+
+def score_resumes_hybrid(job_text, job_embedding, file_paths, must_have=(), lexical_weight=LEXICAL_WEIGHT,
+                         prune_below=LEXICAL_PRUNE_BELOW, batch_size=BATCH_SIZE):
+    """
+    Yield (email, file, score, lexical_score, missing_skills, pruned) for every resume with an email address.
+
+    The whole pool is indexed first so BM25 statistics are known; resumes that
+    miss a must-have skill or score below `prune_below` lexically are rejected
+    without running the model. The rest are embedded in batches and their
+    final score blends the semantic and lexical scores by `lexical_weight`.
+    """
+    pool = [candidate for batch in iter_resume_batches(file_paths, batch_size) for candidate in batch]
+    texts = [text for _, _, text in pool]
+    lexical_scores = LexicalIndex.from_texts(range(len(pool)), texts).score(preprocess_text(job_text), range(len(pool)))
+    missing = [missing_must_have(text, must_have) for text in texts]
+    keep = [i for i in range(len(pool)) if not missing[i] and lexical_scores[i] >= prune_below]
+    print(f"Lexical stage: {len(pool) - len(keep)} of {len(pool)} resumes rejected before embedding")
+
+    semantic = [0.0] * len(pool)
+    for start in range(0, len(keep), batch_size):
+        rows = keep[start:start + batch_size]
+        for i, (_, _, score) in zip(rows, _score_batch(job_embedding, [pool[i] for i in rows])):
+            semantic[i] = score
+    scores = blend(semantic, lexical_scores, lexical_weight)
+
+    kept = set(keep)
+    for i, (candidate_email, file, _) in enumerate(pool):
+        yield candidate_email, file, float(scores[i]), float(lexical_scores[i]), missing[i], i not in kept
+
+
+def match_all_roles(roles, file_paths, batch_size=BATCH_SIZE):
+    """
+    Yield (email, file, role_scores, best_role, best_score) for every resume.
+
+    Each batch of resumes is embedded once and scored against every role with a
+    single (resumes x dim) @ (dim x roles) multiplication.
+    """
+    for pending in iter_resume_batches(file_paths, batch_size):
+        role_scores = roles.score(encode_texts([text for _, _, text in pending]))
+        for (candidate_email, file, _), scores in zip(pending, role_scores):
+            best_role, best_score = roles.best_fit(scores)
+            yield candidate_email, file, scores, best_role, best_score
+
+
+def rerank_candidates(job_text, candidates, eligible, top_k=RERANK_TOP_K, mode=RERANK_MODE, band=RERANK_BAND):
+    """
+    Decide the borderline (or best) candidates with the cross-encoder.
+
+    At most `top_k` of the (email, file, score, status, ...) rows are picked by
+    `select_for_rerank`; only their resumes are extracted again, and their
+    status comes from the re-ranker's score instead of the embedding score.
+    Returns the rows with a re-rank score appended (None when not re-ranked).
+    """
+    selected = select_for_rerank([c[2] for c in candidates], Threshold, top_k, mode, band, eligible)
+    if not selected:
+        return [(*candidate, None) for candidate in candidates]
+    rows = {os.path.join(resumeFolder, candidates[i][1]): i for i in selected}
+    texts = dict(extract_many(list(rows)))
+    paths = [path for path in rows if texts.get(path)]
+    scores = get_reranker().score(job_text, [texts[path] for path in paths])
+    print(f"Re-rank stage: {len(paths)} of {len(candidates)} resumes scored by the cross-encoder")
+
+    reranked = {rows[path]: float(score) for path, score in zip(paths, scores)}
+    results = []
+    for i, (candidate_email, file, score, status, *rest) in enumerate(candidates):
+        if i in reranked:
+            status = "Passed" if reranked[i] >= RERANK_THRESHOLD else "Rejected"
+        results.append((candidate_email, file, score, status, *rest, reranked.get(i)))
+    return results
+
+
+def list_resumes():
+    file_paths = []
+    seen = {}
+    for file in sorted(os.listdir(resumeFolder)):
+        if file.lower().endswith(('.pdf', '.docx')):
+            file_path = os.path.join(resumeFolder, file)
+            # Byte-identical copies are screened once
+            digest = file_hash(file_path)
+            if digest in seen:
+                print(f"Skipping {file}: same file as {seen[digest]}")
+                continue
+            seen[digest] = file
+            file_paths.append(file_path)
+        else:
+            print(f"Unsupported file format: {file}")
+    return file_paths
+
+
+def one_per_applicant(candidates, score_index=2):
+    """Keep each applicant's best-scoring CV (by normalised email), so nobody gets two emails."""
+    best = {}
+    for candidate in candidates:
+        address = normalize_email(candidate[0]) or candidate[0]
+        if address not in best or candidate[score_index] > best[address][score_index]:
+            best[address] = candidate
+    return sorted(best.values(), key=lambda c: c[1])
+
+
+def main_all_roles(jobs_folder):
+    roles = load_job_roles(jobs_folder, default_threshold=Threshold)
+    print(f"Matching resumes against {len(roles)} roles: {', '.join(roles.titles)}")
+
+    # Completion order depends on worker timing; sort so the report is stable
+    all_candidates = sorted(match_all_roles(roles, list_resumes()), key=lambda c: c[1])
+
+    recipients = one_per_applicant(all_candidates, score_index=4)
+    print(f"Sending emails to {len(recipients)} candidates...")
+    messages = []
+    for candidate_email, file, _, best_role, _ in recipients:
+        if best_role is not None:
+            messages.append((candidate_email, ROLE_PASS_SUBJECT.format(role=roles.titles[best_role]), PASS_BODY))
+        else:
+            messages.append((candidate_email, ROLE_REJECT_SUBJECT, ROLE_REJECT_BODY))
+
+    results = BulkMailer(EMAIL_USER, EMAIL_PASS).send_all(messages)
+    for (candidate_email, file, _, best_role, best_score), result in zip(recipients, results):
+        outcome = f"Passed for {roles.titles[best_role]}" if best_role is not None else "Rejected"
+        if result.success:
+            print(f"{outcome}: Email sent to {candidate_email} ({file}) with similarity {best_score:.2f}")
+        else:
+            print(f"{outcome}: Failed to email {candidate_email} ({file}) after {result.attempts} attempts: {result.error}")
+
+    # One score column per role, plus the best-fit assignment
+    report = []
+    for candidate_email, file, scores, best_role, best_score in all_candidates:
+        best_key = roles.keys[best_role] if best_role is not None else ""
+        status = "Passed" if best_role is not None else "Rejected"
+        report.append((candidate_email, file, *[float(score) for score in scores], best_key, best_score, status))
+
+    df = pd.DataFrame(report, columns=["Email", "Resume", *roles.keys, "BestRole", "BestScore", "Status"])
+    df.to_csv("candidates_report.csv", index=False)
+    print("Pipeline finished. CSV report saved.")
+
+
+def main_watch(interval, once=False):
+    with open(JobDesc_path, 'r', encoding='utf-8') as file:
+        job_text = file.read()
+    job_embedding = encode_texts([preprocess_text(job_text)])[0]
+
+    templates = {
+        "Passed": (PASS_SUBJECT, PASS_BODY),
+        "Rejected": (REJECT_SUBJECT, REJECT_BODY),
+    }
+    print(f"Watching {resumeFolder} for new resumes (Ctrl+C to stop)..." if not once
+          else f"Screening new resumes in {resumeFolder}...")
+    finished = run_stream(resumeFolder, job_embedding, Threshold, BulkMailer(EMAIL_USER, EMAIL_PASS),
+                          templates, "candidates_report.csv", interval=interval, once=once)
+    print(f"Pipeline finished. {finished} candidates appended to the CSV report.")
+
+
+def main(must_have=None, lexical_weight=LEXICAL_WEIGHT, prune_below=LEXICAL_PRUNE_BELOW,
+         rerank_top_k=RERANK_TOP_K, rerank_mode=RERANK_MODE, rerank_band=RERANK_BAND):
+    with open(JobDesc_path, 'r', encoding='utf-8') as file:
+        job_text = file.read()
+
+    # Preprocess and embed the job description once
+    job_embedding = encode_texts([preprocess_text(job_text)])[0]
+
+    # Hard requirements from --must-have, or from "Must have:" lines in the JD
+    must_have_groups = parse_skill_list(must_have) if must_have else parse_must_have(job_text)
+    columns = ["Email", "Resume", "Score", "Status"]
+    if must_have_groups or lexical_weight > 0 or prune_below > 0:
+        all_candidates = []
+        eligible = []
+        for candidate_email, file, score, lexical_score, missing, pruned in score_resumes_hybrid(
+                job_text, job_embedding, list_resumes(), must_have_groups, lexical_weight, prune_below):
+            status = "Passed" if score >= Threshold and not pruned else "Rejected"
+            all_candidates.append((candidate_email, file, score, status, lexical_score, "; ".join(missing)))
+            eligible.append(not pruned)
+        columns += ["LexicalScore", "MissingSkills"]
+    else:
+        all_candidates = [(candidate_email, file, score, "Passed" if score >= Threshold else "Rejected")
+                          for candidate_email, file, score in score_resumes(job_embedding, list_resumes())]
+        eligible = None
+
+    # Second stage: a cross-encoder re-scores at most rerank_top_k candidates
+    if rerank_top_k > 0:
+        all_candidates = rerank_candidates(job_text, all_candidates, eligible, rerank_top_k, rerank_mode, rerank_band)
+        columns += ["RerankScore"]
+
+    # Completion order depends on worker timing; sort so the report is stable
+    all_candidates.sort(key=lambda c: c[1])
+
+    recipients = one_per_applicant(all_candidates)
+    print(f"Sending emails to {len(recipients)} candidates...")
+    messages = []
+    for candidate_email, file, score, status, *_ in recipients:
+        if status == "Passed":
+            messages.append((candidate_email, PASS_SUBJECT, PASS_BODY))
+        else:
+            messages.append((candidate_email, REJECT_SUBJECT, REJECT_BODY))
+
+    results = BulkMailer(EMAIL_USER, EMAIL_PASS).send_all(messages)
+    for (candidate_email, file, score, outcome, *_), result in zip(recipients, results):
+        if result.success:
+            print(f"{outcome}: Email sent to {candidate_email} ({file}) with similarity {score:.2f}")
+        else:
+            print(f"{outcome}: Failed to email {candidate_email} ({file}) after {result.attempts} attempts: {result.error}")
+
+    # ------------------------
+    # Step 5: Save CSV report
+    # ------------------------
+    df = pd.DataFrame(all_candidates, columns=columns)
+    df.to_csv("candidates_report.csv", index=False)
+    print("Pipeline finished. CSV report saved.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Screen resumes against job descriptions")
+    parser.add_argument('--all-roles', action='store_true',
+                        help="match every resume against every job description in --jobs-folder")
+    parser.add_argument('--jobs-folder', default=JOB_DESC_FOLDER,
+                        help="folder of .txt job descriptions (optional thresholds.json)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep watching the resume folder and screen new files as they arrive")
+    parser.add_argument('--once', action='store_true',
+                        help="like --watch, but screen only files not yet in the manifest and exit")
+    parser.add_argument('--interval', type=float, default=5.0, help="seconds between folder scans in --watch mode")
+    parser.add_argument('--must-have', help='hard requirements, e.g. "python; pytorch or tensorflow" '
+                                             '(default: "Must have:" lines in the job description)')
+    parser.add_argument('--lexical-weight', type=float, default=LEXICAL_WEIGHT,
+                        help="share of the score taken from BM25 keyword matching (0 = semantic only)")
+    parser.add_argument('--prune-below', type=float, default=LEXICAL_PRUNE_BELOW,
+                        help="reject resumes under this BM25 score without running the model")
+    parser.add_argument('--rerank-top-k', type=int, default=RERANK_TOP_K,
+                        help="re-score at most this many candidates with a cross-encoder (0 = off)")
+    parser.add_argument('--rerank-mode', choices=RERANK_MODES, default=RERANK_MODE,
+                        help="band: the candidates closest to the threshold; top: the best-scoring ones")
+    parser.add_argument('--rerank-band', type=float, default=RERANK_BAND,
+                        help="band mode: only re-score candidates within this distance of the threshold")
+    args = parser.parse_args()
+
+    if args.watch or args.once:
+        main_watch(args.interval, once=args.once)
+    elif args.all_roles:
+        main_all_roles(args.jobs_folder)
     else:
-        send_email(EMAIL_USER, EMAIL_PASS, candidate_email, REJECT_SUBJECT, REJECT_BODY)
-        print(f"Rejected: Email sent to {candidate_email} ({file}) with similarity {score:.2f}")
-
-# ------------------------
-# Step 5: Save CSV report
-# ------------------------
-report = []
-for candidate_email, file, score in all_candidates:
-    status = "Passed" if score >= Threshold else "Rejected"
-    report.append((candidate_email, file, score, status))
-
-df = pd.DataFrame(report, columns=["Email", "Resume", "Score", "Status"])
-df.to_csv("candidates_report.csv", index=False)
-print("Pipeline finished. CSV report saved.")
\ No newline at end of file
+        main(must_have=args.must_have, lexical_weight=args.lexical_weight, prune_below=args.prune_below,
+             rerank_top_k=args.rerank_top_k, rerank_mode=args.rerank_mode, rerank_band=args.rerank_band)
@@ -0,0 +1,266 @@
+import os
+import time
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds; OCR of a long scan can take minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Requests (and queued jobs) slower than this print a per-stage breakdown
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+# Fraction of requests run under cProfile; slow profiled requests are dumped to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join('cache', 'profiles'))
+
+STAGE_METRIC = "hr_stage_duration_seconds"
+STAGE_ERRORS = "hr_stage_errors_total"
+REQUEST_METRIC = "hr_http_request_duration_seconds"
+
+
+class Registry:
+    """Thread-safe latency histograms and counters, rendered in Prometheus text format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._counters = {}    # (name, labels) -> value
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {count}")
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {series[-1]}')
+                lines.append(f"{name}_sum{_labels(labels)} {_number(series[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+registry = Registry()
+registry.describe(STAGE_METRIC, "Time spent in each screening stage")
+registry.describe(STAGE_ERRORS, "Screening stages that raised an exception")
+registry.describe(REQUEST_METRIC, "HTTP request latency")
+registry.describe("hr_encoded_texts_total", "Texts embedded by the model")
+registry.describe("hr_emails_total", "Emails sent or failed")
+
+_local = threading.local()
+
+
+def _record(stage, seconds, labels):
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.append((stage, seconds, labels))
+        return
+    registry.observe(STAGE_METRIC, seconds, stage=stage, **labels)
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.spans.append((stage, seconds, labels))
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Time a block as one `stage` observation.
+
+    Yields the label dict, so labels only known at the end (e.g. whether
+    extraction fell back to OCR) can be filled in inside the block.
+    """
+    start = time.perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        registry.inc(STAGE_ERRORS, stage=stage)
+        raise
+    finally:
+        _record(stage, time.perf_counter() - start, labels)
+
+
+@contextmanager
+def collect_spans():
+    """
+    Capture spans recorded in this thread instead of observing them.
+
+    Used in extraction worker processes, whose registry is never scraped:
+    the spans are returned to the parent, which replays them with record_spans().
+    """
+    previous = getattr(_local, 'collector', None)
+    _local.collector = []
+    try:
+        yield _local.collector
+    finally:
+        _local.collector = previous
+
+
+def record_spans(spans):
+    """Observe spans captured by collect_spans() (possibly in another process)."""
+    for stage, seconds, labels in spans:
+        _record(stage, seconds, labels)
+
+
+class Trace:
+    """
+    Per-request (or per-job) record of the spans it ran.
+
+    If the whole request takes longer than SLOW_REQUEST_SECONDS the stage
+    breakdown is printed, so it is clear whether OCR, inference or email
+    dominated. A sampled share of traces (PROFILE_SAMPLE_RATE) also runs
+    under cProfile and slow ones are written to PROFILE_DIR as .prof files
+    for pstats/snakeviz. The thread is renamed after the trace while it
+    runs, which makes `py-spy dump --pid <pid>` show what each thread serves.
+    """
+
+    _profile_lock = threading.Lock()  # cProfile can only be active for one thread at a time
+
+    def __init__(self, name, profile=None):
+        self.name = name
+        self.spans = []
+        self.seconds = None
+        self._profile = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE if profile is None else profile
+        self._profiler = None
+
+    def start(self):
+        self._previous = getattr(_local, 'trace', None)
+        _local.trace = self
+        thread = threading.current_thread()
+        self._thread_name = thread.name
+        thread.name = f"{self._thread_name} [{self.name}]"
+        if self._profile and Trace._profile_lock.acquire(blocking=False):
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:  # another profiler (e.g. a debugger) is active
+                self._profiler = None
+                Trace._profile_lock.release()
+        self._start = time.perf_counter()
+        return self
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+            Trace._profile_lock.release()
+        threading.current_thread().name = self._thread_name
+        _local.trace = self._previous
+
+        if SLOW_REQUEST_SECONDS and self.seconds >= SLOW_REQUEST_SECONDS:
+            print(f"Slow {self.name}: {self.seconds:.2f}s ({self.breakdown()})")
+            if self._profiler is not None:
+                self._dump_profile()
+        return self.seconds
+
+    def breakdown(self):
+        totals = {}
+        for stage, seconds, labels in self.spans:
+            key = stage + ("+ocr" if labels.get("ocr") == "true" else "")
+            totals[key] = totals.get(key, 0.0) + seconds
+        parts = [f"{stage}={seconds:.2f}s" for stage, seconds in sorted(totals.items(), key=lambda item: -item[1])]
+        return ", ".join(parts) or "no instrumented stages"
+
+    def _dump_profile(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() else "_" for c in self.name).strip("_")
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{safe_name}_{self.seconds:.1f}s.prof")
+        self._profiler.dump_stats(path)
+        print(f"Profile saved to {path}")
+
+
+@contextmanager
+def traced(name, profile=None):
+    """Run a block as a Trace (used for queued jobs, which have no request)."""
+    trace = Trace(name, profile).start()
+    try:
+        yield trace
+    finally:
+        trace.finish()
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    return registry.render()
+
+
+def instrument_app(app):
+    """
+    Record latency for every Flask request and trace it.
+
+    Adds a `/api/metrics` endpoint in Prometheus text format.
+    """
+    from flask import g, request, Response
+
+    @app.before_request
+    def _start_trace():
+        g.metrics_trace = Trace(f"{request.method} {request.path}").start()
+
+    @app.after_request
+    def _observe_request(response):
+        trace = g.pop('metrics_trace', None)
+        if trace is not None:
+            seconds = trace.finish()
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            registry.observe(REQUEST_METRIC, seconds, method=request.method, endpoint=endpoint,
+                             status=str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _end_trace(error=None):
+        # after_request is skipped when a view raises; never leave the trace attached to the thread
+        trace = g.pop('metrics_trace', None)
+        if trace is not None:
+            trace.finish()
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -1,24 +1,122 @@
+import os
 import re
-import nltk
-from nltk.corpus import stopwords
+import threading
+from itertools import filterfalse
 
-nltk.download('stopwords')
-stop_words = set(stopwords.words('english'))
+from startup import is_offline
+from metrics import span
 
-def preprocess_text(text):
-    # Convert to lowercase
+# Keep letters of every script (names like "José", "Müller") instead of ASCII only
+UNICODE_TEXT = os.getenv("PREPROCESS_UNICODE", "0") == "1"
+
+# Bump whenever preprocess_text output changes so cached embeddings are invalidated
+PREPROCESS_VERSION = "1-unicode" if UNICODE_TEXT else 1
+
+# URLs are removed first; the check for "http"/"www" skips the scan for most documents
+_URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+')
+# ASCII mode deletes every ASCII byte that is not a lowercase letter or whitespace with
+# bytes.translate. Non-ASCII characters are dropped beforehand, except whitespace,
+# which becomes a space so word boundaries match the original regex.
+_ASCII_DELETE = bytes(b for b in range(128) if not (chr(b).islower() or chr(b).isspace()))
+_NON_ASCII_CHAR = re.compile(r'[^\x00-\x7f\s]')
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+# Unicode mode: drop anything that is not a letter (punctuation, digits, underscore)
+_UNICODE_JUNK = re.compile(r'[^\w\s]|[\d_]')
+
+# NLTK's English stopword list, used when the corpus is not installed and we are offline
+FALLBACK_STOP_WORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself
+yourselves he him his himself she she's her hers herself it it's its itself they them their
+theirs themselves what which who whom this that that'll these those am is are was were be
+been being have has had having do does did doing a an the and but if or because as until
+while of at by for with about against between into through during before after above below
+to from up down in out on off over under again further then once here there when where why
+how all any both each few more most other some such no nor not only own same so than too
+very s t can will just don don't should should've now d ll m o re ve y ain aren aren't
+couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't
+ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't
+weren weren't won won't wouldn wouldn't
+""".split())
+
+_stop_words = None
+_stop_words_lock = threading.Lock()
+
+
+def get_stop_words():
+    """
+    Return the English stopword set, loading it once per process.
+
+    The NLTK corpus is only downloaded if it is missing, and never when
+    HR_OFFLINE is set; in that case the bundled list is used instead.
+    """
+    global _stop_words
+    if _stop_words is None:
+        with _stop_words_lock:
+            if _stop_words is None:
+                _stop_words = _load_stop_words()
+    return _stop_words
+
+
+def _load_stop_words():
+    try:
+        from nltk.corpus import stopwords
+        try:
+            return frozenset(stopwords.words('english'))
+        except LookupError:
+            if is_offline():
+                print("NLTK stopwords not installed; using bundled list (offline mode)")
+                return FALLBACK_STOP_WORDS
+            import nltk
+            nltk.download('stopwords', quiet=True)
+            return frozenset(stopwords.words('english'))
+    except Exception as e:
+        print(f"Could not load NLTK stopwords ({type(e).__name__}); using bundled list")
+        return FALLBACK_STOP_WORDS
+
+
+def __getattr__(name):
+    # Backwards compatibility for `from preprocessing import stop_words`
+    if name == 'stop_words':
+        return get_stop_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _letters_only(text, unicode):
+    # Lowercase, then remove URLs, punctuation and special characters
     text = text.lower()
-    
-    # Remove URLs
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-    
-    # Remove punctuation and special characters
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    
-    # Tokenize the text
-    words = text.split()
-    
-    # Remove stop words
-    filtered_words = [word for word in words if word not in stop_words]
-    
-    return ' '.join(filtered_words)
\ No newline at end of file
+    if 'http' in text or 'www' in text:
+        text = _URL_PATTERN.sub('', text)
+    if unicode:
+        return _UNICODE_JUNK.sub('', text)
+    if not text.isascii():
+        text = _NON_ASCII_CHAR.sub('', text)
+        if not text.isascii():
+            text = _NON_ASCII.sub(' ', text)
+    return text.encode('ascii').translate(None, _ASCII_DELETE).decode('ascii')
+
+
+def preprocess_text(text, unicode=None):
+    """
+    Lowercase, strip URLs and non-letters, and drop English stopwords.
+
+    Args:
+        text (str): Raw document text
+        unicode (bool): Keep non-ASCII letters; defaults to PREPROCESS_UNICODE
+    """
+    if unicode is None:
+        unicode = UNICODE_TEXT
+    is_stop_word = get_stop_words().__contains__  # first call loads the list; not part of the span
+    with span("preprocess"):
+        words = _letters_only(text, unicode).split()
+
+        # Remove stop words (frozenset lookup done in C)
+        return ' '.join(filterfalse(is_stop_word, words))
+
+
+def preprocess_texts(texts, unicode=None):
+    """Batch version of preprocess_text; returns a list aligned with `texts`."""
+    if unicode is None:
+        unicode = UNICODE_TEXT
+    is_stop_word = get_stop_words().__contains__
+    with span("preprocess_batch"):
+        return [' '.join(filterfalse(is_stop_word, _letters_only(text, unicode).split())) for text in texts]
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from metrics import span, registry
+
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "64"))
+QDRANT_FLUSH_SECONDS = float(os.getenv("QDRANT_FLUSH_SECONDS", "2"))
+QDRANT_MAX_RETRIES = int(os.getenv("QDRANT_MAX_RETRIES", "3"))
+QDRANT_SPILL_PATH = os.getenv("QDRANT_SPILL_PATH", os.path.join('cache', 'qdrant_spill.sqlite'))
+SPILL_RETRY_SECONDS = float(os.getenv("QDRANT_SPILL_RETRY_SECONDS", "30"))
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "10"))
+
+registry.describe("hr_qdrant_points_total", "Candidate points written to Qdrant, spilled locally, or replayed")
+
+
+def connect(url=None, api_key=None):
+    """QdrantClient for `url`; ":memory:" gives a local in-process instance (tests, demos)."""
+    from qdrant_client import QdrantClient
+    if url == ":memory:":
+        return QdrantClient(":memory:")
+    return QdrantClient(url=url, api_key=api_key)
+
+
+def connect_async(url=None, api_key=None):
+    """AsyncQdrantClient for `url`, or None for ":memory:" (an async client would not share the sync one's data)."""
+    from qdrant_client import AsyncQdrantClient
+    if url == ":memory:":
+        return None
+    return AsyncQdrantClient(url=url, api_key=api_key)
+
+
+class QdrantWriter:
+    """
+    Write-behind buffer for candidate points.
+
+    `add` only queues the point; a background thread upserts queued points in
+    batches of up to `batch_size`, as soon as a batch is full or
+    `flush_interval` seconds after the oldest point was queued. A failed batch
+    is retried with exponential backoff, and if Qdrant stays unreachable the
+    points are spilled to a local SQLite file and replayed later (and on the
+    next start), so no application is lost. Upserts are idempotent by point ID,
+    so a replay never duplicates a candidate. The collection is created on the
+    first write if it does not exist yet.
+    """
+
+    def __init__(self, client, collection_name, batch_size=QDRANT_BATCH_SIZE, flush_interval=QDRANT_FLUSH_SECONDS,
+                 max_retries=QDRANT_MAX_RETRIES, spill_path=QDRANT_SPILL_PATH, backoff_base=0.5,
+                 spill_retry_interval=SPILL_RETRY_SECONDS):
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.spill_retry_interval = spill_retry_interval
+        self.written = 0
+        self.spilled = 0
+        self.spill_path = spill_path
+        self.last_error = None
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # one batch in flight at a time
+        self._thread = None
+        self._stopping = False
+        self._collection_ready = False
+        self._next_replay = 0
+
+        if os.path.dirname(spill_path):
+            os.makedirs(os.path.dirname(spill_path), exist_ok=True)
+        self._spill = sqlite3.connect(spill_path, check_same_thread=False, timeout=30)
+        self._spill.execute("PRAGMA journal_mode=WAL")
+        self._spill.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                id TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                point TEXT NOT NULL,
+                spilled REAL NOT NULL,
+                PRIMARY KEY (id, collection)
+            )
+        """)
+        self._spill.commit()
+        self._spill_lock = threading.Lock()
+
+    def start(self):
+        """Start the background flusher (spilled points from a previous run are replayed first)."""
+        self._thread = threading.Thread(target=self._run, name="qdrant-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Flush what is buffered and stop the flusher."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def add(self, point_id, vector, payload):
+        """Queue one point; returns immediately."""
+        from qdrant_client.http.models import PointStruct
+        point = PointStruct(id=point_id, vector=list(map(float, vector)), payload=payload)
+        with self._wakeup:
+            if not self._buffer:
+                # The flusher may be sleeping until the next spill replay; have it start the flush timer
+                self._oldest = time.monotonic()
+                self._wakeup.notify_all()
+            self._buffer.append(point)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify_all()
+
+    def pending_count(self):
+        """Points buffered in memory plus points waiting in the spill file."""
+        with self._lock:
+            buffered = len(self._buffer)
+        return buffered + self.spilled_count()
+
+    def spilled_count(self):
+        with self._spill_lock:
+            return self._spill.execute("SELECT COUNT(*) FROM points WHERE collection = ?",
+                                       (self.collection_name,)).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"buffered": buffered, "spilled": self.spilled_count(), "written": self.written,
+                "last_error": self.last_error}
+
+    def flush(self):
+        """Write everything buffered now, in batches; failed batches go to the spill file."""
+        while True:
+            with self._lock:
+                batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+                self._oldest = time.monotonic() if self._buffer else None
+            if not batch:
+                return
+            with self._flush_lock:
+                if self._upsert_with_retry(batch):
+                    registry.inc("hr_qdrant_points_total", len(batch), result="written")
+                else:
+                    self._spill_points(batch)
+
+    def replay_spilled(self):
+        """Try to write spilled points again; returns how many made it."""
+        replayed = 0
+        while True:
+            with self._spill_lock:
+                rows = self._spill.execute(
+                    "SELECT id, point FROM points WHERE collection = ? ORDER BY spilled LIMIT ?",
+                    (self.collection_name, self.batch_size)).fetchall()
+            if not rows:
+                break
+            from qdrant_client.http.models import PointStruct
+            points = [PointStruct(**json.loads(point)) for _, point in rows]
+            with self._flush_lock:
+                if not self._upsert(points):
+                    break
+            with self._spill_lock:
+                self._spill.executemany("DELETE FROM points WHERE id = ? AND collection = ?",
+                                        [(point_id, self.collection_name) for point_id, _ in rows])
+                self._spill.commit()
+            replayed += len(rows)
+            registry.inc("hr_qdrant_points_total", len(rows), result="replayed")
+        if replayed:
+            print(f"Replayed {replayed} spilled candidates into Qdrant")
+        return replayed
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._stopping:
+                    if len(self._buffer) >= self.batch_size:
+                        break
+                    if self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval:
+                        break
+                    if time.monotonic() >= self._next_replay:
+                        break
+                    self._wakeup.wait(self._wait_time())
+                if self._stopping:
+                    return
+            self.flush()
+            if time.monotonic() >= self._next_replay:
+                self._next_replay = time.monotonic() + self.spill_retry_interval
+                self.replay_spilled()
+
+    def _wait_time(self):
+        deadlines = [self._next_replay]
+        if self._oldest is not None:
+            deadlines.append(self._oldest + self.flush_interval)
+        return max(0.05, min(deadlines) - time.monotonic())
+
+    def _ensure_collection(self, dim):
+        if self._collection_ready:
+            return
+        if not self.client.collection_exists(self.collection_name):
+            from qdrant_client.http.models import VectorParams, Distance
+            self.client.create_collection(self.collection_name,
+                                          vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+            print(f"Created Qdrant collection {self.collection_name} ({dim} dimensions)")
+        self._collection_ready = True
+
+    def _upsert(self, points):
+        try:
+            with span("qdrant_upsert"):
+                self._ensure_collection(len(points[0].vector))
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+            self.written += len(points)
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    def _upsert_with_retry(self, points):
+        for attempt in range(self.max_retries + 1):
+            if self._upsert(points):
+                return True
+            if attempt < self.max_retries and not self._stopping:
+                time.sleep(self.backoff_base * 2 ** attempt)
+        print(f"Qdrant write failed after {self.max_retries + 1} attempts: {self.last_error}")
+        return False
+
+    def _spill_points(self, points):
+        now = time.time()
+        with self._spill_lock:
+            self._spill.executemany(
+                "INSERT OR REPLACE INTO points (id, collection, point, spilled) VALUES (?, ?, ?, ?)",
+                [(str(point.id), self.collection_name,
+                  json.dumps({"id": point.id, "vector": point.vector, "payload": point.payload}), now)
+                 for point in points])
+            self._spill.commit()
+        self.spilled += len(points)
+        registry.inc("hr_qdrant_points_total", len(points), result="spilled")
+        print(f"Spilled {len(points)} candidates to {self.spill_path}; they will be retried")
+
+
+class CachedProbe:
+    """
+    Run a health probe at most once every `ttl` seconds.
+
+    Concurrent callers share the cached result, so a busy load balancer does
+    not turn every health check into a round trip to the vector DB.
+    Returns (ok, value or error message, age of the result in seconds).
+    """
+
+    def __init__(self, probe, ttl=HEALTH_CACHE_SECONDS):
+        self.probe = probe
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked = 0.0
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._checked >= self.ttl:
+                try:
+                    self._result = (True, self.probe())
+                except Exception as e:
+                    self._result = (False, str(e))
+                self._checked = now
+            return self._result[0], self._result[1], round(now - self._checked, 3)
+
+
+class AsyncCachedProbe:
+    """CachedProbe for a coroutine probe (e.g. an AsyncQdrantClient call), for the asyncio server."""
+
+    def __init__(self, probe, ttl=HEALTH_CACHE_SECONDS):
+        self.probe = probe
+        self.ttl = ttl
+        self._lock = None
+        self._result = None
+        self._checked = 0.0
+
+    async def get(self):
+        import asyncio
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._checked >= self.ttl:
+                try:
+                    self._result = (True, await self.probe())
+                except Exception as e:
+                    self._result = (False, str(e))
+                self._checked = now
+            return self._result[0], self._result[1], round(now - self._checked, 3)
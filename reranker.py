@@ -0,0 +1,217 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from startup import is_offline
+from metrics import span, registry
+from encoder_backends import ENCODER_BACKEND
+from similarity import chunk_text, CHUNK_WORDS, CHUNK_OVERLAP
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Most candidates re-scored per screening run (0 = no re-ranking); bounds the cross-encoder's cost
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "0"))
+# "band": the k candidates closest to the threshold, within +/- RERANK_BAND of it;
+# "top": the k best by embedding score (re-rank the shortlist)
+RERANK_MODE = os.getenv("RERANK_MODE", "band")
+RERANK_BAND = float(os.getenv("RERANK_BAND", "0.1"))
+# Re-ranked candidates pass when the cross-encoder's relevance (0..1) reaches this
+RERANK_THRESHOLD = float(os.getenv("RERANK_THRESHOLD", "0.5"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_PATH = os.getenv("RERANK_CACHE_PATH", os.path.join('cache', 'rerank.sqlite'))
+
+RERANK_MODES = ('band', 'top')
+
+registry.describe("hr_rerank_pairs_total", "(job description, resume) pairs re-ranked, by cache result")
+
+
+class OverlapScorer:
+    """
+    Deterministic stand-in for CrossEncoder: share of job description words in the resume.
+
+    Used with ENCODER_BACKEND=hashing, so the re-ranking stage runs offline
+    without a model download. The scores mean nothing.
+    """
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        scores = []
+        for job_text, resume_text in pairs:
+            wanted, present = set(job_text.lower().split()), set(resume_text.lower().split())
+            scores.append(len(wanted & present) / len(wanted) if wanted else 0.0)
+        return np.asarray(scores, dtype=np.float32)
+
+
+def rerank_id(model_name=RERANK_MODEL, backend=ENCODER_BACKEND):
+    """
+    Identifier of the scores the re-ranker produces (used in cache keys).
+
+    Like encoder_backends.backend_id: the word-overlap stand-in and the
+    chunking settings get their own keys, so their scores are never served
+    as another scorer's.
+    """
+    scorer = "word-overlap" if backend == 'hashing' else model_name
+    return f"{scorer}:chunks-{CHUNK_WORDS}-{CHUNK_OVERLAP}"
+
+
+def load_cross_encoder(model_name=RERANK_MODEL):
+    """The cross-encoder, loaded from the local Hugging Face cache only with HR_OFFLINE=1."""
+    if ENCODER_BACKEND == 'hashing':
+        print("Loaded re-ranker stand-in (word overlap, ENCODER_BACKEND=hashing); scores are not meaningful")
+        return OverlapScorer()
+    if is_offline():
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    import torch
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(model_name, device='cpu', max_length=512)
+    # Relevance as a 0..1 probability, so RERANK_THRESHOLD does not depend on the model's logit scale
+    sigmoid = torch.nn.Sigmoid()
+
+    class _Scorer:
+        def predict(self, pairs, batch_size=32, show_progress_bar=False):
+            return model.predict(pairs, batch_size=batch_size, activation_fn=sigmoid, convert_to_numpy=True,
+                                 show_progress_bar=show_progress_bar)
+    print(f"Loaded re-ranker {model_name}")
+    return _Scorer()
+
+
+def select_for_rerank(scores, threshold, top_k=RERANK_TOP_K, mode=RERANK_MODE, band=RERANK_BAND, eligible=None):
+    """
+    Indices of the candidates worth a cross-encoder pass, at most `top_k` of them.
+
+    "band" picks the candidates whose embedding score is within `band` of the
+    threshold, closest first: the decisions the bi-encoder is least sure of.
+    "top" picks the `top_k` highest scores. `eligible` (a list of booleans)
+    leaves out candidates whose outcome is fixed anyway, e.g. a missing
+    must-have skill.
+    """
+    if mode not in RERANK_MODES:
+        raise ValueError(f"Unknown rerank mode: {mode}")
+    if top_k <= 0:
+        return []
+    scores = np.asarray(scores, dtype=np.float32)
+    candidates = [i for i in range(len(scores)) if eligible is None or eligible[i]]
+    if mode == 'band':
+        candidates = [i for i in candidates if abs(scores[i] - threshold) <= band]
+        candidates.sort(key=lambda i: abs(scores[i] - threshold))
+    else:
+        candidates.sort(key=lambda i: -scores[i])
+    return candidates[:top_k]
+
+
+class RerankCache:
+    """Re-ranker scores in SQLite, keyed by the scorer (rerank_id) and a hash of the (job description, resume) pair."""
+
+    def __init__(self, path=RERANK_CACHE_PATH, model_id=None):
+        self.model_id = model_id or rerank_id()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY,
+                score REAL NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def make_key(self, job_text, resume_text):
+        digest = hashlib.sha256()
+        digest.update(f"{self.model_id}\0".encode('utf-8'))
+        digest.update(hashlib.sha256(job_text.encode('utf-8')).digest())
+        digest.update(hashlib.sha256(resume_text.encode('utf-8')).digest())
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """{key: score} for the keys found."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(chunk))})",
+                                          chunk).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, items):
+        """Store (key, score) pairs."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO scores (key, score, created) VALUES (?, ?, ?)",
+                                   [(key, float(score), now) for key, score in items])
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+
+class Reranker:
+    """
+    Second ranking stage: a cross-encoder reading the job description and a resume together.
+
+    Far more precise than comparing two embeddings, and far slower, so it only
+    sees the few candidates `select_for_rerank` picks. The model reads at most
+    512 tokens, so a resume is split into the same overlapping chunks as
+    chunked embedding scoring and gets its best chunk's score. Scores are
+    cached per (job description, resume) pair, so re-running a screening or
+    re-filtering the pool only scores new pairs. The model is loaded on first use.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, cache=None, batch_size=RERANK_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else RerankCache(model_id=rerank_id(model_name))
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_cross_encoder(self.model_name)
+        return self._model
+
+    def score(self, job_text, resume_texts):
+        """Relevance (0..1) of every resume to the job description, as a float32 array."""
+        resume_texts = list(resume_texts)
+        keys = [self.cache.make_key(job_text, text) for text in resume_texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        registry.inc("hr_rerank_pairs_total", len(keys) - len(missing), result="cached")
+        if missing:
+            model = self.get_model()
+            # Every chunk of every uncached resume in one batched pass; a resume scores as its best chunk
+            chunked = [chunk_text(resume_texts[i]) for i in missing]
+            with span("rerank"):
+                chunk_scores = model.predict([(job_text, chunk) for chunks in chunked for chunk in chunks],
+                                             batch_size=self.batch_size, show_progress_bar=False)
+            registry.inc("hr_rerank_pairs_total", len(missing), result="scored")
+            fresh, offset = [], 0
+            for i, chunks in zip(missing, chunked):
+                fresh.append((keys[i], float(max(chunk_scores[offset:offset + len(chunks)]))))
+                offset += len(chunks)
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+        return np.asarray([cached[key] for key in keys], dtype=np.float32)
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """The process-wide Reranker."""
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
@@ -0,0 +1,361 @@
+import os
+import sys
+import csv
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+
+from dedup import file_hash
+
+SHARD_LEDGER_PATH = os.getenv("SHARD_LEDGER_PATH", os.path.join('cache', 'shards.sqlite'))
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "500"))
+# A worker renews its lease every third of this; a shard whose lease runs out is handed to another worker
+SHARD_LEASE_SECONDS = float(os.getenv("SHARD_LEASE_SECONDS", "300"))
+# A shard that has failed (or lost its worker) this many times is marked failed instead of retried
+SHARD_MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+REPORT_COLUMNS = ["Email", "Resume", "Score", "Status"]
+# Scores are rounded in the merged report: batch composition moves floats in the last bits
+REPORT_DECIMALS = 6
+
+
+class ShardLedger:
+    """
+    Shards of a batch screening job and their leases, in SQLite.
+
+    The coordinator splits the sorted resume list into fixed-size shards once
+    (`create`). Workers, on this or other machines, `claim` one pending shard
+    at a time: the claim is a lease that the worker keeps renewing while it
+    works. A worker that dies stops renewing, its lease expires and the shard
+    is claimed again by someone else. Results are written together with the
+    shard's completion, and only by the worker that still holds the lease, so
+    a late or duplicate worker never adds a second copy.
+
+    For several machines, put the ledger and the resumes on a shared
+    filesystem whose file locks SQLite can rely on (e.g. a local disk exported
+    by the coordinator, not an eventually consistent object store).
+    """
+
+    def __init__(self, path=SHARD_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit; claims and completions open their own IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY,
+                files TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                resume TEXT PRIMARY KEY,
+                shard_id INTEGER NOT NULL,
+                email TEXT,
+                score REAL NOT NULL,
+                status TEXT NOT NULL,
+                file_hash TEXT
+            )
+        """)
+
+    def create(self, folder, files, job_text, threshold, shard_size=SHARD_SIZE):
+        """Start a new job: replace any previous shards and results with `files` (paths relative to `folder`)."""
+        files = sorted(files)
+        shards = [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ("meta", "shards", "results"):
+                    self._conn.execute(f"DELETE FROM {table}")
+                self._conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                       [(key, json.dumps(value)) for key, value in
+                                        (("folder", os.path.abspath(folder)), ("job_text", job_text),
+                                         ("threshold", threshold), ("created", time.time()))])
+                self._conn.executemany("INSERT INTO shards (shard_id, files, updated) VALUES (?, ?, ?)",
+                                       [(i, json.dumps(shard), time.time()) for i, shard in enumerate(shards)])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(shards)
+
+    def meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def claim(self, worker_id, lease_seconds=SHARD_LEASE_SECONDS, max_attempts=SHARD_MAX_ATTEMPTS):
+        """
+        Lease the lowest pending (or expired) shard to `worker_id`.
+
+        Returns (shard_id, files) or None when nothing is claimable right now.
+        Expired shards that have used up their attempts are marked failed.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE shards SET status = 'failed', owner = NULL, updated = ?, "
+                    "error = COALESCE(error, 'lease expired') "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, max_attempts))
+                row = self._conn.execute(
+                    "SELECT shard_id, files FROM shards WHERE status = 'pending' "
+                    "OR (status = 'leased' AND lease_expires < ?) ORDER BY shard_id LIMIT 1", (now,)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, updated = ? WHERE shard_id = ?",
+                        (worker_id, now + lease_seconds, now, row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[0], json.loads(row[1])) if row else None
+
+    def renew(self, shard_id, worker_id, lease_seconds=SHARD_LEASE_SECONDS):
+        """Extend a lease; False when the worker no longer holds it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shards SET lease_expires = ?, updated = ? WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, time.time(), shard_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, worker_id, rows):
+        """
+        Store a shard's result rows and mark it done, if `worker_id` still holds it.
+
+        Rows are (resume, email, score, status, file_hash). Returns False (and
+        stores nothing) when the shard was taken over or already finished.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                held = self._conn.execute("SELECT 1 FROM shards WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                                          (shard_id, worker_id)).fetchone()
+                if held:
+                    self._conn.execute("DELETE FROM results WHERE shard_id = ?", (shard_id,))
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO results (resume, shard_id, email, score, status, file_hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", [(row[0], shard_id, *row[1:]) for row in rows])
+                    self._conn.execute("UPDATE shards SET status = 'done', owner = NULL, lease_expires = NULL, "
+                                       "error = NULL, updated = ? WHERE shard_id = ?", (time.time(), shard_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(held)
+
+    def release(self, shard_id, worker_id, error, max_attempts=SHARD_MAX_ATTEMPTS):
+        """Give a shard back after an error: pending again, or failed once it is out of attempts."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE shard_id = ? AND owner = ? AND status = 'leased'",
+                (max_attempts, str(error), time.time(), shard_id, worker_id))
+
+    def counts(self):
+        """Shards per status, e.g. {'pending': 3, 'leased': 2, 'done': 95}."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+
+    def finished(self):
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+    def failed_shards(self):
+        with self._lock:
+            return self._conn.execute("SELECT shard_id, attempts, error FROM shards WHERE status = 'failed' "
+                                      "ORDER BY shard_id").fetchall()
+
+    def report_rows(self):
+        """
+        Result rows sorted by resume name, byte-identical copies dropped.
+
+        The order and content depend only on the input set, not on how many
+        workers ran or which shard finished first, so the report is the same
+        for every run over the same files.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT email, resume, score, status, file_hash FROM results "
+                                      "ORDER BY resume").fetchall()
+        seen = set()
+        for email, resume, score, status, digest in rows:
+            if digest is not None:
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            yield email, resume, score, status
+
+
+def score_shard(files, folder, threshold, job_embedding):
+    """Extract and score one shard's resumes in batches; returns its result rows."""
+    # Imported here so the coordinator commands never load the model
+    from main import score_resumes
+
+    paths = [os.path.join(folder, file) for file in files]
+    hashes = {os.path.basename(path): file_hash(path) for path in paths if os.path.exists(path)}
+    rows = []
+    for candidate_email, file, score in score_resumes(job_embedding, [p for p in paths if os.path.exists(p)]):
+        score = round(score, REPORT_DECIMALS)
+        rows.append((file, candidate_email, score, "Passed" if score >= threshold else "Rejected", hashes.get(file)))
+    return rows
+
+
+def _keep_leased(ledger, shard_id, worker_id, lease_seconds, stop):
+    # Heartbeat: renew the lease until the shard is finished or the lease was lost
+    while not stop.wait(lease_seconds / 3):
+        if not ledger.renew(shard_id, worker_id, lease_seconds):
+            print(f"Lost the lease on shard {shard_id}")
+            return
+
+
+def run_worker(ledger_path=SHARD_LEDGER_PATH, worker_id=None, folder=None, lease_seconds=SHARD_LEASE_SECONDS,
+               poll_interval=5.0):
+    """
+    Claim and screen shards until the whole job is done; returns how many shards this worker finished.
+
+    `folder` overrides the resume folder recorded by the coordinator (the same
+    share may be mounted elsewhere on this machine). A worker with nothing to
+    claim waits while other leases are live, so it can take over a shard
+    whose worker dies.
+    """
+    from preprocessing import preprocess_text
+    from similarity import encode_texts
+
+    ledger = ShardLedger(ledger_path)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    folder = folder or ledger.meta("folder")
+    threshold = ledger.meta("threshold")
+    job_embedding = encode_texts([preprocess_text(ledger.meta("job_text"))])[0]
+
+    finished = 0
+    while True:
+        claimed = ledger.claim(worker_id, lease_seconds)
+        if claimed is None:
+            if ledger.finished():
+                break
+            time.sleep(poll_interval)
+            continue
+        shard_id, files = claimed
+        print(f"[{worker_id}] shard {shard_id}: {len(files)} resumes")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_leased, args=(ledger, shard_id, worker_id, lease_seconds, stop),
+                                     name="shard-lease", daemon=True)
+        heartbeat.start()
+        try:
+            rows = score_shard(files, folder, threshold, job_embedding)
+        except Exception as e:
+            print(f"[{worker_id}] shard {shard_id} failed: {e}")
+            ledger.release(shard_id, worker_id, e)
+            continue
+        finally:
+            stop.set()
+            heartbeat.join()
+        if ledger.complete(shard_id, worker_id, rows):
+            finished += 1
+        else:
+            print(f"[{worker_id}] shard {shard_id} was taken over; its results were dropped")
+    print(f"[{worker_id}] done: {finished} shards")
+    return finished
+
+
+def write_report(ledger_path=SHARD_LEDGER_PATH, report_path="candidates_report.csv"):
+    """Merge every worker's results into one CSV report; returns the row count."""
+    ledger = ShardLedger(ledger_path)
+    count = 0
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        for row in ledger.report_rows():
+            writer.writerow(row)
+            count += 1
+    for shard_id, attempts, error in ledger.failed_shards():
+        print(f"Shard {shard_id} failed after {attempts} attempts ({error}); its resumes are missing from the report")
+    return count
+
+
+def send_decision_emails(ledger_path=SHARD_LEDGER_PATH):
+    """Email each applicant once (best-scoring CV) from the merged results."""
+    from main import one_per_applicant, PASS_SUBJECT, PASS_BODY, REJECT_SUBJECT, REJECT_BODY, EMAIL_USER, EMAIL_PASS
+    from bulk_mailer import BulkMailer
+
+    recipients = one_per_applicant(list(ShardLedger(ledger_path).report_rows()))
+    messages = [(email, PASS_SUBJECT, PASS_BODY) if status == "Passed" else (email, REJECT_SUBJECT, REJECT_BODY)
+                for email, _, _, status in recipients]
+    print(f"Sending emails to {len(messages)} candidates...")
+    results = BulkMailer(EMAIL_USER, EMAIL_PASS).send_all(messages)
+    for (email, file, _, status), result in zip(recipients, results):
+        if not result.success:
+            print(f"{status}: Failed to email {email} ({file}) after {result.attempts} attempts: {result.error}")
+
+
+def list_resume_files(folder):
+    return [file for file in os.listdir(folder) if file.lower().endswith(('.pdf', '.docx'))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sharded batch screening: init a job, run workers, merge the report")
+    parser.add_argument('--ledger', default=SHARD_LEDGER_PATH, help="SQLite shard ledger shared by every worker")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init = commands.add_parser('init', help="split the resume folder into shards")
+    init.add_argument('--folder', default='resumes/')
+    init.add_argument('--job', help="job description file (default: main.py's JobDesc_path)")
+    init.add_argument('--threshold', type=float)
+    init.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+
+    work = commands.add_parser('work', help="claim and screen shards until the job is done")
+    work.add_argument('--worker-id')
+    work.add_argument('--folder', help="where the resume folder is mounted on this machine")
+    work.add_argument('--lease', type=float, default=SHARD_LEASE_SECONDS, help="lease length in seconds")
+
+    local = commands.add_parser('run-local', help="run several workers on this machine, then merge")
+    local.add_argument('--workers', type=int, default=2)
+    local.add_argument('--lease', type=float, default=SHARD_LEASE_SECONDS)
+    local.add_argument('--out', default="candidates_report.csv")
+
+    merge = commands.add_parser('merge', help="write the merged CSV report")
+    merge.add_argument('--out', default="candidates_report.csv")
+    merge.add_argument('--send-emails', action='store_true', help="also email every applicant their decision")
+
+    commands.add_parser('status', help="shards per status")
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        import main
+        with open(args.job or main.JobDesc_path, 'r', encoding='utf-8') as f:
+            job_text = f.read()
+        threshold = args.threshold if args.threshold is not None else main.Threshold
+        shards = ShardLedger(args.ledger).create(args.folder, list_resume_files(args.folder), job_text, threshold,
+                                                  args.shard_size)
+        print(f"Created {shards} shards in {args.ledger}")
+    elif args.command == 'work':
+        run_worker(args.ledger, args.worker_id, args.folder, args.lease)
+    elif args.command == 'run-local':
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--ledger', args.ledger, 'work',
+                                     '--worker-id', f"{socket.gethostname()}:local{i}", '--lease', str(args.lease)])
+                   for i in range(args.workers)]
+        for worker in workers:
+            worker.wait()
+        print(f"Merged {write_report(args.ledger, args.out)} candidates into {args.out}")
+    elif args.command == 'merge':
+        print(f"Merged {write_report(args.ledger, args.out)} candidates into {args.out}")
+        if args.send_emails:
+            send_decision_emails(args.ledger)
+    else:
+        print(ShardLedger(args.ledger).counts())
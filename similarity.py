@@ -1,8 +1,177 @@
-from sentence_transformers import SentenceTransformer, util
-model = SentenceTransformer('all-MiniLM-L6-v2')
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+
+from startup import mark
+from metrics import span, registry
+from encoder_backends import load_encoder, backend_id, ENCODER_BACKEND
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# Identifies embeddings from this model on the selected ENCODER_BACKEND (used in cache keys)
+MODEL_ID = backend_id(MODEL_NAME)
+BATCH_SIZE = 32  # Resumes encoded per forward pass
+# Route encode calls from concurrent request threads through one micro-batching inference thread
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "0") == "1"
+# How long the inference thread waits for more requests to join a batch
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "5"))
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces; ~180 preprocessed words stay under that
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+CHUNK_AGGREGATES = ('max', 'mean', 'topk')
+
+ChunkMatch = namedtuple('ChunkMatch', ['score', 'best_chunk', 'best_chunk_text', 'chunk_count'])
+
+_model = None
+_model_lock = threading.Lock()
+_batcher = None
+
+
+def get_model():
+    """
+    Return the process-wide SentenceTransformer, loading it on first use.
+
+    Importing this module does not load torch or the model, so apps and
+    scripts start quickly and only pay for the model when they first encode.
+    With HR_OFFLINE=1 the model is loaded from the local Hugging Face cache only.
+    ENCODER_BACKEND selects fp32 PyTorch ("torch"), int8 or ONNX Runtime.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_encoder(MODEL_NAME)
+                mark("model_loaded")
+                print(f"Loaded {MODEL_NAME} ({ENCODER_BACKEND} backend)")
+    return _model
+
+
+def warm_up():
+    """Load the model and run one tiny encode so the first real request is not slow."""
+    get_model().encode(["warm up"], show_progress_bar=False)
+    mark("model_warm")
+
+
+def __getattr__(name):
+    # Backwards compatibility for `from similarity import model`
+    if name == 'model':
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def similarity_score(sentence1, sentence2):
-    embedding1 = model.encode(sentence1, convert_to_tensor=True)
-    embedding2 = model.encode(sentence2, convert_to_tensor=True)
-    score = util.pytorch_cos_sim(embedding1, embedding2)
-    return score.item()
\ No newline at end of file
+    embedding1, embedding2 = encode_texts([sentence1, sentence2])
+    return float(embedding1 @ embedding2)
+
+def get_batcher():
+    """The process-wide BatchingEncoder used when INFERENCE_BATCHING=1."""
+    global _batcher
+    if _batcher is None:
+        with _model_lock:
+            if _batcher is None:
+                from batching_encoder import BatchingEncoder
+                _batcher = BatchingEncoder(_forward, max_batch=BATCH_SIZE, max_wait=BATCH_WAIT_MS / 1000)
+    return _batcher
+
+def _forward(texts, batch_size=BATCH_SIZE):
+    embeddings = get_model().encode(
+        texts,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    registry.inc("hr_encoded_texts_total", len(texts))
+    return embeddings.astype(np.float32, copy=False)
+
+def encode_texts(texts, batch_size=BATCH_SIZE):
+    """Encode a list of texts into L2-normalised float32 embeddings (one row per text)."""
+    texts = list(texts)
+    get_model()  # loading the model is not part of the encode span
+    with span("encode"):
+        if INFERENCE_BATCHING:
+            # Waits for a shared forward pass with other request threads' texts
+            return get_batcher().encode(texts, batch_size)
+        return _forward(texts, batch_size)
+
+def batch_similarity_scores(job_text, resume_texts, batch_size=BATCH_SIZE):
+    """
+    Score many resumes against one job description.
+
+    The job description is embedded once and the resumes are encoded in
+    mini-batches of `batch_size`, so the cosine scores come out of a single
+    matrix-vector product instead of one model call per (JD, resume) pair.
+
+    Returns:
+        np.ndarray: float32 array of cosine scores, aligned with `resume_texts`.
+    """
+    resume_texts = list(resume_texts)
+    if not resume_texts:
+        return np.zeros(0, dtype=np.float32)
+
+    job_embedding = encode_texts([job_text])[0]
+    resume_embeddings = encode_texts(resume_texts, batch_size=batch_size)
+    return resume_embeddings @ job_embedding
+
+def score_embeddings(job_embedding, resume_embeddings):
+    """Cosine scores of precomputed, normalised resume embeddings against one JD embedding."""
+    if len(resume_embeddings) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.vstack(resume_embeddings).astype(np.float32, copy=False) @ job_embedding
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping windows of `chunk_words` words. Short texts give one chunk."""
+    words = text.split()
+    if len(words) <= chunk_words:
+        return [' '.join(words)]
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(' '.join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+def aggregate_chunk_scores(chunk_scores, aggregate='max', top_k=3):
+    """Combine per-chunk scores with 'max', 'mean' or 'topk' (mean of the k best chunks)."""
+    if aggregate == 'max':
+        return float(chunk_scores.max())
+    elif aggregate == 'mean':
+        return float(chunk_scores.mean())
+    elif aggregate == 'topk':
+        k = min(top_k, len(chunk_scores))
+        return float(np.sort(chunk_scores)[-k:].mean())
+    raise ValueError(f"Unknown chunk aggregate: {aggregate}")
+
+def score_chunked(job_embedding, resume_texts, aggregate='max', top_k=3,
+                  chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP, batch_size=BATCH_SIZE):
+    """
+    Score long resumes chunk by chunk against a precomputed JD embedding.
+
+    Every window of every resume is embedded in one batched encode call, so the
+    encoder runs once per window and never more. Returns one ChunkMatch per
+    resume with the aggregated score and the index/text of the best matching chunk.
+    """
+    if aggregate not in CHUNK_AGGREGATES:
+        raise ValueError(f"Unknown chunk aggregate: {aggregate}")
+
+    chunked = [chunk_text(text, chunk_words, overlap) for text in resume_texts]
+    flat_chunks = [chunk for chunks in chunked for chunk in chunks]
+    if not flat_chunks:
+        return []
+    chunk_scores = encode_texts(flat_chunks, batch_size=batch_size) @ job_embedding
+
+    matches = []
+    offset = 0
+    for chunks in chunked:
+        scores = chunk_scores[offset:offset + len(chunks)]
+        offset += len(chunks)
+        best = int(scores.argmax())
+        matches.append(ChunkMatch(aggregate_chunk_scores(scores, aggregate, top_k), best, chunks[best], len(chunks)))
+    return matches
+
+def chunked_similarity_scores(job_text, resume_texts, aggregate='max', top_k=3, **kwargs):
+    """Chunked counterpart of batch_similarity_scores; returns a list of ChunkMatch."""
+    job_embedding = encode_texts([job_text])[0]
+    return score_chunked(job_embedding, list(resume_texts), aggregate=aggregate, top_k=top_k, **kwargs)
@@ -0,0 +1,23 @@
+import os
+import time
+
+# Imported first by the apps, so this is (close to) process start
+STARTED_AT = time.perf_counter()
+
+_marks = {}
+
+
+def is_offline():
+    """True when HR_OFFLINE is set: never touch the network for models or corpora."""
+    return os.getenv("HR_OFFLINE", "0").lower() in ("1", "true", "yes")
+
+
+def mark(label):
+    """Record how many seconds after start `label` was reached."""
+    _marks[label] = round(time.perf_counter() - STARTED_AT, 4)
+    return _marks[label]
+
+
+def timings():
+    """All recorded startup marks, in seconds since start."""
+    return dict(_marks)
@@ -0,0 +1,293 @@
+import os
+import re
+import csv
+import time
+import sqlite3
+import hashlib
+
+from dedup import normalize_email
+from extraction_pool import extract_many
+from preprocessing import preprocess_texts
+from similarity import encode_texts, score_embeddings
+
+MANIFEST_PATH = os.getenv("SCREENING_MANIFEST_PATH", os.path.join('cache', 'screening_manifest.sqlite'))
+REPORT_COLUMNS = ["Email", "Resume", "Score", "Status"]
+# Seconds between retries of candidates whose email failed, while watching
+RETRY_INTERVAL = float(os.getenv("SCREENING_RETRY_INTERVAL", "300"))
+
+
+class ScreeningManifest:
+    """
+    Checkpoint of which resumes have been screened and emailed.
+
+    Files are identified by a SHA-256 of their bytes, so renamed copies are not
+    processed twice, and applicants by their normalised email, so someone who
+    uploads two CVs is emailed once. A file moves through 'scored' (score and decision saved)
+    to 'done' (email sent or skipped, report row written); after a crash,
+    'scored' files are delivered without being extracted or scored again.
+    Files that gave no text are 'failed': never scored or emailed, and tried
+    again on the next start.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                fingerprint TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                email TEXT,
+                applicant TEXT,
+                score REAL,
+                decision TEXT,
+                status TEXT NOT NULL,
+                email_sent INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if 'applicant' not in columns:  # manifests written before applicants were tracked
+            self._conn.execute("ALTER TABLE files ADD COLUMN applicant TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_applicant ON files (applicant)")
+        self._conn.commit()
+
+    def is_known(self, fingerprint):
+        return self._conn.execute(
+            "SELECT 1 FROM files WHERE fingerprint = ? AND status != 'failed'", (fingerprint,)
+        ).fetchone() is not None
+
+    def record_scored(self, record):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (fingerprint, file, email, applicant, score, decision, status, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'scored', ?)",
+            (record["fingerprint"], record["file"], record["email"], normalize_email(record["email"]),
+             record["score"], record["decision"], time.time())
+        )
+        self._conn.commit()
+
+    def record_failed(self, record):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (fingerprint, file, status, updated) VALUES (?, ?, 'failed', ?)",
+            (record["fingerprint"], record["file"], time.time())
+        )
+        self._conn.commit()
+
+    def record_email_sent(self, fingerprint):
+        self._conn.execute("UPDATE files SET email_sent = 1, updated = ? WHERE fingerprint = ?",
+                           (time.time(), fingerprint))
+        self._conn.commit()
+
+    def applicant_emailed(self, email):
+        """Whether any file from this applicant (by normalised email) has already been emailed."""
+        applicant = normalize_email(email)
+        return applicant is not None and self._conn.execute(
+            "SELECT 1 FROM files WHERE applicant = ? AND email_sent = 1 LIMIT 1", (applicant,)
+        ).fetchone() is not None
+
+    def record_done(self, fingerprint):
+        self._conn.execute("UPDATE files SET status = 'done', updated = ? WHERE fingerprint = ?",
+                           (time.time(), fingerprint))
+        self._conn.commit()
+
+    def undelivered(self):
+        """Records that were scored but not fully delivered before the last shutdown."""
+        rows = self._conn.execute(
+            "SELECT fingerprint, file, email, score, decision, email_sent FROM files WHERE status = 'scored'"
+        ).fetchall()
+        return [{"fingerprint": fingerprint, "file": file, "email": email, "score": score,
+                 "decision": decision, "email_sent": bool(email_sent)}
+                for fingerprint, file, email, score, decision, email_sent in rows]
+
+
+def file_fingerprint(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def watch_folder(folder, manifest, interval=5.0, once=False):
+    """
+    Yield batches of new resume paths as they appear in `folder`.
+
+    A file is only picked up once its size and mtime are unchanged across two
+    polls, so half-copied uploads are not read. While watching, a poll with
+    nothing new yields an empty batch, so the consumer can do periodic work.
+    With `once`, the folder is scanned a single time and the generator ends.
+    """
+    seen = {}       # path -> (size, mtime) of files already handed on or known
+    candidates = {}  # path -> (size, mtime) from the previous poll
+    while True:
+        batch = []
+        for file in sorted(os.listdir(folder)):
+            file_path = os.path.join(folder, file)
+            if not file.lower().endswith(('.pdf', '.docx')) or not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if seen.get(file_path) == signature:
+                continue
+            if not once and candidates.get(file_path) != signature:
+                candidates[file_path] = signature  # wait one more poll for it to settle
+                continue
+            candidates.pop(file_path, None)
+            seen[file_path] = signature
+            fingerprint = file_fingerprint(file_path)
+            if not manifest.is_known(fingerprint):
+                batch.append((file_path, fingerprint))
+        if batch or not once:
+            yield batch
+        if once:
+            return
+        time.sleep(interval)
+
+
+def extract_stage(batches):
+    """(path, fingerprint) batches -> records with raw text, extracted in parallel."""
+    for batch in batches:
+        if not batch:
+            yield []
+            continue
+        fingerprints = dict(batch)
+        yield [{"file_path": file_path, "file": os.path.basename(file_path),
+                "fingerprint": fingerprints[file_path], "raw_text": text}
+               for file_path, text in extract_many(list(fingerprints))]
+
+
+def preprocess_stage(batches):
+    for batch in batches:
+        texts = preprocess_texts([record["raw_text"] for record in batch])
+        for record, text in zip(batch, texts):
+            match = re.search(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", record["raw_text"])
+            record["email"] = match.group(0) if match else None
+            record["text"] = text
+        yield batch
+
+
+def score_stage(batches, job_embedding):
+    """Embed each batch in one encode call and attach cosine scores."""
+    for batch in batches:
+        if batch:
+            scores = score_embeddings(job_embedding, encode_texts([record["text"] for record in batch]))
+            for record, score in zip(batch, scores):
+                record["score"] = float(score)
+        yield batch
+
+
+def decide_stage(batches, threshold, manifest):
+    """
+    Attach the pass/reject decision and checkpoint it before anything is sent.
+
+    Files that gave no text (failed or timed-out extraction) are recorded as
+    'failed' and dropped, rather than being rejected or reported as done.
+    """
+    for batch in batches:
+        decided = []
+        for record in batch:
+            if not record["raw_text"].strip():
+                print(f"No text extracted from {record['file']}; it will be retried on the next start")
+                manifest.record_failed(record)
+                continue
+            record["decision"] = "Passed" if record["score"] >= threshold else "Rejected"
+            record["email_sent"] = False
+            manifest.record_scored(record)
+            decided.append(record)
+        yield decided
+
+
+def append_report_rows(report_path, records, status=None):
+    """
+    Append finished candidates to the CSV report, writing the header for a new file.
+
+    The Status column is each record's decision, or `status` for all of them when given.
+    """
+    new_file = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+    with open(report_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(REPORT_COLUMNS)
+        for record in records:
+            writer.writerow([record["email"], record["file"], record["score"], status or record["decision"]])
+
+
+def deliver(batch, manifest, mailer, templates, report_path):
+    """
+    Email each decided candidate (once), append report rows and mark them done.
+
+    `templates` maps a decision ("Passed"/"Rejected") to (subject, body).
+    Candidates without an email address are reported but not emailed. Each
+    applicant (by normalised email) is emailed once: about their best-scoring
+    CV in the batch, and not at all if an earlier CV of theirs was emailed.
+    Their other CVs are reported with the status "Duplicate".
+    """
+    best, duplicates = {}, []
+    for record in sorted(batch, key=lambda r: -r["score"]):
+        if not record["email"] or record["email_sent"]:
+            continue
+        applicant = normalize_email(record["email"]) or record["email"]
+        if applicant in best or manifest.applicant_emailed(record["email"]):
+            duplicates.append(record)
+        else:
+            best[applicant] = record
+    for record in duplicates:
+        print(f"Skipped {record['file']}: {record['email']} has already been emailed about another CV")
+
+    to_send = list(best.values())
+    if to_send:
+        messages = [(record["email"], *templates[record["decision"]]) for record in to_send]
+        for record, result in zip(to_send, mailer.send_all(messages)):
+            if result.success:
+                manifest.record_email_sent(record["fingerprint"])
+                record["email_sent"] = True
+                print(f"{record['decision']}: Email sent to {record['email']} ({record['file']}) "
+                      f"with similarity {record['score']:.2f}")
+            else:
+                print(f"{record['decision']}: Failed to email {record['email']} ({record['file']}): {result.error}")
+
+    # Failed sends stay 'scored' and are retried on the next start
+    finished = [record for record in batch if record["email_sent"] or not record["email"]]
+    append_report_rows(report_path, [record for record in finished if record["email"]])
+    append_report_rows(report_path, duplicates, status="Duplicate")
+    for record in finished + duplicates:
+        manifest.record_done(record["fingerprint"])
+    return finished + duplicates
+
+
+def run_stream(folder, job_embedding, threshold, mailer, templates, report_path,
+               manifest=None, interval=5.0, once=False, retry_interval=RETRY_INTERVAL):
+    """
+    Screen resumes from `folder` incrementally: extract -> preprocess -> score -> decide -> deliver.
+
+    Work left over from a previous run is delivered first, then new files are
+    picked up as they arrive. While watching, candidates whose email failed
+    are retried every `retry_interval` seconds. Returns the number of files finished.
+    """
+    manifest = manifest or ScreeningManifest()
+    finished = 0
+
+    pending = manifest.undelivered()
+    if pending:
+        print(f"Resuming {len(pending)} screened candidates from the manifest...")
+        finished += len(deliver(pending, manifest, mailer, templates, report_path))
+    next_retry = time.monotonic() + retry_interval
+
+    batches = watch_folder(folder, manifest, interval=interval, once=once)
+    batches = extract_stage(batches)
+    batches = preprocess_stage(batches)
+    batches = score_stage(batches, job_embedding)
+    batches = decide_stage(batches, threshold, manifest)
+    try:
+        for batch in batches:
+            if batch:
+                finished += len(deliver(batch, manifest, mailer, templates, report_path))
+            if time.monotonic() >= next_retry:
+                next_retry = time.monotonic() + retry_interval
+                pending = manifest.undelivered()
+                if pending:
+                    print(f"Retrying {len(pending)} candidates whose email failed...")
+                    finished += len(deliver(pending, manifest, mailer, templates, report_path))
+    except KeyboardInterrupt:
+        print("Stopping; progress is saved in the manifest.")
+    return finished
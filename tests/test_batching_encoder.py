@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching_encoder import BatchingEncoder  # noqa: E402
+
+
+class RecordingModel:
+    """encode_fn that remembers each forward pass's texts and batch size."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def __call__(self, texts, batch_size):
+        self.release.wait(5)
+        self.calls.append((list(texts), batch_size))
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32).reshape(len(texts), 1)
+
+
+def test_caller_batch_size_reaches_the_model():
+    model = RecordingModel()
+    model.release.set()
+    encoder = BatchingEncoder(model, max_batch=32, max_wait=0)
+    assert encoder.encode(["a", "bb"], batch_size=4).tolist() == [[1.0], [2.0]]
+    assert encoder.encode(["ccc"]).tolist() == [[3.0]]
+    assert [batch_size for _, batch_size in model.calls] == [4, 32]
+
+
+def test_shared_pass_uses_the_smallest_batch_size():
+    model = RecordingModel()
+    encoder = BatchingEncoder(model, max_batch=32, max_wait=0.5)
+    results = {}
+
+    def call(name, texts, batch_size):
+        results[name] = encoder.encode(texts, batch_size=batch_size).tolist()
+
+    threads = [threading.Thread(target=call, args=("small", ["a"], 2)),
+               threading.Thread(target=call, args=("large", ["bb", "ccc"], 16))]
+    for thread in threads:
+        thread.start()
+    model.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == {"small": [[1.0]], "large": [[2.0], [3.0]]}
+    # Both requests arrive within max_wait, so they share one forward pass
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0][0]) == ["a", "bb", "ccc"] and model.calls[0][1] == 2
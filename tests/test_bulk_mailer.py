@@ -0,0 +1,105 @@
+import os
+import sys
+import socket
+
+import pytest
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller  # noqa: E402
+from aiosmtpd.smtp import AuthResult  # noqa: E402
+
+from bulk_mailer import BulkMailer, get_rate_limiter  # noqa: E402
+
+
+class SinkHandler:
+    """Local SMTP sink: 450 for the first try at 'busy' addresses, 550 for 'nobody' addresses."""
+
+    def __init__(self):
+        self.delivered = []
+        self.sessions = set()
+        self.refused = {}
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("nobody"):
+            return "550 No such user"
+        if address.startswith("busy") and address not in self.refused:
+            self.refused[address] = True
+            return "450 Mailbox busy, try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def sink():
+    handler = SinkHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+def reject_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=False, handled=False)
+
+
+@pytest.fixture
+def auth_sink():
+    handler = SinkHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port(), auth_require_tls=False,
+                            authenticator=reject_login)
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+def make_mailer(port, password="", pool_size=1):
+    return BulkMailer("hr@example.com", password, host="127.0.0.1", port=port, starttls=False,
+                      pool_size=pool_size, rate_per_minute=60000, max_retries=2, backoff_base=0.01, timeout=5)
+
+
+def test_transient_refusal_is_retried_and_permanent_fails_once(sink):
+    handler, port = sink
+    results = make_mailer(port).send_all([("busy@example.com", "Hi", "Body"),
+                                          ("nobody@example.com", "Hi", "Body")])
+    assert results[0].success and results[0].attempts == 2
+    assert not results[1].success and results[1].attempts == 1
+    assert handler.delivered == ["busy@example.com"]
+
+
+def test_connection_is_reused(sink):
+    handler, port = sink
+    results = make_mailer(port).send_all([(f"user{i}@example.com", "Hi", "Body") for i in range(5)])
+    assert all(result.success for result in results)
+    assert len(handler.delivered) == 5
+    assert len(handler.sessions) == 1
+
+
+def test_rejected_login_stops_the_run(auth_sink):
+    handler, port = auth_sink
+    results = make_mailer(port, password="wrong", pool_size=1).send_all(
+        [(f"user{i}@example.com", "Hi", "Body") for i in range(4)])
+    assert [result.success for result in results] == [False] * 4
+    assert results[0].attempts == 1
+    assert [result.attempts for result in results[1:]] == [0, 0, 0]
+    assert handler.delivered == []
+
+
+def test_mailers_share_one_rate_limiter_per_host():
+    first = BulkMailer("hr@example.com", "", host="smtp.example.com", port=25, starttls=False)
+    second = BulkMailer("hr@example.com", "", host="smtp.example.com", port=25, starttls=False)
+    assert first.rate_limiter is second.rate_limiter
+    assert get_rate_limiter("smtp.other.com", 60) is not first.rate_limiter
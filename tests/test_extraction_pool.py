@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import multiprocessing
+
+import pytest
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extraction_pool  # noqa: E402
+from extraction_pool import configure_pool, extract_many  # noqa: E402
+
+
+def fake_extract(source, max_pages=None, timeout=None):
+    # Stands in for a pdfminer parse that never returns
+    if "hang" in str(source):
+        time.sleep(60)
+    return f"text of {source}"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Forked workers inherit the patched extractor; the watchdog gives up 0.2s past the timeout
+    monkeypatch.setattr(extraction_pool, "extract_text_from_file", fake_extract)
+    monkeypatch.setattr(extraction_pool, "TIMEOUT_GRACE", 0.2)
+    pool = configure_pool(2, multiprocessing.get_context("fork"))
+    yield pool
+    configure_pool(1)
+
+
+def test_single_hung_document_times_out(pool):
+    started = time.monotonic()
+    assert list(extract_many(["hang.pdf"], timeout=0.5)) == [("hang.pdf", "")]
+    assert time.monotonic() - started < 10
+
+
+def test_only_the_hung_document_is_lost(pool):
+    results = dict(extract_many(["a.pdf", "hang.pdf", "b.pdf"], timeout=0.5))
+    assert results == {"a.pdf": "text of a.pdf", "hang.pdf": "", "b.pdf": "text of b.pdf"}
+
+
+def test_explicit_single_worker_runs_in_process(monkeypatch):
+    monkeypatch.setattr(extraction_pool, "extract_text_from_file", fake_extract)
+    assert list(extract_many(["a.pdf"], workers=1)) == [("a.pdf", "text of a.pdf")]
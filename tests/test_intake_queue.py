@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intake_queue import IntakeQueue, QueueFull  # noqa: E402
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_claim_takes_the_oldest_queued_job(tmp_path):
+    queue = IntakeQueue(lambda *args: None, path=str(tmp_path / "queue.sqlite"))
+    first = queue.submit({"name": "first"})
+    second = queue.submit({"name": "second"})
+    assert queue.status(second)["queue_position"] == 2
+    with queue._lock:
+        assert queue._claim() == (first, {"name": "first"})
+    assert queue.status(first)["status"] == "processing"
+    assert queue.status(second)["queue_position"] == 1
+
+
+def test_full_queue_rejects_submissions(tmp_path):
+    queue = IntakeQueue(lambda *args: None, path=str(tmp_path / "queue.sqlite"), max_pending=2)
+    queue.submit({})
+    queue.submit({})
+    with pytest.raises(QueueFull):
+        queue.submit({})
+    assert queue.pending_count() == 2
+
+
+def test_heartbeat_keeps_a_slow_job_from_being_requeued(tmp_path):
+    runs = []
+    release = threading.Event()
+
+    def handler(application_id, payload, progress):
+        runs.append(application_id)
+        release.wait(10)
+        return {"ok": True}
+
+    # Far longer than stale_after, with a second worker ready to take a stale job
+    queue = IntakeQueue(handler, path=str(tmp_path / "queue.sqlite"), workers=2, stale_after=0.3)
+    queue.start()
+    try:
+        application_id = queue.submit({})
+        assert wait_for(lambda: runs)
+        time.sleep(1.0)
+        status = queue.status(application_id)
+        assert status["status"] == "processing"
+        assert time.time() - status["updated"] < 0.3
+        release.set()
+        assert wait_for(lambda: queue.status(application_id)["status"] == "completed")
+    finally:
+        release.set()
+        queue.stop(5)
+    assert runs == [application_id]
+
+
+def test_job_of_a_dead_worker_is_requeued(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    dead = IntakeQueue(lambda *args: None, path=path, stale_after=0.2)
+    application_id = dead.submit({"name": "applicant"})
+    with dead._lock:
+        dead._claim()  # claimed, then the process "dies" without a heartbeat
+    time.sleep(0.3)
+
+    runs = []
+    queue = IntakeQueue(lambda application_id, payload, progress: runs.append(payload) or "done",
+                        path=path, stale_after=0.2)
+    queue.start()
+    try:
+        assert wait_for(lambda: queue.status(application_id)["status"] == "completed")
+    finally:
+        queue.stop(5)
+    assert runs == [{"name": "applicant"}]
+    assert queue.status(application_id)["result"] == "done"
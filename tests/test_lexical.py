@@ -0,0 +1,22 @@
+import os
+import sys
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexical import parse_must_have, parse_skill_list  # noqa: E402
+
+
+def test_plain_job_description_has_no_must_haves():
+    assert parse_must_have("Looking for a Python developer with machine learning experience") == []
+    assert parse_must_have("Python developer, machine learning, Docker") == []
+
+
+def test_must_have_line_in_job_description():
+    text = "AI Engineer\nWe build models.\nMust have: Python; PyTorch or TensorFlow\n"
+    assert parse_must_have(text) == [("python",), ("pytorch", "tensorflow")]
+
+
+def test_explicit_skill_list():
+    assert parse_skill_list("python; pytorch or tensorflow") == [("python",), ("pytorch", "tensorflow")]
+    assert parse_skill_list("") == []
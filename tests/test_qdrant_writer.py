@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("HR_OFFLINE", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("qdrant_client")
+from qdrant_writer import QdrantWriter, connect  # noqa: E402
+
+COLLECTION = "candidates"
+
+
+class FlakyClient:
+    """In-memory Qdrant whose upserts fail while `down` is set."""
+
+    def __init__(self):
+        self.client = connect(":memory:")
+        self.down = False
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def upsert(self, **kwargs):
+        if self.down:
+            raise ConnectionError("Qdrant is unreachable")
+        return self.client.upsert(**kwargs)
+
+    def stored(self):
+        if not self.client.collection_exists(COLLECTION):
+            return 0
+        return self.client.count(COLLECTION).count
+
+
+def make_writer(tmp_path, client, **kwargs):
+    options = {"batch_size": 100, "flush_interval": 60, "max_retries": 1, "backoff_base": 0.01,
+               "spill_retry_interval": 60}
+    options.update(kwargs)
+    return QdrantWriter(client, COLLECTION, spill_path=str(tmp_path / "spill.sqlite"), **options)
+
+
+def add_points(writer, count, start=0):
+    for i in range(start, start + count):
+        writer.add(i, [float(i + 1), 1.0, 0.0, 0.5], {"email": f"user{i}@example.com"})
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_full_batch_is_flushed(tmp_path):
+    client = FlakyClient()
+    writer = make_writer(tmp_path, client, batch_size=3).start()
+    try:
+        add_points(writer, 3)
+        assert wait_for(lambda: client.stored() == 3)
+    finally:
+        writer.stop()
+
+
+def test_partial_batch_is_flushed_after_the_interval(tmp_path):
+    client = FlakyClient()
+    writer = make_writer(tmp_path, client, flush_interval=0.5).start()
+    try:
+        add_points(writer, 2)
+        assert client.stored() == 0
+        assert wait_for(lambda: client.stored() == 2)
+    finally:
+        writer.stop()
+
+
+def test_failed_upserts_spill_and_replay(tmp_path):
+    client = FlakyClient()
+    client.down = True
+    writer = make_writer(tmp_path, client, batch_size=2)
+    add_points(writer, 5)
+    writer.flush()
+    assert writer.spilled_count() == 5
+    assert writer.pending_count() == 5
+    assert client.stored() == 0
+
+    # Still down: nothing is replayed and nothing leaves the spill table
+    assert writer.replay_spilled() == 0
+    assert writer.spilled_count() == 5
+
+    # The spill file outlives the process: a writer opened on it after a restart replays the points
+    client.down = False
+    restarted = make_writer(tmp_path, client, batch_size=2)
+    assert restarted.replay_spilled() == 5
+    assert restarted.spilled_count() == 0
+    assert client.stored() == 5
+    point = client.retrieve(COLLECTION, [3])[0]
+    assert point.payload == {"email": "user3@example.com"}
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import threading
+
+os.environ.setdefault("HR_OFFLINE", "1")
+os.environ.setdefault("ENCODER_BACKEND", "hashing")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sharded_runner  # noqa: E402
+from sharded_runner import ShardLedger, run_worker  # noqa: E402
+
+FILES = [f"resume_{i:02d}.pdf" for i in range(7)]
+
+
+def make_ledger(tmp_path, name="shards.sqlite", shard_size=2):
+    ledger = ShardLedger(str(tmp_path / name))
+    ledger.create(str(tmp_path), FILES, "Python developer", 0.5, shard_size=shard_size)
+    return ledger
+
+
+def fake_score_shard(files, folder, threshold, job_embedding):
+    # Deterministic stand-in for extraction and scoring; resumes 03 and 04 are byte-identical copies
+    time.sleep(0.01)
+    rows = []
+    for file in files:
+        score = round(sum(map(ord, file)) % 100 / 100, 6)
+        digest = "same-bytes" if file in ("resume_03.pdf", "resume_04.pdf") else file
+        rows.append((file, f"{file[:-4]}@example.com", score, "Passed" if score >= threshold else "Rejected", digest))
+    return rows
+
+
+def test_live_lease_is_not_claimed_twice(tmp_path):
+    ledger = make_ledger(tmp_path, shard_size=len(FILES))
+    assert ledger.claim("w1", lease_seconds=30) == (0, FILES)
+    assert ledger.claim("w2", lease_seconds=30) is None
+    assert ledger.renew(0, "w1", lease_seconds=30)
+    assert not ledger.renew(0, "w2", lease_seconds=30)
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    ledger = make_ledger(tmp_path, shard_size=len(FILES))
+    ledger.claim("w1", lease_seconds=0.05)
+    time.sleep(0.1)
+    assert ledger.claim("w2", lease_seconds=30) == (0, FILES)
+    assert not ledger.renew(0, "w1")
+
+
+def test_complete_from_a_worker_that_lost_the_shard_stores_nothing(tmp_path):
+    ledger = make_ledger(tmp_path, shard_size=len(FILES))
+    ledger.claim("w1", lease_seconds=0.05)
+    time.sleep(0.1)
+    ledger.claim("w2", lease_seconds=30)
+    rows = fake_score_shard(FILES, str(tmp_path), 0.5, None)
+    assert not ledger.complete(0, "w1", rows)
+    assert list(ledger.report_rows()) == []
+    assert ledger.complete(0, "w2", rows)
+    assert ledger.counts() == {"done": 1}
+
+
+def test_shard_out_of_attempts_is_failed(tmp_path):
+    ledger = make_ledger(tmp_path, shard_size=len(FILES))
+    ledger.claim("w1", lease_seconds=0.05, max_attempts=2)
+    time.sleep(0.1)
+    ledger.claim("w2", lease_seconds=0.05, max_attempts=2)
+    time.sleep(0.1)
+    assert ledger.claim("w3", lease_seconds=30, max_attempts=2) is None
+    assert ledger.counts() == {"failed": 1}
+    assert [(shard_id, attempts) for shard_id, attempts, _ in ledger.failed_shards()] == [(0, 2)]
+    assert ledger.finished()
+
+
+def test_release_out_of_attempts_is_failed(tmp_path):
+    ledger = make_ledger(tmp_path, shard_size=len(FILES))
+    ledger.claim("w1", lease_seconds=30, max_attempts=1)
+    ledger.release(0, "w1", RuntimeError("disk full"), max_attempts=1)
+    assert ledger.failed_shards() == [(0, 1, "disk full")]
+
+
+def run_workers(ledger, count):
+    threads = [threading.Thread(target=run_worker, args=(ledger.path, f"w{i}"),
+                                kwargs={"lease_seconds": 30, "poll_interval": 0.01})
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    return list(ledger.report_rows())
+
+
+def test_report_is_the_same_for_one_and_many_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_runner, "score_shard", fake_score_shard)
+    single = run_workers(make_ledger(tmp_path, "single.sqlite"), 1)
+    several = run_workers(make_ledger(tmp_path, "several.sqlite"), 3)
+    assert single == several
+    assert [resume for _, resume, _, _ in single] == [file for file in FILES if file != "resume_04.pdf"]
@@ -0,0 +1,73 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import span, registry
+
+# Keep a copy of every uploaded CV in the upload folder (0 = extract from memory only)
+PERSIST_UPLOADS = os.getenv("PERSIST_UPLOADS", "1") == "1"
+UPLOAD_WRITE_WORKERS = int(os.getenv("UPLOAD_WRITE_WORKERS", "2"))
+
+registry.describe("hr_upload_writes_total", "Uploaded files written to the upload folder in the background")
+
+
+class UploadWriter:
+    """
+    Save uploaded files off the request path.
+
+    Uploads are extracted straight from memory; `save` only queues the bytes
+    and a small thread pool writes them out, so a slow (network-mounted)
+    upload volume no longer adds a write to every application. Files are
+    written under a temporary name and renamed, so a reader never sees half a
+    file. With `enabled` False nothing is written at all.
+    """
+
+    def __init__(self, folder, enabled=PERSIST_UPLOADS, workers=UPLOAD_WRITE_WORKERS):
+        self.folder = folder
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-writer") if enabled else None
+        if enabled:
+            os.makedirs(folder, exist_ok=True)
+
+    def save(self, filename, data):
+        """Queue `data` to be written as `filename` in the folder; returns the stored name, or None if disabled."""
+        if not self.enabled:
+            return None
+        future = self._executor.submit(self._write, os.path.join(self.folder, filename), data)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return filename
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """Wait until every queued file is on disk."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def stop(self):
+        if self._executor is not None:
+            self.flush()
+            self._executor.shutdown(wait=True)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _write(self, path, data):
+        try:
+            with span("file_save"):
+                partial = path + ".part"
+                with open(partial, 'wb') as f:
+                    f.write(data)
+                os.replace(partial, path)
+            registry.inc("hr_upload_writes_total", result="written")
+        except Exception as e:
+            registry.inc("hr_upload_writes_total", result="failed")
+            print(f"Error saving upload {path}: {e}")